@@ -0,0 +1,235 @@
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordRequestForm
+
+from . import dependencies, metrics, security
+
+load_dotenv()
+
+# Controle de admissão: limites por cliente/IP (token bucket) e de concorrência com descarte
+# de carga. Taxas no formato "requisições_por_segundo:rajada" ("0" ou vazio desativa).
+
+def parse_rate(spec: Optional[str]) -> Optional[Tuple[float, float]]:
+    if not spec or spec.strip() in ("0", "off"):
+        return None
+    rate, _, burst = spec.partition(":")
+    rate = float(rate)
+    return rate, float(burst) if burst else max(rate, 1.0)
+
+RATE_LIMIT_LOGIN_PER_IP = parse_rate(os.getenv("RATE_LIMIT_LOGIN_PER_IP", "1:20"))
+RATE_LIMIT_LOGIN_PER_ACCOUNT = parse_rate(os.getenv("RATE_LIMIT_LOGIN_PER_ACCOUNT", "0.2:5"))
+RATE_LIMIT_SIGNUP_PER_IP = parse_rate(os.getenv("RATE_LIMIT_SIGNUP_PER_IP", "0.2:10"))
+RATE_LIMIT_FAVORITES_PER_CLIENT = parse_rate(os.getenv("RATE_LIMIT_FAVORITES_PER_CLIENT", "20:40"))
+
+# Concorrência: requisições em execução e na fila; acima disso (ou após esperar demais), 503
+PASSWORD_HASH_MAX_CONCURRENCY = int(os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", security.PASSWORD_HASH_WORKERS * 2))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 32))
+FAVORITES_MAX_CONCURRENCY = int(os.getenv("FAVORITES_MAX_CONCURRENCY", 64))
+FAVORITES_MAX_QUEUE = int(os.getenv("FAVORITES_MAX_QUEUE", 128))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 2))
+
+# Máximo de chaves (IPs/clientes) com bucket guardado por limitador
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100_000))
+
+admission_rejected_total = metrics.REGISTRY.counter(
+    "admission_rejected_total", "Requisições recusadas pelo controle de admissão.", ("limiter", "reason")
+)
+
+
+# --- Token bucket ---
+
+class RateLimiter:
+    """Token bucket por chave (IP, cliente, conta): `rate` fichas por segundo, até `burst` acumuladas."""
+
+    def __init__(self, name: str, rate: float, burst: float, max_keys: int = RATE_LIMIT_MAX_KEYS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: OrderedDict[str, Tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        """Consome uma ficha. Retorna 0 se admitida, ou quantos segundos esperar pela próxima."""
+        now = self._clock()
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            retry_after = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            retry_after = (1 - tokens) / self.rate
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)  # Os mais antigos já estariam com o bucket cheio
+        return retry_after
+
+    def check(self, key: str) -> None:
+        retry_after = self.acquire(key)
+        if retry_after:
+            admission_rejected_total.inc(limiter=self.name, reason="rate_limited")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests.",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+# --- Concorrência com descarte de carga ---
+
+class ConcurrencyLimiter:
+    """
+    Até `limit` requisições em execução; até `max_queue` esperando uma vaga por no máximo
+    `queue_timeout` segundos. Além disso a requisição é descartada na hora (503), o que
+    mantém a latência de quem foi admitido limitada sob sobrecarga.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def _shed(self, reason: str) -> HTTPException:
+        admission_rejected_total.inc(limiter=self.name, reason=reason)
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, try again later.",
+            headers={"Retry-After": str(max(math.ceil(self.queue_timeout), 1))},
+        )
+
+    async def acquire(self) -> None:
+        if self._semaphore.locked():
+            if self.queued >= self.max_queue:
+                raise self._shed("queue_full")
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._shed("queue_timeout")
+            finally:
+                self.queued -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+class ConcurrencySlot:
+    """Vaga obtida de um ConcurrencyLimiter pela dependência `limit_concurrency` (liberada uma vez)."""
+
+    def __init__(self, limiter: ConcurrencyLimiter):
+        self._limiter = limiter
+        self._released = False
+        self.held_by_response = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter.release()
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que segura a vaga de concorrência até o fim do envio. Dependências com
+    yield saem antes do corpo em streaming ser gerado: sem isso, o trabalho feito durante o
+    envio (ex.: hidratação na API externa) ficaria fora do limite.
+    """
+
+    def __init__(self, *args, slot: ConcurrencySlot, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slot = slot
+        slot.held_by_response = True
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.slot.release()
+
+
+# --- Limitadores por rota ---
+
+def _rate_limiter(name: str, spec: Optional[Tuple[float, float]]) -> Optional[RateLimiter]:
+    return RateLimiter(name, *spec) if spec else None
+
+login_ip_limiter = _rate_limiter("login_ip", RATE_LIMIT_LOGIN_PER_IP)
+login_account_limiter = _rate_limiter("login_account", RATE_LIMIT_LOGIN_PER_ACCOUNT)
+signup_ip_limiter = _rate_limiter("signup_ip", RATE_LIMIT_SIGNUP_PER_IP)
+favorites_client_limiter = _rate_limiter("favorites_client", RATE_LIMIT_FAVORITES_PER_CLIENT)
+
+password_hash_concurrency = ConcurrencyLimiter("password_hash", PASSWORD_HASH_MAX_CONCURRENCY, PASSWORD_HASH_MAX_QUEUE)
+favorites_concurrency = ConcurrencyLimiter("favorites", FAVORITES_MAX_CONCURRENCY, FAVORITES_MAX_QUEUE)
+
+RATE_LIMITERS = [login_ip_limiter, login_account_limiter, signup_ip_limiter, favorites_client_limiter]
+CONCURRENCY_LIMITERS = [password_hash_concurrency, favorites_concurrency]
+
+def reset() -> None:
+    for limiter in RATE_LIMITERS:
+        if limiter is not None:
+            limiter.clear()
+
+
+# --- Dependências reutilizáveis ---
+
+def client_ip(request: Request) -> str:
+    # Atrás de proxy, rode o uvicorn com --proxy-headers para que este seja o IP real
+    return request.client.host if request.client else "unknown"
+
+def limit_by_ip(limiter: Optional[RateLimiter]):
+    async def dependency(request: Request) -> None:
+        if limiter is not None:
+            limiter.check(client_ip(request))
+    return dependency
+
+def limit_by_client(limiter: Optional[RateLimiter]):
+    async def dependency(client_id: int = Depends(dependencies.get_current_client_id)) -> None:
+        if limiter is not None:
+            limiter.check(str(client_id))
+    return dependency
+
+def limit_by_login_account(limiter: Optional[RateLimiter]):
+    async def dependency(form_data: OAuth2PasswordRequestForm = Depends()) -> None:
+        if limiter is not None:
+            limiter.check(form_data.username.lower())
+    return dependency
+
+def limit_concurrency(limiter: ConcurrencyLimiter):
+    async def dependency():
+        await limiter.acquire()
+        slot = ConcurrencySlot(limiter)
+        try:
+            yield slot
+        finally:
+            if not slot.held_by_response:  # Respostas em streaming liberam a vaga ao terminar o envio
+                slot.release()
+    return dependency
+
+
+@metrics.REGISTRY.register_collector
+def _collect_metrics():
+    yield "admission_in_flight", "gauge", "Requisições em execução por limitador de concorrência.", [
+        ({"limiter": limiter.name}, limiter.in_flight) for limiter in CONCURRENCY_LIMITERS
+    ]
+    yield "admission_queued", "gauge", "Requisições esperando vaga por limitador de concorrência.", [
+        ({"limiter": limiter.name}, limiter.queued) for limiter in CONCURRENCY_LIMITERS
+    ]
@@ -0,0 +1,118 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, fakestoreapi, models, schemas
+from .response_cache import favorites_cache
+from .database import AsyncSessionLocal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre sincronizações do espelho local do catálogo (0 desativa a tarefa)
+CATALOG_SYNC_INTERVAL_SECONDS = float(os.getenv("CATALOG_SYNC_INTERVAL_SECONDS", 3600))
+
+
+# --- Conversão entre a API externa e o espelho local ---
+
+def product_to_row(product: schemas.Product, synced_at: datetime) -> Dict:
+    return {
+        "id": product.id,
+        "title": product.title,
+        "price": product.price,
+        "description": product.description,
+        "category": product.category,
+        "image": str(product.image),
+        "rating_rate": product.review.rate if product.review else None,
+        "rating_count": product.review.count if product.review else None,
+        "synced_at": synced_at,
+    }
+
+def row_to_payload(row: models.Product) -> Dict:
+    """
+    Linha do espelho no formato JSON de `schemas.Product`, sem passar pelo pydantic:
+    os dados já foram validados na sincronização.
+    """
+    rating = None
+    if row.rating_rate is not None and row.rating_count is not None:
+        rating = {"rate": row.rating_rate, "count": row.rating_count}
+    return {
+        "id": row.id,
+        "title": row.title,
+        "price": row.price,
+        "description": row.description,
+        "category": row.category,
+        "image": row.image,
+        "rating": rating,
+    }
+
+
+# --- Sincronização ---
+
+async def sync_catalog(db: AsyncSession, client: Optional[httpx.AsyncClient] = None) -> int:
+    """Busca o catálogo completo na API externa e atualiza o espelho. Retorna as linhas alteradas."""
+    synced_at = datetime.now(timezone.utc)
+    rows: List[Dict] = []
+    for data in await fakestoreapi.get_all_products(client):
+        try:
+            rows.append(product_to_row(schemas.Product.model_validate(data), synced_at))
+        except ValidationError:
+            logger.warning("Ignorando produto inválido do catálogo: %r", data.get("id"))
+    changed = await crud.upsert_products(db, rows)
+    if changed:
+        await favorites_cache.clear()  # Listagens montadas com os dados antigos do catálogo
+    logger.info("Catálogo sincronizado: %d produtos recebidos, %d alterados", len(rows), changed)
+    return changed
+
+async def resync_catalog() -> int:
+    """Ressincronização manual do espelho (fora do ciclo de uma requisição)."""
+    async with AsyncSessionLocal() as db:
+        return await sync_catalog(db)
+
+async def run_periodic_sync(interval: float = CATALOG_SYNC_INTERVAL_SECONDS, initial_delay: float = 0) -> None:
+    if initial_delay > 0:
+        await asyncio.sleep(initial_delay)
+    while True:
+        try:
+            await resync_catalog()
+        except Exception:
+            # Falhas na API externa não derrubam a tarefa; tenta de novo no próximo ciclo
+            logger.exception("Falha ao sincronizar o catálogo de produtos")
+        await asyncio.sleep(interval)
+
+def start_sync_task(
+    interval: float = CATALOG_SYNC_INTERVAL_SECONDS, initial_delay: float = 0
+) -> Optional[asyncio.Task]:
+    if interval <= 0:
+        return None
+    return asyncio.create_task(run_periodic_sync(interval, initial_delay))
+
+async def stop_sync_task(task: Optional[asyncio.Task]) -> None:
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+if __name__ == "__main__":
+    # Ressincronização manual: python -m aiqfome.catalog
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main():
+        try:
+            await resync_catalog()
+        finally:
+            await fakestoreapi.close_http_client()
+
+    asyncio.run(_main())
@@ -1,79 +1,293 @@
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 from . import models, schemas, security
 
+def _dialect_insert(db: AsyncSession):
+    """Retorna o `insert` do dialeto em uso (suporta ON CONFLICT no PostgreSQL e no SQLite)."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+class ClientNotFoundError(Exception):
+    """O cliente da escrita não existe mais (ex.: removido por outro worker, com a identidade ainda em cache)."""
+
+
+def _bump_version(db: AsyncSession, client_id: int):
+    """UPDATE que invalida os ETags do cliente (roda na mesma transação da escrita)."""
+    return db.execute(
+        update(models.Client).where(models.Client.id == client_id).values(version=models.Client.version + 1)
+    )
+
+async def _bump_live_version(db: AsyncSession, client_id: int) -> None:
+    """
+    `_bump_version` para escritas que criam linhas do cliente: se ele foi removido (ou marcado
+    para remoção), desfaz a transação e levanta ClientNotFoundError.
+    """
+    result = await db.execute(
+        update(models.Client)
+        .where(models.Client.id == client_id, models.Client.deleted_at.is_(None))
+        .values(version=models.Client.version + 1)
+        .returning(models.Client.id)
+    )
+    if result.scalar_one_or_none() is None:
+        await db.rollback()
+        raise ClientNotFoundError(client_id)
+
 # --- CRUD para Clientes ---
 
 async def get_client_by_email(db: AsyncSession, email: str) -> models.Client | None:
-    result = await db.execute(select(models.Client).where(models.Client.email == email))
+    result = await db.execute(
+        select(models.Client).where(models.Client.email == email, models.Client.deleted_at.is_(None))
+    )
+    return result.scalar_one_or_none()
+
+async def get_client(db: AsyncSession, client_id: int) -> models.Client | None:
+    """Cliente ativo (não marcado para remoção) pelo ID."""
+    result = await db.execute(
+        select(models.Client).where(models.Client.id == client_id, models.Client.deleted_at.is_(None))
+    )
     return result.scalar_one_or_none()
 
-async def create_client(db: AsyncSession, client: schemas.ClientCreate) -> models.Client:
-    hashed_password = security.get_password_hash(client.password)
-    db_client = models.Client(
-        email=client.email, name=client.name, hashed_password=hashed_password
+async def create_client(db: AsyncSession, client: schemas.ClientCreate) -> models.Client | None:
+    """Cria o cliente em um único INSERT ... RETURNING. Retorna None se o e-mail já existir."""
+    hashed_password = await security.get_password_hash(client.password)
+    insert = _dialect_insert(db)
+    result = await db.execute(
+        insert(models.Client)
+        .values(email=client.email, name=client.name, hashed_password=hashed_password)
+        .on_conflict_do_nothing(index_elements=["email"])
+        .returning(models.Client)
     )
-    db.add(db_client)
+    db_client = result.scalar_one_or_none()
     await db.commit()
-    await db.refresh(db_client)
     return db_client
 
-async def update_client(db: AsyncSession, client: models.Client, client_update: schemas.ClientUpdate) -> models.Client:
+async def update_client(db: AsyncSession, client_id: int, client_update: schemas.ClientUpdate) -> models.Client | None:
+    """
+    Atualiza o cliente em um único UPDATE ... RETURNING. Retorna None se o novo e-mail já
+    estiver em uso; levanta ClientNotFoundError se o cliente foi removido ou marcado para remoção.
+    """
     update_data = client_update.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(client, key, value)
-    
+    if not update_data:
+        db_client = await get_client(db, client_id)
+        if db_client is None:
+            raise ClientNotFoundError(client_id)
+        return db_client
+    try:
+        result = await db.execute(
+            update(models.Client)
+            .where(models.Client.id == client_id, models.Client.deleted_at.is_(None))
+            .values(**update_data, version=models.Client.version + 1)
+            .returning(models.Client)
+        )
+        db_client = result.scalar_one_or_none()
+        await db.commit()
+    except IntegrityError: # Caso a constraint UNIQUE do e-mail falhe
+        await db.rollback()
+        return None
+    if db_client is None:
+        raise ClientNotFoundError(client_id)
+    return db_client
+
+async def update_client_password_hash(db: AsyncSession, client_id: int, hashed_password: str) -> None:
+    await db.execute(
+        update(models.Client).where(models.Client.id == client_id).values(hashed_password=hashed_password)
+    )
     await db.commit()
-    await db.refresh(client)
-    return client
 
-async def delete_client(db: AsyncSession, client_id: int):
-    client = await db.get(models.Client, client_id)
-    if client:
-        await db.delete(client)
-        await db.commit()
-    return client
+async def delete_client(db: AsyncSession, client_id: int) -> bool:
+    """
+    Remove o cliente em um único DELETE: os favoritos saem pelo ON DELETE CASCADE do banco,
+    sem passar pela sessão. Sem a linha do cliente não há versão: os ETags antigos deixam de valer.
+    """
+    result = await db.execute(
+        delete(models.Client).where(models.Client.id == client_id).returning(models.Client.id)
+    )
+    deleted = result.scalar_one_or_none() is not None
+    await db.commit()
+    return deleted
 
-# --- CRUD para Favoritos ---
+async def mark_client_deleted(db: AsyncSession, client_id: int) -> bool:
+    """Remoção assíncrona: marca o cliente (um UPDATE) para a limpeza em lotes. Retorna se ele existia."""
+    result = await db.execute(
+        update(models.Client)
+        .where(models.Client.id == client_id, models.Client.deleted_at.is_(None))
+        .values(deleted_at=func.now(), version=models.Client.version + 1)
+        .returning(models.Client.id)
+    )
+    marked = result.scalar_one_or_none() is not None
+    await db.commit()
+    return marked
 
-async def get_favorite_product_ids_by_client(db: AsyncSession, client_id: int) -> list[int]:
+async def purge_favorites_batch(db: AsyncSession, client_id: int, batch_size: int) -> int:
+    """Apaga até `batch_size` favoritos do cliente em uma transação curta. Retorna quantos saíram."""
+    batch = (
+        select(models.FavoriteProduct.product_id)
+        .where(models.FavoriteProduct.client_id == client_id)
+        .order_by(models.FavoriteProduct.product_id)
+        .limit(batch_size)
+    )
     result = await db.execute(
-        select(models.FavoriteProduct.product_id).where(models.FavoriteProduct.client_id == client_id)
+        delete(models.FavoriteProduct)
+        .where(models.FavoriteProduct.client_id == client_id, models.FavoriteProduct.product_id.in_(batch))
+        .execution_options(synchronize_session=False)
     )
+    await db.commit()
+    return result.rowcount
+
+async def get_clients_pending_purge(db: AsyncSession) -> list[int]:
+    result = await db.execute(select(models.Client.id).where(models.Client.deleted_at.is_not(None)))
     return result.scalars().all()
 
-async def is_product_in_favorites(db: AsyncSession, client_id: int, product_id: int) -> bool:
+# --- CRUD para Favoritos ---
+
+async def get_favorites_version(db: AsyncSession, client_id: int) -> tuple[int, object] | None:
+    """
+    (versão do cliente, última sincronização do espelho) em uma única consulta barata:
+    juntos identificam o conteúdo da listagem de favoritos. None se o cliente não existir.
+    """
+    catalog_synced_at = select(func.max(models.Product.synced_at)).scalar_subquery()
     result = await db.execute(
-        select(models.FavoriteProduct).where(
-            models.FavoriteProduct.client_id == client_id,
-            models.FavoriteProduct.product_id == product_id
-        )
+        select(models.Client.version, catalog_synced_at).where(models.Client.id == client_id)
     )
-    return result.scalar_one_or_none() is not None
+    row = result.first()
+    return tuple(row) if row is not None else None
+
+def _paginate_favorites(stmt, limit: int | None, after_id: int | None):
+    """Paginação por keyset sobre a chave primária (client_id, product_id): ordem de product_id."""
+    if after_id is not None:
+        stmt = stmt.where(models.FavoriteProduct.product_id > after_id)
+    stmt = stmt.order_by(models.FavoriteProduct.product_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
 
 async def add_favorite(db: AsyncSession, client_id: int, product_id: int) -> models.FavoriteProduct | None:
-    db_favorite = models.FavoriteProduct(client_id=client_id, product_id=product_id)
-    db.add(db_favorite)
+    """
+    Adiciona o favorito em um único INSERT ... ON CONFLICT DO NOTHING. Retorna None se já existir;
+    levanta ClientNotFoundError se o cliente não existir mais.
+    """
+    insert = _dialect_insert(db)
     try:
-        await db.commit()
-        await db.refresh(db_favorite)
-        return db_favorite
-    except IntegrityError: # Caso a constraint UNIQUE falhe
+        result = await db.execute(
+            insert(models.FavoriteProduct)
+            .values(client_id=client_id, product_id=product_id)
+            .on_conflict_do_nothing(index_elements=["client_id", "product_id"])
+            .returning(models.FavoriteProduct)
+        )
+    except IntegrityError:  # Chave estrangeira: o cliente foi removido
         await db.rollback()
-        return None
+        raise ClientNotFoundError(client_id)
+    db_favorite = result.scalar_one_or_none()
+    if db_favorite is not None:
+        await _bump_live_version(db, client_id)
+    await db.commit()
+    return db_favorite
+
+async def add_favorites(db: AsyncSession, client_id: int, product_ids: list[int]) -> set[int]:
+    """
+    Adiciona vários favoritos em um único INSERT ... ON CONFLICT DO NOTHING. Retorna os IDs
+    inseridos; levanta ClientNotFoundError se o cliente não existir mais.
+    """
+    if not product_ids:
+        return set()
+    insert = _dialect_insert(db)
+    stmt = (
+        insert(models.FavoriteProduct)
+        .values([{"client_id": client_id, "product_id": pid} for pid in product_ids])
+        .on_conflict_do_nothing(index_elements=["client_id", "product_id"])
+        .returning(models.FavoriteProduct.product_id)
+    )
+    try:
+        result = await db.execute(stmt)
+    except IntegrityError:  # Chave estrangeira: o cliente foi removido
+        await db.rollback()
+        raise ClientNotFoundError(client_id)
+    inserted = set(result.scalars().all())
+    if inserted:
+        await _bump_live_version(db, client_id)
+    await db.commit()
+    return inserted
 
-async def remove_favorite(db: AsyncSession, client_id: int, product_id: int) -> models.FavoriteProduct | None:
+async def remove_favorites(db: AsyncSession, client_id: int, product_ids: list[int]) -> set[int]:
+    """Remove vários favoritos em um único DELETE ... RETURNING. Retorna os IDs removidos."""
+    if not product_ids:
+        return set()
     result = await db.execute(
-        select(models.FavoriteProduct).where(
+        delete(models.FavoriteProduct)
+        .where(
+            models.FavoriteProduct.client_id == client_id,
+            models.FavoriteProduct.product_id.in_(product_ids),
+        )
+        .returning(models.FavoriteProduct.product_id)
+    )
+    removed = set(result.scalars().all())
+    if removed:
+        await _bump_version(db, client_id)
+    await db.commit()
+    return removed
+
+async def remove_favorite(db: AsyncSession, client_id: int, product_id: int) -> int | None:
+    """Remove o favorito em um único DELETE ... RETURNING. Retorna o ID removido, ou None."""
+    result = await db.execute(
+        delete(models.FavoriteProduct)
+        .where(
             models.FavoriteProduct.client_id == client_id,
             models.FavoriteProduct.product_id == product_id
         )
+        .returning(models.FavoriteProduct.product_id)
     )
-    favorite_to_delete = result.scalar_one_or_none()
-    
-    if favorite_to_delete:
-        await db.delete(favorite_to_delete)
-        await db.commit()
-    
-    return favorite_to_delete
\ No newline at end of file
+    removed_id = result.scalar_one_or_none()
+    if removed_id is not None:
+        await _bump_version(db, client_id)
+    await db.commit()
+    return removed_id
+
+# --- CRUD para o catálogo de produtos (espelho local) ---
+
+async def get_product(db: AsyncSession, product_id: int) -> models.Product | None:
+    return await db.get(models.Product, product_id)
+
+async def get_existing_product_ids(db: AsyncSession, product_ids: list[int]) -> set[int]:
+    """Quais dos IDs informados estão no espelho local (uma única consulta)."""
+    if not product_ids:
+        return set()
+    result = await db.execute(select(models.Product.id).where(models.Product.id.in_(product_ids)))
+    return set(result.scalars().all())
+
+async def get_favorite_products_by_client(
+    db: AsyncSession, client_id: int, limit: int | None = None, after_id: int | None = None
+) -> list[tuple[int, models.Product | None]]:
+    """
+    Favoritos do cliente como (id do produto, linha do espelho),
+    com a linha None quando o produto não está espelhado.
+    """
+    stmt = (
+        select(models.FavoriteProduct.product_id, models.Product)
+        .outerjoin(models.Product, models.Product.id == models.FavoriteProduct.product_id)
+        .where(models.FavoriteProduct.client_id == client_id)
+    )
+    result = await db.execute(_paginate_favorites(stmt, limit, after_id))
+    return [(product_id, product) for product_id, product in result.all()]
+
+async def upsert_products(db: AsyncSession, products: list[dict]) -> int:
+    """Insere ou atualiza produtos no espelho. Só reescreve as linhas que mudaram."""
+    if not products:
+        return 0
+    insert = _dialect_insert(db)
+    stmt = insert(models.Product).values(products)
+    data_columns = [c.name for c in models.Product.__table__.columns if c.name not in ("id", "synced_at")]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Product.id],
+        set_={name: stmt.excluded[name] for name in data_columns + ["synced_at"]},
+        where=or_(*[
+            models.Product.__table__.c[name].is_distinct_from(stmt.excluded[name])
+            for name in data_columns
+        ]),
+    )
+    result = await db.execute(stmt)
+    await db.commit()
+    return result.rowcount
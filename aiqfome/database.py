@@ -1,20 +1,274 @@
 import os
+import time
+import asyncio
+import threading
+from typing import Optional
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue
 from dotenv import load_dotenv
 
+from . import metrics
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Réplica de leitura opcional; sem ela, as leituras usam o banco principal
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or None
+# Janela (segundos) em que um cliente que acabou de escrever lê do principal (read-your-writes)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+
+# Configuração do engine e do pool de conexões (padrões seguros para produção)
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Cache de prepared statements do asyncpg (0 desativa; necessário com pgbouncer em modo transaction)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+# Conexões abertas antecipadamente na inicialização (limitado ao DB_POOL_SIZE)
+DB_POOL_WARMUP_CONNECTIONS = int(os.getenv("DB_POOL_WARMUP_CONNECTIONS", 2))
+
+
+class PoolWaitStats:
+    """Conexões obtidas de um pool e tempo gasto na fila esperando uma conexão livre."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def observe_checkout(self, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.acquisitions += 1
+
+    def observe_wait(self, waited: float) -> None:
+        with self._lock:
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class _TimedQueue(AsyncAdaptedQueue):
+    """Fila de conexões livres do pool que mede as esperas bloqueantes (pool cheio)."""
+
+    stats: Optional[PoolWaitStats] = None
+
+    def get(self, block: bool = True, timeout: Optional[float] = None):
+        if not block or self.stats is None:
+            return super().get(block, timeout)
+        started_at = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            self.stats.observe_wait(time.perf_counter() - started_at)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Pool padrão do SQLAlchemy para asyncio com estatísticas próprias (uma por engine: principal e
+    réplica não se misturam). A espera medida é só a da fila; abrir uma conexão nova não conta.
+    """
+
+    _queue_class = _TimedQueue
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+        self._pool.stats = self.wait_stats
+
+    def connect(self):
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.wait_stats.observe_checkout(timed_out=True)
+            raise
+        self.wait_stats.observe_checkout()
+        return connection
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        # engine.dispose() troca o pool: as estatísticas continuam acumulando
+        pool = super().recreate()
+        pool.wait_stats = pool._pool.stats = self.wait_stats
+        return pool
+
+
+def engine_options(url: str) -> dict:
+    """Argumentos do create_async_engine a partir das variáveis de ambiente."""
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+    driver = make_url(url).drivername
+    if driver.startswith("sqlite"):
+        return options  # SQLite (desenvolvimento/testes) usa o pool padrão do dialeto
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if driver == "postgresql+asyncpg":
+        options["connect_args"] = {"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    return options
+
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # O SQLite só aplica chaves estrangeiras (e o ON DELETE CASCADE) com o pragma ligado em cada conexão
+    if "sqlite" in type(dbapi_connection).__module__:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+# expire_on_commit=False: os objetos continuam utilizáveis após o commit sem um novo SELECT
 AsyncSessionLocal = sessionmaker(
-    autocommit=False, autoflush=False, bind=engine, class_=AsyncSession
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine, class_=AsyncSession
 )
 
+if DATABASE_READ_URL:
+    read_engine = create_async_engine(DATABASE_READ_URL, **engine_options(DATABASE_READ_URL))
+    AsyncReadSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, expire_on_commit=False, bind=read_engine, class_=AsyncSession
+    )
+else:
+    read_engine = engine
+    AsyncReadSessionLocal = AsyncSessionLocal
+
 Base = declarative_base()
 
+
+class PrimaryPins:
+    """
+    Clientes que escreveram há pouco e, por isso, leem do principal até a réplica
+    alcançar. Vale por processo: com vários workers, cada um conhece as escritas que atendeu.
+    """
+
+    def __init__(self, window: float = READ_YOUR_WRITES_SECONDS, clock=time.monotonic):
+        self.window = window
+        self._clock = clock
+        self._until: dict[int, float] = {}
+
+    def pin(self, client_id: int) -> None:
+        if self.window <= 0:
+            return
+        now = self._clock()
+        if len(self._until) > 10_000:
+            self._until = {cid: until for cid, until in self._until.items() if until > now}
+        self._until[client_id] = now + self.window
+
+    def is_pinned(self, client_id: int) -> bool:
+        until = self._until.get(client_id)
+        if until is None:
+            return False
+        if until <= self._clock():
+            del self._until[client_id]
+            return False
+        return True
+
+    def clear(self) -> None:
+        self._until.clear()
+
+
+primary_pins = PrimaryPins()
+
+
+def pool_status(async_engine=engine) -> dict:
+    """Estado atual do pool de conexões do engine e tempos de espera acumulados."""
+    pool = async_engine.pool
+    status = {}
+    stats = getattr(pool, "wait_stats", None)
+    if stats is not None:
+        status.update(
+            acquisitions=stats.acquisitions,
+            timeouts=stats.timeouts,
+            wait_seconds_total=stats.wait_seconds_total,
+            wait_seconds_max=stats.wait_seconds_max,
+        )
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    return status
+
+async def warm_pool(async_engine=engine, connections: int = DB_POOL_WARMUP_CONNECTIONS) -> int:
+    """Abre conexões do pool antes da primeira requisição. Retorna quantas foram abertas."""
+    pool = async_engine.pool
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        connections = max(min(connections, pool.size()), 1)
+    else:
+        connections = 1  # Pools do SQLite (desenvolvimento/testes): basta validar a conexão
+
+    opened = 0
+    all_open = asyncio.Event()
+    release = asyncio.Event()
+
+    async def open_connection():
+        nonlocal opened
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            opened += 1
+            if opened == connections:
+                all_open.set()
+            await release.wait()  # Segura a conexão até todas estarem abertas, para o pool criar N distintas
+
+    tasks = [asyncio.create_task(open_connection()) for _ in range(connections)]
+    waiter = asyncio.create_task(all_open.wait())
+    try:
+        # Termina quando todas abrirem ou quando alguma falhar (o erro sobe no gather)
+        await asyncio.wait([waiter, *tasks], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+        release.set()
+        await asyncio.gather(*tasks)
+    return connections
+
+async def ping(async_engine=engine, timeout: float = 2.0) -> bool:
+    """Verifica se o banco responde (usado pela prontidão)."""
+    try:
+        async with asyncio.timeout(timeout):
+            async with async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
+@metrics.REGISTRY.register_collector
+def _collect_metrics():
+    pools = [("primary", pool_status(engine))]
+    if read_engine is not engine:
+        pools.append(("replica", pool_status(read_engine)))
+    for name, help_text, kind, key in (
+        ("db_pool_acquisitions_total", "Conexões obtidas do pool.", "counter", "acquisitions"),
+        ("db_pool_timeouts_total", "Esperas por conexão que falharam (timeout).", "counter", "timeouts"),
+        ("db_pool_wait_seconds_total", "Tempo total esperando conexão livre no pool.", "counter", "wait_seconds_total"),
+        ("db_pool_wait_seconds_max", "Maior espera por conexão livre no pool.", "gauge", "wait_seconds_max"),
+        ("db_pool_size", "Pool de conexões: size.", "gauge", "size"),
+        ("db_pool_checked_out", "Pool de conexões: checked_out.", "gauge", "checked_out"),
+        ("db_pool_checked_in", "Pool de conexões: checked_in.", "gauge", "checked_in"),
+        ("db_pool_overflow", "Pool de conexões: overflow.", "gauge", "overflow"),
+    ):
+        samples = [({"pool": pool}, status[key]) for pool, status in pools if key in status]
+        if samples:
+            yield name, kind, help_text, samples
+
 # Dependência para obter uma sessão do banco de dados
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+# Dependência para rotas somente leitura (réplica, se configurada)
+async def get_read_db():
+    async with AsyncReadSessionLocal() as session:
+        yield session
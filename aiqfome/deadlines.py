@@ -0,0 +1,106 @@
+import os
+import asyncio
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from . import metrics
+from .serialization import dumps
+
+load_dotenv()
+
+# Prazo máximo de cada requisição em segundos (0 desativa). O cliente pode encurtá-lo
+# com o header X-Request-Timeout (segundos), nunca aumentá-lo.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 10))
+# Parte do prazo guardada para montar e enviar uma resposta parcial
+REQUEST_DEADLINE_RESERVE_SECONDS = float(os.getenv("REQUEST_DEADLINE_RESERVE_SECONDS", 0.05))
+
+TIMEOUT_HEADER = b"x-request-timeout"
+
+deadline_exceeded_total = metrics.REGISTRY.counter(
+    "request_deadline_exceeded_total", "Requisições que estouraram o prazo, por rota e desfecho.", ("route", "outcome")
+)
+
+# Instante (relógio do event loop) em que o prazo da requisição atual termina
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Segundos até o fim do prazo da requisição atual (None se não houver prazo)."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - asyncio.get_running_loop().time(), 0.0)
+
+def work_budget() -> Optional[float]:
+    """Tempo disponível para trabalho opcional, descontada a reserva para responder."""
+    left = remaining()
+    if left is None:
+        return None
+    return max(left - REQUEST_DEADLINE_RESERVE_SECONDS, 0.0)
+
+def parse_timeout_header(value: Optional[bytes]) -> Optional[float]:
+    try:
+        seconds = float(value) if value else None
+    except ValueError:
+        return None
+    return seconds if seconds is not None and 0 < seconds < float("inf") else None
+
+
+class DeadlineMiddleware:
+    """
+    Middleware ASGI que impõe um prazo a cada requisição. O prazo fica disponível para as
+    rotas (`remaining`/`work_budget`) e, ao estourar, cancela o que ainda estiver em espera
+    (pool do banco, consultas, chamadas à API externa) e responde 504. Tarefas em segundo
+    plano que rodam depois da resposta enviada não são cortadas.
+    """
+
+    def __init__(self, app, budget: Optional[float] = None):
+        self.app = app
+        self.budget = REQUEST_DEADLINE_SECONDS if budget is None else budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.budget <= 0:
+            await self.app(scope, receive, send)
+            return
+        budget = self.budget
+        requested = parse_timeout_header(dict(scope["headers"]).get(TIMEOUT_HEADER))
+        if requested is not None:
+            budget = min(budget, requested)
+
+        deadline = asyncio.get_running_loop().time() + budget
+        token = _deadline.set(deadline)
+        response_started = False
+        timeout = asyncio.timeout_at(deadline)
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                timeout.reschedule(None)  # Resposta completa: o que vier depois não tem prazo
+
+        try:
+            async with timeout:
+                await self.app(scope, receive, send_wrapper)
+        except TimeoutError:
+            if not timeout.expired():
+                raise  # Timeout de outra origem (ex.: um asyncio.timeout da própria rota): não é o prazo
+            route = getattr(scope.get("route"), "path", "unmatched")
+            if response_started:
+                # Streaming já começou: só resta encerrar a resposta
+                deadline_exceeded_total.inc(route=route, outcome="truncated")
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            deadline_exceeded_total.inc(route=route, outcome="gateway_timeout")
+            body = dumps({"detail": "Request deadline exceeded."})
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+        finally:
+            _deadline.reset(token)
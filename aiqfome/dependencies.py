@@ -1,31 +1,136 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
+from dotenv import load_dotenv
 
 from . import crud, models, schemas, security
-from .database import get_db
+from .database import get_db, get_read_db, primary_pins
+
+load_dotenv()
+
+# A invalidação só alcança o próprio processo: com vários workers, um cliente removido ou alterado
+# em outro worker continua valendo aqui até a entrada expirar. Por isso o TTL é curto.
+AUTH_IDENTITY_CACHE_TTL_SECONDS = float(os.getenv("AUTH_IDENTITY_CACHE_TTL_SECONDS", 5))
+AUTH_IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_IDENTITY_CACHE_MAX_ENTRIES", 10000))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_client(
-    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
-) -> models.Client:
-    credentials_exception = HTTPException(
+
+# --- Cache de identidades autenticadas ---
+
+class IdentityCache:
+    """
+    Cache (TTL + LRU) dos dados públicos do cliente, por ID, para evitar uma
+    consulta ao banco em cada requisição autenticada. Deve ser invalidado
+    sempre que o cliente for alterado ou removido.
+    """
+
+    def __init__(self, ttl: float = AUTH_IDENTITY_CACHE_TTL_SECONDS, max_entries: int = AUTH_IDENTITY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, tuple[float, schemas.Client]] = OrderedDict()
+
+    def get(self, client_id: int) -> Optional[schemas.Client]:
+        entry = self._entries.get(client_id)
+        if entry is None:
+            return None
+        expires_at, identity = entry
+        if expires_at <= time.monotonic():
+            del self._entries[client_id]
+            return None
+        self._entries.move_to_end(client_id)
+        return identity
+
+    def set(self, identity: schemas.Client) -> None:
+        self._entries[identity.id] = (time.monotonic() + self.ttl, identity)
+        self._entries.move_to_end(identity.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, client_id: int) -> None:
+        self._entries.pop(client_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+identity_cache = IdentityCache()
+
+
+# --- Dependências de autenticação ---
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def stale_identity(client_id: int) -> HTTPException:
+    """O cliente autenticado não existe mais (a identidade em cache estava desatualizada)."""
+    identity_cache.invalidate(client_id)
+    return credentials_exception()
+
+async def _load_client(db: AsyncSession, token_data: schemas.TokenData) -> Optional[models.Client]:
+    if token_data.client_id is not None:
+        client = await db.get(models.Client, token_data.client_id)
+        # Cliente com remoção assíncrona em andamento já não existe para a API. O e-mail (sub) também
+        # precisa bater: o token deixa de valer quando o cliente troca de e-mail, e um ID reaproveitado
+        # (ex.: SQLite, após remover o último cliente) não autentica a conta nova
+        if client is None or client.deleted_at is not None or client.email != token_data.email:
+            return None
+        return client
+    # Tokens emitidos antes do claim client_id
+    return await crud.get_client_by_email(db, email=token_data.email)
+
+async def get_current_identity(
+    token: str = Depends(oauth2_scheme),
+    read_db: AsyncSession = Depends(get_read_db),
+    db: AsyncSession = Depends(get_db),
+) -> schemas.Client:
+    """
+    Valida o token e retorna os dados do cliente, consultando o banco só em caso de cache miss
+    (na réplica; no principal se o cliente acabou de escrever ou se a réplica ainda não o tem).
+    """
     try:
         payload = jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
+            raise credentials_exception()
+        token_data = schemas.TokenData(email=email, client_id=payload.get("client_id"))
     except JWTError:
-        raise credentials_exception
-    
-    client = await crud.get_client_by_email(db, email=token_data.email)
+        raise credentials_exception()
+
+    if token_data.client_id is not None:
+        identity = identity_cache.get(token_data.client_id)
+        if identity is not None and identity.email == token_data.email:
+            return identity
+    use_primary = token_data.client_id is not None and primary_pins.is_pinned(token_data.client_id)
+    client = await _load_client(db if use_primary else read_db, token_data)
+    if client is None and not use_primary and read_db is not db:
+        # Réplica atrasada (ex.: cliente recém-criado): confirma no principal antes de recusar
+        client = await _load_client(db, token_data)
     if client is None:
-        raise credentials_exception
-    return client
\ No newline at end of file
+        raise credentials_exception()
+
+    identity = schemas.Client.model_validate(client)
+    identity_cache.set(identity)
+    return identity
+
+async def get_current_client_id(identity: schemas.Client = Depends(get_current_identity)) -> int:
+    """Para rotas que só precisam do ID do cliente (não carrega o objeto ORM)."""
+    return identity.id
+
+async def get_client_read_db(
+    client_id: int = Depends(get_current_client_id),
+    read_db: AsyncSession = Depends(get_read_db),
+    db: AsyncSession = Depends(get_db),
+) -> AsyncSession:
+    """Sessão para leituras do cliente: a réplica, exceto logo após uma escrita dele (read-your-writes)."""
+    return db if primary_pins.is_pinned(client_id) else read_db
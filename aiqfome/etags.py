@@ -0,0 +1,33 @@
+import hashlib
+from typing import Dict
+
+from fastapi import Request, Response, status
+
+# Respostas por cliente: caches intermediários não guardam, e o cliente sempre revalida
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: object) -> str:
+    """ETag forte a partir das partes que determinam a representação."""
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+def body_digest(body: bytes) -> str:
+    """Resumo do corpo, para ETags de representações que a versão do banco não identifica."""
+    return hashlib.sha256(body).hexdigest()
+
+def if_none_match(request: Request, etag: str) -> bool:
+    """O If-None-Match da requisição casa com o ETag (comparação fraca, como manda o RFC 9110)?"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in header.split(","))
+    return etag.removeprefix("W/") in candidates
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag))
@@ -1,33 +1,641 @@
+import os
+import math
+import time
+import random
 import httpx
 import asyncio
-from typing import Optional, List, Dict
+import logging
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, List, Dict
 
+from dotenv import load_dotenv
+
+from . import metrics
 from .schemas import Product
+from .shared_cache import SharedProductStore
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
 
 FAKE_STORE_API_URL = "https://fakestoreapi.com/products"
 
-async def get_product_by_id(product_id: int) -> Optional[Dict]:
-    """Busca um único produto por ID na API externa."""
-    async with httpx.AsyncClient() as client:
+PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", 300))
+PRODUCT_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_NEGATIVE_TTL_SECONDS", 60))
+PRODUCT_CACHE_MAX_ENTRIES = int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", 1000))
+# Fração sorteada para encurtar o TTL de cada item: itens gravados juntos (listagem completa) não expiram juntos
+PRODUCT_CACHE_TTL_JITTER = float(os.getenv("PRODUCT_CACHE_TTL_JITTER", 0.1))
+# Cache compartilhado entre os workers do host (arquivo SQLite; vazio desativa). Ex.: /dev/shm/aiqfome-products.db
+PRODUCT_CACHE_SHARED_PATH = os.getenv("PRODUCT_CACHE_SHARED_PATH") or None
+PRODUCT_CACHE_SHARED_MAX_ENTRIES = int(os.getenv("PRODUCT_CACHE_SHARED_MAX_ENTRIES", 10000))
+
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 100))
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", 20))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", 30))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 3))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", 5))
+UPSTREAM_POOL_TIMEOUT = float(os.getenv("UPSTREAM_POOL_TIMEOUT", 5))
+# HTTP/2 exige o pacote opcional `h2` (pip install "httpx[http2]")
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes")
+
+# Máximo de buscas simultâneas por listagem de favoritos
+HYDRATION_MAX_CONCURRENCY = int(os.getenv("HYDRATION_MAX_CONCURRENCY", 10))
+
+# Hidratação em lote: a partir de quantos IDs fora do cache buscar a listagem completa de uma vez,
+# e até que tamanho de catálogo a listagem é sempre preferível (0 desativa cada regra)
+HYDRATION_BULK_THRESHOLD = int(os.getenv("HYDRATION_BULK_THRESHOLD", 8))
+HYDRATION_SMALL_CATALOG_SIZE = int(os.getenv("HYDRATION_SMALL_CATALOG_SIZE", 50))
+
+# Circuit breaker: abre quando a taxa de erro das últimas chamadas passa do limite
+UPSTREAM_BREAKER_WINDOW = int(os.getenv("UPSTREAM_BREAKER_WINDOW", 20))
+UPSTREAM_BREAKER_MIN_CALLS = int(os.getenv("UPSTREAM_BREAKER_MIN_CALLS", 10))
+UPSTREAM_BREAKER_FAILURE_RATIO = float(os.getenv("UPSTREAM_BREAKER_FAILURE_RATIO", 0.5))
+UPSTREAM_BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", 30))
+
+
+# --- Cache de produtos ---
+
+class ProductCache:
+    """
+    Cache em memória (TTL + LRU) para os produtos da API externa.
+
+    Também guarda resultados negativos (404) e agrupa buscas concorrentes pelo
+    mesmo ID em uma única chamada externa (single-flight). Com `shared`, um miss
+    local consulta o cache compartilhado pelos workers antes da API externa, e as
+    gravações vão para os dois níveis.
+    """
+
+    def __init__(
+        self,
+        ttl: float = PRODUCT_CACHE_TTL_SECONDS,
+        max_entries: int = PRODUCT_CACHE_MAX_ENTRIES,
+        negative_ttl: float = PRODUCT_CACHE_NEGATIVE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        shared: Optional[SharedProductStore] = None,
+        ttl_jitter: float = PRODUCT_CACHE_TTL_JITTER,
+    ):
+        self.ttl = ttl
+        self.ttl_jitter = ttl_jitter
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self.shared = shared
+        self._entries: OrderedDict[int, tuple[float, Optional[Dict]]] = OrderedDict()
+        self._inflight: Dict[int, asyncio.Task] = {}
+        # Product já validado para cada entrada (junto do dict de origem, para conferir a identidade)
+        self._validated: Dict[int, tuple[Dict, Product]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, product_id: int) -> tuple[bool, Optional[Dict]]:
+        """Retorna (encontrado, produto). Um produto None em cache significa 404."""
+        entry = self._entries.get(product_id)
+        if entry is not None and entry[0] > self._clock():
+            self._entries.move_to_end(product_id)
+            return True, entry[1]
+        # Entradas expiradas ficam guardadas (até o LRU removê-las) para o get_stale
+        if self.shared is not None:
+            found, product, ttl_left = self.shared.get(product_id)
+            if found and ttl_left > 0:
+                # Outro worker já buscou: traz para o nível local pelo tempo que resta
+                self.shared.hits += 1
+                self._store_local(product_id, product, ttl_left)
+                return True, product
+        return False, None
+
+    def get_stale(self, product_id: int) -> tuple[bool, Optional[Dict]]:
+        """Como `get`, mas também devolve o último valor conhecido de entradas expiradas."""
+        entry = self._entries.get(product_id)
+        if entry is not None:
+            return True, entry[1]
+        if self.shared is not None:
+            found, product, _ = self.shared.get(product_id)
+            return found, product
+        return False, None
+
+    def _ttl_for(self, product: Optional[Dict]) -> float:
+        ttl = self.ttl if product is not None else self.negative_ttl
+        return ttl * (1 - random.uniform(0, self.ttl_jitter)) if self.ttl_jitter > 0 else ttl
+
+    def _store_local(self, product_id: int, product: Optional[Dict], ttl: float) -> None:
+        self._entries[product_id] = (self._clock() + ttl, product)
+        self._entries.move_to_end(product_id)
+        self._validated.pop(product_id, None)
+        while len(self._entries) > self.max_entries:
+            evicted_id, _ = self._entries.popitem(last=False)
+            self._validated.pop(evicted_id, None)
+            self.evictions += 1
+
+    def set(self, product_id: int, product: Optional[Dict]) -> None:
+        self.set_many([(product_id, product)])
+
+    def set_many(self, items: List[tuple[int, Optional[Dict]]]) -> None:
+        """Grava vários produtos (no cache compartilhado, em uma única transação)."""
+        ttls = [(product_id, product, self._ttl_for(product)) for product_id, product in items]
+        for product_id, product, ttl in ttls:
+            self._store_local(product_id, product, ttl)
+        if self.shared is not None:
+            self.shared.set_many(ttls)
+
+    def as_product(self, product_id: int, data: Dict) -> Product:
+        """Valida o dict como Product uma única vez enquanto ele estiver no cache."""
+        validated = self._validated.get(product_id)
+        if validated is not None and validated[0] is data:
+            return validated[1]
+        product = Product.model_validate(data)
+        entry = self._entries.get(product_id)
+        if entry is not None and entry[1] is data:
+            self._validated[product_id] = (data, product)
+        return product
+
+    def clear(self) -> None:
+        """
+        Limpa só o nível local deste worker. O cache compartilhado não é apagado daqui: os demais
+        workers perderiam o cache junto. Dados novos (ex.: a listagem completa) sobrescrevem as
+        entradas compartilhadas no set_many.
+        """
+        self._entries.clear()
+        self._validated.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+    async def get_or_fetch(
+        self, product_id: int, fetch: Callable[[int], Awaitable[Optional[Dict]]]
+    ) -> Optional[Dict]:
+        found, product = self.get(product_id)
+        if found:
+            self.hits += 1
+            return product
+        self.misses += 1
+
+        task = self._inflight.get(product_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(product_id, fetch))
+            self._inflight[product_id] = task
+        # shield: o cancelamento de um chamador não cancela a busca dos demais
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(
+        self, product_id: int, fetch: Callable[[int], Awaitable[Optional[Dict]]]
+    ) -> Optional[Dict]:
+        try:
+            product = await fetch(product_id)
+            self.set(product_id, product)
+            return product
+        finally:
+            self._inflight.pop(product_id, None)
+
+
+product_cache = ProductCache(
+    shared=SharedProductStore(PRODUCT_CACHE_SHARED_PATH, PRODUCT_CACHE_SHARED_MAX_ENTRIES)
+    if PRODUCT_CACHE_SHARED_PATH else None
+)
+
+
+# --- Planejamento da hidratação ---
+
+hydration_plans_total = metrics.REGISTRY.counter(
+    "hydration_plans_total", "Decisões de hidratação: listagem completa ou busca por ID.", ("strategy", "reason")
+)
+
+
+class HydrationPlanner:
+    """
+    Decide, a cada hidratação, entre uma busca por ID e uma única chamada à listagem
+    completa. A listagem vence quando há IDs demais fora do cache, quando o catálogo
+    é pequeno ou quando, pelas latências observadas (média móvel), ela sai mais barata
+    que as rodadas de buscas por ID com a concorrência disponível.
+    """
+
+    def __init__(
+        self,
+        bulk_threshold: int = HYDRATION_BULK_THRESHOLD,
+        small_catalog_size: int = HYDRATION_SMALL_CATALOG_SIZE,
+        smoothing: float = 0.2,
+    ):
+        self.bulk_threshold = bulk_threshold
+        self.small_catalog_size = small_catalog_size
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self) -> None:
+        self.catalog_size: Optional[int] = None
+        self.latency: Dict[str, float] = {}
+
+    def observe(self, operation: str, seconds: float) -> None:
+        previous = self.latency.get(operation)
+        self.latency[operation] = seconds if previous is None else previous + self.smoothing * (seconds - previous)
+
+    def plan(self, uncached: int, concurrency: int = HYDRATION_MAX_CONCURRENCY) -> tuple[str, str]:
+        """Retorna (estratégia, motivo): ("bulk" | "per_id", ...)."""
+        if uncached <= 1:
+            return "per_id", "single"
+        if self.bulk_threshold and uncached >= self.bulk_threshold:
+            return "bulk", "threshold"
+        if self.catalog_size is not None and self.catalog_size <= self.small_catalog_size:
+            return "bulk", "small_catalog"
+        product_latency, catalog_latency = self.latency.get("product"), self.latency.get("catalog")
+        if product_latency is not None and catalog_latency is not None:
+            per_id_cost = math.ceil(uncached / max(concurrency, 1)) * product_latency
+            if catalog_latency < per_id_cost:
+                return "bulk", "latency"
+        return "per_id", "default"
+
+
+hydration_planner = HydrationPlanner()
+
+
+# --- Circuit breaker ---
+
+class CircuitOpenError(Exception):
+    """A API externa está indisponível (circuito aberto); a chamada nem foi feita."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para a API externa.
+
+    Abre quando a taxa de falhas nas últimas `window` chamadas atinge `failure_ratio`
+    e, enquanto aberto, falha imediatamente com CircuitOpenError. Depois de
+    `reset_timeout` segundos deixa passar uma única chamada de teste (meio-aberto):
+    se ela funcionar o circuito fecha, senão volta a abrir.
+    """
+
+    def __init__(
+        self,
+        window: int = UPSTREAM_BREAKER_WINDOW,
+        min_calls: int = UPSTREAM_BREAKER_MIN_CALLS,
+        failure_ratio: float = UPSTREAM_BREAKER_FAILURE_RATIO,
+        reset_timeout: float = UPSTREAM_BREAKER_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._results: deque[bool] = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def reset(self) -> None:
+        self._results.clear()
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.rejected = 0
+
+    async def call(self, func: Callable[[], Awaitable]):
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            self.rejected += 1
+            raise CircuitOpenError("Upstream catalog circuit is open")
+        trial = state == "half_open"
+        if trial:
+            self._trial_in_flight = True
+        try:
+            result = await func()
+        except httpx.HTTPError:
+            self._record(False, trial)
+            raise
+        else:
+            self._record(True, trial)
+            return result
+        finally:
+            if trial:
+                self._trial_in_flight = False
+
+    def _record(self, success: bool, trial: bool) -> None:
+        if trial:
+            if success:
+                self._opened_at = None
+                self._results.clear()
+            else:
+                self._opened_at = self._clock()
+            return
+        self._results.append(success)
+        failures = self._results.count(False)
+        if len(self._results) >= self.min_calls and failures / len(self._results) >= self.failure_ratio:
+            self._opened_at = self._clock()
+            self._results.clear()
+
+
+upstream_breaker = CircuitBreaker()
+
+
+# --- Cliente HTTP compartilhado ---
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def create_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Cria o cliente HTTP (com pool de conexões e keep-alive) usado para a API externa."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=UPSTREAM_CONNECT_TIMEOUT,
+            read=UPSTREAM_READ_TIMEOUT,
+            write=UPSTREAM_READ_TIMEOUT,
+            pool=UPSTREAM_POOL_TIMEOUT,
+        ),
+        http2=UPSTREAM_HTTP2,
+        transport=transport,
+    )
+
+async def open_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Abre o cliente compartilhado (chamado no lifespan da aplicação)."""
+    global _http_client
+    if _http_client is None:
+        _http_client = create_http_client(transport)
+    return _http_client
+
+async def close_http_client() -> None:
+    """Fecha o cliente compartilhado e suas conexões (chamado no shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Dependência que fornece o cliente compartilhado (pode ser sobrescrita nos testes)."""
+    global _http_client
+    if _http_client is None:
+        # Sem lifespan (ex: scripts), cria o cliente sob demanda
+        _http_client = create_http_client()
+    return _http_client
+
+
+# --- Métricas ---
+
+@contextmanager
+def _upstream_timer(operation: str):
+    """Mede a chamada à API externa; o resultado pode ser ajustado via outcome["value"]."""
+    started_at = time.perf_counter()
+    outcome = {"value": "ok"}
+    try:
+        yield outcome
+    except httpx.TimeoutException:
+        outcome["value"] = "timeout"
+        raise
+    except asyncio.CancelledError:
+        # Prazo da requisição estourou: não é falha da API externa nem amostra de latência
+        outcome["value"] = "cancelled"
+        raise
+    except httpx.HTTPStatusError:
+        outcome["value"] = "http_error"
+        raise
+    except Exception:
+        outcome["value"] = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started_at
+        metrics.upstream_request_duration_seconds.observe(elapsed, operation=operation, outcome=outcome["value"])
+        metrics.record_wait("upstream", elapsed)
+        if outcome["value"] in ("ok", "not_found"):
+            hydration_planner.observe(operation, elapsed)
+
+@metrics.REGISTRY.register_collector
+def _collect_metrics():
+    stats = product_cache.stats()
+    yield "product_cache_hits_total", "counter", "Acertos no cache de produtos.", [({}, stats["hits"])]
+    yield "product_cache_misses_total", "counter", "Faltas no cache de produtos.", [({}, stats["misses"])]
+    yield "product_cache_evictions_total", "counter", "Remoções por LRU no cache de produtos.", [({}, stats["evictions"])]
+    yield "product_cache_entries", "gauge", "Itens no cache de produtos.", [({}, stats["size"])]
+    if product_cache.shared is not None:
+        yield "product_cache_shared_hits_total", "counter", "Faltas locais atendidas pelo cache compartilhado.", [
+            ({}, product_cache.shared.hits)
+        ]
+        yield "product_cache_shared_errors_total", "counter", "Falhas de acesso ao cache compartilhado.", [
+            ({}, product_cache.shared.errors)
+        ]
+        yield "product_cache_shared_busy_total", "counter", "Acessos ao cache compartilhado desistidos por lock ocupado.", [
+            ({}, product_cache.shared.busy)
+        ]
+    yield "upstream_circuit_state", "gauge", "Estado do circuit breaker da API externa (1 = estado atual).", [
+        ({"state": state}, int(upstream_breaker.state == state)) for state in ("closed", "open", "half_open")
+    ]
+    yield "upstream_circuit_rejected_total", "counter", "Chamadas recusadas com o circuito aberto.", [
+        ({}, upstream_breaker.rejected)
+    ]
+
+
+# --- Chamadas à API externa ---
+
+async def _fetch_product(product_id: int, client: httpx.AsyncClient) -> Optional[Dict]:
+    with _upstream_timer("product") as outcome:
         try:
             response = await client.get(f"{FAKE_STORE_API_URL}/{product_id}")
             response.raise_for_status()  # Lança exceção para status 4xx/5xx
             return response.json()
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 404:
+                outcome["value"] = "not_found"
                 return None
             raise e
 
-async def get_products_details(product_ids: List[int]) -> List[Product]:
-    """Busca detalhes de múltiplos produtos de forma concorrente."""
-    async with httpx.AsyncClient() as client:
-        tasks = [client.get(f"{FAKE_STORE_API_URL}/{pid}") for pid in product_ids]
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
+async def get_product_by_id(
+    product_id: int,
+    client: Optional[httpx.AsyncClient] = None,
+    stale_ids: Optional[set] = None,
+) -> Optional[Dict]:
+    """
+    Busca um único produto por ID na API externa (com cache).
+
+    Se a API externa falhar ou o circuito estiver aberto, devolve o último valor
+    conhecido do cache e registra o ID em `stale_ids`.
+    """
+    client = client or get_http_client()
+    try:
+        return await product_cache.get_or_fetch(
+            product_id, lambda pid: upstream_breaker.call(lambda: _fetch_product(pid, client))
+        )
+    except (CircuitOpenError, httpx.HTTPError):
+        found, product = product_cache.get_stale(product_id)
+        if not found:
+            raise
+        if stale_ids is not None:
+            stale_ids.add(product_id)
+        return product
+
+# Listagem completa em andamento: chamadas concorrentes aguardam a mesma (single-flight)
+_catalog_inflight: Optional[asyncio.Task] = None
+
+async def get_all_products(client: Optional[httpx.AsyncClient] = None) -> List[Dict]:
+    """Busca o catálogo completo na API externa e aproveita para aquecer o cache."""
+    global _catalog_inflight
+    task = _catalog_inflight
+    if task is None:
+        task = asyncio.ensure_future(_fetch_all_products(client or get_http_client()))
+        _catalog_inflight = task
+    # shield: o cancelamento (ou o prazo) de um chamador não cancela a listagem dos demais
+    return await asyncio.shield(task)
+
+async def _fetch_all_products(client: httpx.AsyncClient) -> List[Dict]:
+    global _catalog_inflight
+
+    async def fetch_all() -> httpx.Response:
+        with _upstream_timer("catalog"):
+            response = await client.get(FAKE_STORE_API_URL)
+            response.raise_for_status()
+            return response
+
+    try:
+        products = (await upstream_breaker.call(fetch_all)).json()
+        product_cache.set_many([(product["id"], product) for product in products])
+        hydration_planner.catalog_size = len(products)
+        return products
+    finally:
+        _catalog_inflight = None
+
+async def get_products_by_ids(
+    product_ids: List[int], client: Optional[httpx.AsyncClient] = None
+) -> Dict[int, Optional[Dict]]:
+    """
+    Resolve vários IDs de uma vez: o que não estiver no cache é buscado com uma
+    única chamada à listagem completa da API externa (em vez de uma por ID).
+    """
+    found: Dict[int, Optional[Dict]] = {}
+    uncached = []
+    for pid in product_ids:
+        hit, product = product_cache.get(pid)
+        if hit:
+            product_cache.hits += 1
+            found[pid] = product
+        else:
+            uncached.append(pid)
+    if uncached:
+        product_cache.misses += len(uncached)
+        listing = {product["id"]: product for product in await get_all_products(client)}
+        for pid in uncached:
+            found[pid] = listing.get(pid)
+        # A listagem é completa: o que não veio nela não existe
+        product_cache.set_many([(pid, None) for pid in uncached if pid not in listing])
+    return found
+
+async def _prefetch_uncached(product_ids: List[int], client: httpx.AsyncClient) -> None:
+    """Se o planejador preferir, traz os IDs fora do cache com uma única chamada à listagem."""
+    uncached = [pid for pid in dict.fromkeys(product_ids) if not product_cache.get(pid)[0]]
+    if not uncached:
+        return
+    strategy, reason = hydration_planner.plan(len(uncached))
+    hydration_plans_total.inc(strategy=strategy, reason=reason)
+    logger.debug("Hidratação de %d IDs fora do cache: %s (%s)", len(uncached), strategy, reason)
+    if strategy != "bulk":
+        return
+    try:
+        await get_products_by_ids(uncached, client)
+    except Exception:
+        # A busca por ID a seguir cobre o que faltar (inclusive com dados antigos do cache)
+        logger.warning("Listagem completa falhou; hidratando por ID", exc_info=True)
+
+async def _prefetch_within(product_ids: List[int], client: httpx.AsyncClient, deadline: Optional[float]) -> None:
+    try:
+        async with asyncio.timeout_at(deadline):
+            await _prefetch_uncached(product_ids, client)
+    except TimeoutError:
+        pass  # Sem tempo para a listagem: o que faltar conta como omitido
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else max(deadline - asyncio.get_running_loop().time(), 0.0)
+
+async def get_products_details(
+    product_ids: List[int],
+    client: Optional[httpx.AsyncClient] = None,
+    stale_ids: Optional[set] = None,
+    timeout: Optional[float] = None,
+    omitted_ids: Optional[set] = None,
+) -> List[Product]:
+    """
+    Busca detalhes de múltiplos produtos de forma concorrente.
+
+    No máximo HYDRATION_MAX_CONCURRENCY buscas ficam em andamento ao mesmo tempo.
+    IDs servidos a partir de dados antigos do cache são adicionados a `stale_ids`.
+    Com muitos IDs fora do cache, uma única listagem completa substitui as buscas por ID.
+    Com `timeout`, devolve o que ficou pronto a tempo e adiciona o resto a `omitted_ids`.
+    """
+    client = client or get_http_client()
+    deadline = asyncio.get_running_loop().time() + timeout if timeout is not None else None
+    await _prefetch_within(product_ids, client, deadline)
+    semaphore = asyncio.Semaphore(HYDRATION_MAX_CONCURRENCY)
+
+    async def fetch(pid: int) -> Optional[Dict]:
+        async with semaphore:
+            return await get_product_by_id(pid, client, stale_ids)
+
+    tasks = [asyncio.ensure_future(fetch(pid)) for pid in product_ids]
+    pending = set()
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=_remaining(deadline))
+    for task in pending:
+        task.cancel()  # A busca compartilhada no cache continua (shield) e aquece a próxima requisição
 
     products = []
-    for res in responses:
-        if isinstance(res, httpx.Response) and res.status_code == 200:
-            products.append(Product.model_validate(res.json()))
+    for pid, task in zip(product_ids, tasks):
+        if task in pending:
+            if omitted_ids is not None:
+                omitted_ids.add(pid)
+        elif task.exception() is None and isinstance(task.result(), dict):
+            products.append(product_cache.as_product(pid, task.result()))
         # Ignora erros (ex: produto não encontrado) para não quebrar a lista inteira
-    
-    return products
\ No newline at end of file
+
+    return products
+
+async def iter_products_details(
+    product_ids: List[int],
+    client: Optional[httpx.AsyncClient] = None,
+    stale_ids: Optional[set] = None,
+    timeout: Optional[float] = None,
+    omitted_ids: Optional[set] = None,
+) -> AsyncIterator[Product]:
+    """Como `get_products_details`, mas entrega cada produto assim que sua busca termina."""
+    client = client or get_http_client()
+    deadline = asyncio.get_running_loop().time() + timeout if timeout is not None else None
+    await _prefetch_within(product_ids, client, deadline)
+    semaphore = asyncio.Semaphore(HYDRATION_MAX_CONCURRENCY)
+
+    async def fetch(pid: int) -> Optional[Dict]:
+        async with semaphore:
+            return await get_product_by_id(pid, client, stale_ids)
+
+    async def fetch_with_id(pid: int) -> tuple[int, Optional[Dict]]:
+        return pid, await fetch(pid)
+
+    tasks = [asyncio.ensure_future(fetch_with_id(pid)) for pid in product_ids]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=_remaining(deadline)):
+            try:
+                pid, res = await next_done
+            except TimeoutError:
+                break  # Prazo esgotado: o que não terminou é omitido
+            except Exception:
+                continue  # Ignora erros, como em get_products_details
+            if isinstance(res, dict):
+                yield product_cache.as_product(pid, res)
+        if omitted_ids is not None:
+            omitted_ids.update(pid for pid, task in zip(product_ids, tasks) if not task.done())
+    finally:
+        # Cliente desconectou no meio do streaming: cancela o que ainda falta
+        for task in tasks:
+            task.cancel()
@@ -1,17 +1,72 @@
+import os
+import asyncio
+import logging
+from dotenv import load_dotenv
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.concurrency import asynccontextmanager
-from aiqfome import models
-from aiqfome.routers import auth, clientes, favoritos
+from aiqfome import catalog, database, deadlines, fakestoreapi, metrics, migrations, models, profiling, purge, security
+from aiqfome.routers import auth, clientes, favoritos, ops
 from .database import engine
 from aiqfome.schemas import Message
 
-# Cria as tabelas no banco de dados na inicialização (para desenvolvimento)
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Esquema do banco na inicialização: "create_all" (desenvolvimento) ou "none" (produção:
+# o esquema é mantido pelas migrações versionadas, rodadas uma vez com python -m aiqfome.migrations)
+SCHEMA_MANAGEMENT = os.getenv("SCHEMA_MANAGEMENT", "create_all").lower()
+# Tempo máximo (segundos) para aquecer o catálogo/cache na inicialização; 0 desativa
+STARTUP_WARMUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_WARMUP_TIMEOUT_SECONDS", 10))
+
+
+async def warm_up() -> bool:
+    """
+    Prepara o worker antes de receber tráfego: abre conexões do pool, o cliente HTTP
+    da API externa e carrega o catálogo no cache. Retorna se o catálogo foi carregado.
+    """
+    await database.warm_pool()
+    if SCHEMA_MANAGEMENT == "none":
+        await migrations.check_schema()
+    # Cliente HTTP compartilhado (pool de conexões) para a API externa
+    await fakestoreapi.open_http_client()
+    if STARTUP_WARMUP_TIMEOUT_SECONDS <= 0:
+        return False
+    try:
+        async with asyncio.timeout(STARTUP_WARMUP_TIMEOUT_SECONDS):
+            if catalog.CATALOG_SYNC_INTERVAL_SECONDS > 0:
+                await catalog.resync_catalog()  # Atualiza o espelho e o cache de uma vez
+            else:
+                await fakestoreapi.get_all_products()
+        return True
+    except Exception:
+        # API externa fora do ar não impede a subida: o espelho local e o fallback continuam valendo
+        logger.warning("Não foi possível aquecer o catálogo na inicialização", exc_info=True)
+        return False
+
 @asynccontextmanager
 async def production_lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        # await conn.run_sync(models.Base.metadata.drop_all) # Opcional: limpa tudo ao reiniciar
-        await conn.run_sync(models.Base.metadata.create_all)
+    app.state.ready = False
+    if SCHEMA_MANAGEMENT == "create_all":
+        # Cria as tabelas no banco de dados na inicialização (para desenvolvimento)
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+    catalog_warmed = await warm_up()
+    # Mantém o espelho local do catálogo atualizado em segundo plano (se acabou de sincronizar, espera um ciclo)
+    sync_task = catalog.start_sync_task(
+        initial_delay=catalog.CATALOG_SYNC_INTERVAL_SECONDS if catalog_warmed else 0
+    )
+    # Remoções assíncronas de clientes interrompidas por um reinício
+    purge_task = purge.start_pending_purge_task()
+    app.state.ready = True
     yield
+    app.state.ready = False
+    await catalog.stop_sync_task(sync_task)
+    await catalog.stop_sync_task(purge_task)
+    await fakestoreapi.close_http_client()
+    if fakestoreapi.product_cache.shared is not None:
+        fakestoreapi.product_cache.shared.close()
+    security.shutdown_hash_pool()
 
 # --- A FÁBRICA DE APLICAÇÃO ---
 def create_app(lifespan=production_lifespan) -> FastAPI:
@@ -25,10 +80,20 @@ def create_app(lifespan=production_lifespan) -> FastAPI:
         lifespan=lifespan  # Usa o lifespan que for passado (ou o de produção como padrão)
     )
 
+    # Prazo por requisição (REQUEST_DEADLINE_SECONDS, encurtável pelo header X-Request-Timeout)
+    app.add_middleware(deadlines.DeadlineMiddleware)
+    # Profiling opt-in (PROFILING_SAMPLE_RATE / PROFILING_DEBUG_SECRET); sem configuração não faz nada
+    app.add_middleware(profiling.ProfilingMiddleware)
+    # Instrumentação: latência por rota, comandos SQL e chamadas à API externa (ver /metrics)
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(database.read_engine)
+
     # Inclui os roteadores
     app.include_router(clientes.router)
     app.include_router(favoritos.router)
     app.include_router(auth.router)
+    app.include_router(ops.router)
 
     return app
 
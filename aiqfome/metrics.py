@@ -0,0 +1,284 @@
+import re
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Métricas no formato texto do Prometheus, sem dependências externas.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+    def clear(self) -> None:
+        self._values.clear()
+
+
+class Histogram:
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Por conjunto de labels: [contagem por bucket..., soma, total]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._values.get(tuple(str(labels[name]) for name in self.labelnames))
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {int(series[-1])}")
+        return lines
+
+    def clear(self) -> None:
+        self._values.clear()
+
+
+# Coletores: funções chamadas no momento da leitura, retornando
+# (nome, tipo, descrição, [(labels, valor), ...]) — usados para estado atual (gauges).
+Sample = Tuple[Dict[str, str], float]
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector) -> Collector:
+        self._collectors.append(collector)
+        return collector
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        for metric in self._metrics:
+            metric.clear()
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- Requisições HTTP ---
+
+http_requests_total = REGISTRY.counter(
+    "http_requests_total", "Requisições HTTP por rota e status.", ("method", "route", "status")
+)
+http_request_duration_seconds = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP por rota.", ("method", "route")
+)
+http_request_db_statements = REGISTRY.histogram(
+    "http_request_db_statements", "Comandos SQL executados por requisição.", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+
+# Contador de comandos SQL da requisição em andamento
+_request_statements: ContextVar[Optional[List[int]]] = ContextVar("request_statements", default=None)
+# Tempo de espera por tipo (banco, API externa, bcrypt) da requisição em andamento; só é
+# preenchido quando alguém o ativa (ex.: o profiling), senão record_wait não faz nada
+request_waits: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_waits", default=None)
+
+def record_wait(kind: str, seconds: float) -> None:
+    waits = request_waits.get()
+    if waits is not None:
+        waits[kind] = waits.get(kind, 0.0) + seconds
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mede latência, status e comandos SQL por rota (template do path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        statements = [0]
+        token = _request_statements.set(statements)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            _request_statements.reset(token)
+            route = scope.get("route")
+            labels = {"method": scope["method"], "route": getattr(route, "path", "unmatched")}
+            http_requests_total.inc(**labels, status=str(status_code))
+            http_request_duration_seconds.observe(elapsed, **labels)
+            http_request_db_statements.observe(statements[0], **labels)
+
+
+# --- Banco de dados ---
+
+db_statement_duration_seconds = REGISTRY.histogram(
+    "db_statement_duration_seconds", "Duração dos comandos SQL, agrupados pelo formato do comando.", ("statement",)
+)
+
+# Limite de formatos distintos, para não explodir a cardinalidade das labels
+MAX_STATEMENT_SHAPES = 200
+# Limite do cache de SQL bruto -> formato (o mesmo formato tem um texto por tamanho de lista IN/VALUES)
+MAX_CACHED_STATEMENTS = 2000
+_PLACEHOLDERS = re.compile(r"\$\d+|%\(\w+\)s|\?")
+# Casts que o asyncpg acrescenta aos parâmetros ($1::INTEGER, $2::VARCHAR(255), $3::TIMESTAMP WITH TIME ZONE)
+_PLACEHOLDER_CASTS = re.compile(
+    r"\?::\w+(?:\s+(?:WITH|WITHOUT)\s+TIME\s+ZONE|\s+VARYING)?(?:\(\d+(?:\s*,\s*\d+)?\))?(?:\[\])*",
+    re.IGNORECASE,
+)
+_PLACEHOLDER_LISTS = re.compile(r"\(\?(?:\s*,\s*\?)+\)")
+_VALUES_LISTS = re.compile(r"(VALUES\s*\(\?\))(?:\s*,\s*\(\?\))+", re.IGNORECASE)
+_statement_shapes: Dict[str, str] = {}
+_known_shapes: Set[str] = set()
+
+def normalize_statement(statement: str) -> str:
+    """Normaliza o SQL (parâmetros, casts dos parâmetros e listas IN/VALUES)."""
+    shape = " ".join(statement.split())
+    shape = _PLACEHOLDERS.sub("?", shape)
+    shape = _PLACEHOLDER_CASTS.sub("?", shape)
+    shape = _PLACEHOLDER_LISTS.sub("(?)", shape)
+    return _VALUES_LISTS.sub(r"\1", shape)
+
+def statement_shape(statement: str) -> str:
+    """
+    Formato do comando para a label das métricas: até MAX_STATEMENT_SHAPES formatos distintos;
+    formatos novos além disso viram "other" (os já conhecidos continuam com a própria label).
+    """
+    shape = _statement_shapes.get(statement)
+    if shape is not None:
+        return shape
+    shape = normalize_statement(statement)
+    if shape not in _known_shapes:
+        if len(_known_shapes) >= MAX_STATEMENT_SHAPES:
+            return "other"
+        _known_shapes.add(shape)
+    if len(_statement_shapes) < MAX_CACHED_STATEMENTS:
+        _statement_shapes[statement] = shape
+    return shape
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+    statements = _request_statements.get()
+    if statements is not None:
+        statements[0] += 1
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started_at")
+    if started:
+        elapsed = time.perf_counter() - started.pop()
+        db_statement_duration_seconds.observe(elapsed, statement=statement_shape(statement))
+        record_wait("db", elapsed)
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started_at") if exception_context.connection else None
+    if started:
+        started.pop()
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Registra os hooks de tempo por comando SQL no engine (idempotente)."""
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+# --- API externa ---
+
+upstream_request_duration_seconds = REGISTRY.histogram(
+    "upstream_request_duration_seconds", "Duração das chamadas à API externa, por operação e resultado.",
+    ("operation", "outcome"),
+)
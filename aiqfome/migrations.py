@@ -0,0 +1,270 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+# Migrações versionadas do esquema. Rodam uma única vez, fora da inicialização
+# dos workers (python -m aiqfome.migrations), e ficam registradas em schema_migrations.
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+# Chave do advisory lock do PostgreSQL: duas execuções simultâneas não aplicam a mesma migração
+_ADVISORY_LOCK_KEY = 730_145_001
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[AsyncConnection], Awaitable[None]]
+    # Etapa opcional fora de transação (autocommit), antes de `upgrade`: para operações
+    # online como CREATE INDEX CONCURRENTLY. Deve poder ser repetida após uma falha.
+    prepare: Optional[Callable[[AsyncConnection], Awaitable[None]]] = None
+    # Etapa opcional fora de transação depois de `upgrade` (ex.: VALIDATE CONSTRAINT,
+    # que varre a tabela sem bloquear escritas). Roda em toda execução enquanto a migração
+    # estiver aplicada, para concluir uma finalização interrompida: deve ser idempotente.
+    finalize: Optional[Callable[[AsyncConnection], Awaitable[None]]] = None
+
+
+# Esquema da versão 1, congelado: o que o create_all dos modelos gerava quando as migrações foram
+# introduzidas. Não acompanha os modelos; toda mudança de esquema entra como uma nova migração.
+_BASELINE_TABLES = {
+    "clients": (
+        "CREATE TABLE clients (id {serial} NOT NULL, name VARCHAR NOT NULL, email VARCHAR NOT NULL,"
+        " hashed_password VARCHAR NOT NULL, PRIMARY KEY (id))",
+        "CREATE INDEX ix_clients_id ON clients (id)",
+        "CREATE UNIQUE INDEX ix_clients_email ON clients (email)",
+    ),
+    "favorite_products": (
+        "CREATE TABLE favorite_products (id {serial} NOT NULL, product_id INTEGER NOT NULL,"
+        " client_id INTEGER NOT NULL, PRIMARY KEY (id),"
+        " CONSTRAINT unic_client_product UNIQUE (client_id, product_id),"
+        " FOREIGN KEY (client_id) REFERENCES clients (id))",
+        "CREATE INDEX ix_favorite_products_id ON favorite_products (id)",
+    ),
+    "products": (
+        "CREATE TABLE products (id INTEGER NOT NULL, title VARCHAR NOT NULL, price FLOAT NOT NULL,"
+        " description TEXT NOT NULL, category VARCHAR NOT NULL, image VARCHAR NOT NULL,"
+        " rating_rate FLOAT, rating_count INTEGER, synced_at {timestamptz} NOT NULL, PRIMARY KEY (id))",
+    ),
+}
+_BASELINE_TYPES = {
+    "postgresql": {"serial": "SERIAL", "timestamptz": "TIMESTAMP WITH TIME ZONE"},
+    "sqlite": {"serial": "INTEGER", "timestamptz": "DATETIME"},
+}
+
+async def _baseline(conn: AsyncConnection) -> None:
+    # Bancos criados pelo antigo create_all já têm as tabelas: só as que faltam são criadas.
+    # As migrações seguintes devem verificar o estado atual antes de alterar o esquema.
+    existing = await conn.run_sync(lambda sync_conn: set(inspect(sync_conn).get_table_names()))
+    types = _BASELINE_TYPES["postgresql" if conn.dialect.name == "postgresql" else "sqlite"]
+    for table, statements in _BASELINE_TABLES.items():
+        if table in existing:
+            continue
+        for statement in statements:
+            await conn.execute(text(statement.format(**types)))
+
+
+async def _columns(conn: AsyncConnection, table: str) -> set:
+    return await conn.run_sync(lambda sync_conn: {c["name"] for c in inspect(sync_conn).get_columns(table)})
+
+async def _add_client_version(conn: AsyncConnection) -> None:
+    if "version" not in await _columns(conn, "clients"):
+        await conn.execute(text("ALTER TABLE clients ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+
+
+async def _drop_invalid_index(conn: AsyncConnection, name: str) -> None:
+    # Um CREATE INDEX CONCURRENTLY interrompido deixa um índice inválido, que o IF NOT EXISTS
+    # não reconstrói: descarta para recomeçar
+    invalid = (await conn.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid"
+        " WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": name})).first()
+    if invalid:
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY {name}"))
+
+
+# Índice único construído sem bloquear escritas e depois promovido a chave primária
+_FAVORITES_PK_INDEX = "favorite_products_pk_new"
+
+async def _prepare_favorites_composite_pk(conn: AsyncConnection) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    # DROP/CREATE INDEX CONCURRENTLY não bloqueiam leituras nem escritas durante a construção
+    await conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_clients_id"))  # Duplicava a chave primária
+    if "id" not in await _columns(conn, "favorite_products"):
+        return
+    await _drop_invalid_index(conn, _FAVORITES_PK_INDEX)
+    await conn.execute(text(
+        f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {_FAVORITES_PK_INDEX}"
+        " ON favorite_products (client_id, product_id)"
+    ))
+
+async def _favorites_composite_pk(conn: AsyncConnection) -> None:
+    """Troca o id substituto de favorite_products pela chave primária (client_id, product_id)."""
+    if "id" not in await _columns(conn, "favorite_products"):
+        await conn.execute(text("DROP INDEX IF EXISTS ix_clients_id"))
+        return
+    if conn.dialect.name == "postgresql":
+        # Só alterações de catálogo (o índice já existe): o lock exclusivo dura milissegundos,
+        # e o lock_timeout evita enfileirar as requisições atrás de uma transação longa
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        for statement in (
+            "ALTER TABLE favorite_products DROP CONSTRAINT favorite_products_pkey",
+            "ALTER TABLE favorite_products DROP CONSTRAINT IF EXISTS unic_client_product",
+            "ALTER TABLE favorite_products DROP COLUMN id",  # Leva junto ix_favorite_products_id
+            f"ALTER TABLE favorite_products ADD CONSTRAINT favorite_products_pkey"
+            f" PRIMARY KEY USING INDEX {_FAVORITES_PK_INDEX}",
+        ):
+            await conn.execute(text(statement))
+        return
+    # SQLite não altera chaves primárias: recria a tabela (WITHOUT ROWID, na ordem da chave)
+    for statement in (
+        "CREATE TABLE favorite_products_new ("
+        " client_id INTEGER NOT NULL REFERENCES clients (id), product_id INTEGER NOT NULL,"
+        " PRIMARY KEY (client_id, product_id)) WITHOUT ROWID",
+        "INSERT INTO favorite_products_new (client_id, product_id)"
+        " SELECT client_id, product_id FROM favorite_products",
+        "DROP TABLE favorite_products",
+        "ALTER TABLE favorite_products_new RENAME TO favorite_products",
+        "DROP INDEX IF EXISTS ix_clients_id",
+    ):
+        await conn.execute(text(statement))
+
+
+async def _favorites_on_delete_cascade(conn: AsyncConnection) -> None:
+    """ON DELETE CASCADE em favorite_products.client_id e a coluna clients.deleted_at."""
+    if "deleted_at" not in await _columns(conn, "clients"):
+        await conn.execute(text("ALTER TABLE clients ADD COLUMN deleted_at TIMESTAMP WITH TIME ZONE"))
+    foreign_keys = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_foreign_keys("favorite_products"))
+    if any((fk.get("options") or {}).get("ondelete", "").upper() == "CASCADE" for fk in foreign_keys):
+        return
+    if conn.dialect.name == "postgresql":
+        # NOT VALID dispensa a varredura com a tabela bloqueada; a validação fica para o finalize
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        for fk in foreign_keys:
+            await conn.execute(text(f'ALTER TABLE favorite_products DROP CONSTRAINT "{fk["name"]}"'))
+        await conn.execute(text(
+            "ALTER TABLE favorite_products ADD CONSTRAINT favorite_products_client_id_fkey"
+            " FOREIGN KEY (client_id) REFERENCES clients (id) ON DELETE CASCADE NOT VALID"
+        ))
+        return
+    # SQLite não altera chaves estrangeiras: recria a tabela
+    for statement in (
+        "CREATE TABLE favorite_products_new ("
+        " client_id INTEGER NOT NULL, product_id INTEGER NOT NULL, PRIMARY KEY (client_id, product_id),"
+        " FOREIGN KEY (client_id) REFERENCES clients (id) ON DELETE CASCADE) WITHOUT ROWID",
+        "INSERT INTO favorite_products_new (client_id, product_id)"
+        " SELECT client_id, product_id FROM favorite_products",
+        "DROP TABLE favorite_products",
+        "ALTER TABLE favorite_products_new RENAME TO favorite_products",
+    ):
+        await conn.execute(text(statement))
+
+async def _finalize_favorites_on_delete_cascade(conn: AsyncConnection) -> None:
+    if conn.dialect.name == "postgresql":
+        # Sem efeito se a chave já foi validada
+        await conn.execute(text("ALTER TABLE favorite_products VALIDATE CONSTRAINT favorite_products_client_id_fkey"))
+        await _drop_invalid_index(conn, "ix_clients_pending_purge")
+        await conn.execute(text(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_clients_pending_purge"
+            " ON clients (id) WHERE deleted_at IS NOT NULL"
+        ))
+    else:
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_clients_pending_purge ON clients (id) WHERE deleted_at IS NOT NULL"
+        ))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", _baseline),
+    Migration(2, "client_version", _add_client_version),
+    Migration(3, "favorites_composite_pk", _favorites_composite_pk, _prepare_favorites_composite_pk),
+    Migration(4, "favorites_on_delete_cascade", _favorites_on_delete_cascade,
+              finalize=_finalize_favorites_on_delete_cascade),
+]
+
+
+# --- Execução ---
+
+async def _has_version_table(conn: AsyncConnection) -> bool:
+    return await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(schema_migrations.name))
+
+async def current_version(conn: AsyncConnection) -> int:
+    """Última versão aplicada (0 se o banco nunca passou pelas migrações)."""
+    if not await _has_version_table(conn):
+        return 0
+    return (await conn.execute(select(func.max(schema_migrations.c.version)))).scalar() or 0
+
+async def pending_migrations(conn: AsyncConnection) -> List[Migration]:
+    version = await current_version(conn)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+async def upgrade(async_engine: AsyncEngine = engine) -> List[int]:
+    """Aplica as migrações pendentes, cada uma na sua transação. Retorna as versões aplicadas."""
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.prepare is not None:
+            async with async_engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                if migration.version > await current_version(conn):
+                    logger.info("Preparando migração %d (%s)", migration.version, migration.name)
+                    await migration.prepare(conn)
+        async with async_engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+            await conn.run_sync(lambda sync_conn: _metadata.create_all(sync_conn))
+            if migration.version > await current_version(conn):
+                logger.info("Aplicando migração %d (%s)", migration.version, migration.name)
+                await migration.upgrade(conn)
+                await conn.execute(insert(schema_migrations).values(
+                    version=migration.version, name=migration.name, applied_at=datetime.now(timezone.utc)
+                ))
+                applied.append(migration.version)
+        if migration.finalize is not None:
+            # Também para migrações de execuções anteriores: o finalize pode ter falhado depois
+            # do commit da versão (ex.: VALIDATE CONSTRAINT ou CREATE INDEX CONCURRENTLY interrompidos)
+            async with async_engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await migration.finalize(conn)
+    return applied
+
+async def check_schema(async_engine: AsyncEngine = engine) -> Optional[int]:
+    """Versão atual do esquema, avisando se houver migrações pendentes."""
+    async with async_engine.connect() as conn:
+        pending = await pending_migrations(conn)
+        version = await current_version(conn)
+    if pending:
+        logger.warning(
+            "Esquema na versão %d com %d migração(ões) pendente(s): rode python -m aiqfome.migrations",
+            version, len(pending),
+        )
+    return version
+
+
+if __name__ == "__main__":
+    # Aplicação manual das migrações: python -m aiqfome.migrations
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main():
+        try:
+            applied = await upgrade()
+            logger.info("Migrações aplicadas: %s", applied or "nenhuma (esquema atualizado)")
+        finally:
+            await engine.dispose()
+
+    asyncio.run(_main())
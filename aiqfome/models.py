@@ -1,27 +1,54 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, Text, ForeignKey, text
 from sqlalchemy.orm import relationship
 from .database import Base
 
 class Client(Base):
     __tablename__ = "clients"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
+    # Incrementado a cada alteração do cliente ou dos seus favoritos (base do ETag)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Preenchido na remoção assíncrona: o cliente some na hora e os favoritos são apagados em lotes
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
 
-    favorites = relationship("FavoriteProduct", back_populates="owner", cascade="all, delete-orphan")
+    # passive_deletes: o ON DELETE CASCADE do banco apaga os favoritos, sem carregá-los na sessão
+    favorites = relationship("FavoriteProduct", back_populates="owner", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        Index(
+            "ix_clients_pending_purge", "id",
+            postgresql_where=text("deleted_at IS NOT NULL"), sqlite_where=text("deleted_at IS NOT NULL"),
+        ),
+    )
 
 
 class FavoriteProduct(Base):
     __tablename__ = "favorite_products"
 
-    id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, nullable=False)
-    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    # Chave primária (client_id, product_id): um único B-tree garante a unicidade, atende a
+    # FK e serve a listagem do cliente só pelo índice (sem id substituto nem índices extras)
+    client_id = Column(Integer, ForeignKey("clients.id", ondelete="CASCADE"), primary_key=True, autoincrement=False)
+    product_id = Column(Integer, primary_key=True, autoincrement=False)
 
     owner = relationship("Client", back_populates="favorites")
 
-    __table_args__ = (
-        UniqueConstraint("client_id", "product_id", name="unic_client_product"),
-    )
\ No newline at end of file
+    # No SQLite, WITHOUT ROWID guarda as linhas na própria ordem da chave primária
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class Product(Base):
+    """Espelho local do catálogo da API externa (sincronizado em segundo plano)."""
+    __tablename__ = "products"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String, nullable=False)
+    price = Column(Float, nullable=False)
+    description = Column(Text, nullable=False)
+    category = Column(String, nullable=False)
+    image = Column(String, nullable=False)
+    rating_rate = Column(Float, nullable=True)
+    rating_count = Column(Integer, nullable=True)
+    synced_at = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,260 @@
+import os
+import re
+import hmac
+import json
+import time
+import uuid
+import random
+import asyncio
+import cProfile
+import hashlib
+import logging
+import pstats
+import tempfile
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+from . import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Profiling sob demanda (desligado por padrão). Uma requisição é perfilada se cair na
+# amostragem ou se trouxer um header de depuração assinado com PROFILING_DEBUG_SECRET.
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0))
+PROFILING_DEBUG_SECRET = os.getenv("PROFILING_DEBUG_SECRET", "")
+PROFILING_DIR = os.getenv("PROFILING_DIR") or os.path.join(tempfile.gettempdir(), "aiqfome-profiles")
+# Retenção: perfis mais antigos são apagados acima de qualquer um dos limites
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", 200))
+PROFILING_MAX_BYTES = int(os.getenv("PROFILING_MAX_BYTES", 100 * 1024 * 1024))
+
+DEBUG_HEADER = "x-debug-profile"
+REQUEST_ID_HEADER = "x-request-id"
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+profiles_captured_total = metrics.REGISTRY.counter(
+    "profiles_captured_total", "Requisições perfiladas, por gatilho.", ("trigger",)
+)
+profiles_skipped_total = metrics.REGISTRY.counter(
+    "profiles_skipped_total", "Requisições que seriam perfiladas e não foram.", ("reason",)
+)
+
+
+# --- Header de depuração assinado ---
+
+def sign_debug_token(secret: str, expires_at: int) -> str:
+    """Valor do header X-Debug-Profile válido até `expires_at` (epoch em segundos)."""
+    signature = hmac.new(secret.encode(), str(expires_at).encode(), hashlib.sha256).hexdigest()
+    return f"{expires_at}.{signature}"
+
+def verify_debug_token(secret: str, token: str, now: Optional[float] = None) -> bool:
+    if not secret or not token:
+        return False
+    expires_at, _, signature = token.partition(".")
+    if not expires_at.isdigit() or int(expires_at) < (now if now is not None else time.time()):
+        return False
+    return hmac.compare_digest(sign_debug_token(secret, int(expires_at)), token)
+
+
+# --- Perfil da requisição ---
+
+@dataclass
+class RequestProfile:
+    profiler: cProfile.Profile
+    waits: Dict[str, float] = field(default_factory=dict)
+    # Perfis das tarefas que rodaram em threads (ex.: bcrypt), somados ao final
+    thread_profiles: List[cProfile.Profile] = field(default_factory=list)
+    thread_cpu_seconds: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+_active: ContextVar[Optional[RequestProfile]] = ContextVar("active_profile", default=None)
+
+def wrap_thread_task(task: Callable[[], T]) -> Callable[[], T]:
+    """Se a requisição atual está sob profiling, perfila também a tarefa enviada a uma thread."""
+    profile = _active.get()
+    if profile is None:
+        return task
+
+    def profiled() -> T:
+        profiler = cProfile.Profile()
+        cpu_started_at = time.thread_time()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: o profiler da requisição já observa todas as threads
+            return task()
+        try:
+            return task()
+        finally:
+            profiler.disable()
+            with profile.lock:
+                profile.thread_profiles.append(profiler)
+                profile.thread_cpu_seconds += time.thread_time() - cpu_started_at
+
+    return profiled
+
+
+def _route_slug(route_path: str) -> str:
+    return _SAFE_NAME.sub("_", route_path.strip("/").replace("/", "_").replace("{", "").replace("}", "")) or "root"
+
+def prune(directory: str, max_files: int = PROFILING_MAX_FILES, max_bytes: int = PROFILING_MAX_BYTES) -> int:
+    """Apaga os perfis mais antigos (.prof e o .json ao lado) acima dos limites. Retorna quantos saíram."""
+    profiles = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".prof"):
+            sidecar = entry.path[:-len(".prof")] + ".json"
+            size = entry.stat().st_size + (os.path.getsize(sidecar) if os.path.exists(sidecar) else 0)
+            profiles.append((entry.stat().st_mtime, entry.path, sidecar, size))
+    profiles.sort(reverse=True)  # Mais recentes primeiro
+    kept_bytes, removed = 0, 0
+    for index, (_, path, sidecar, size) in enumerate(profiles):
+        if index < max_files and kept_bytes + size <= max_bytes:
+            kept_bytes += size
+            continue
+        for stale in (path, sidecar):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+        removed += 1
+    return removed
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI de profiling opt-in. A requisição escolhida roda sob o cProfile (CPU do
+    handler, validação do pydantic, SQLAlchemy e, via `wrap_thread_task`, o bcrypt no pool)
+    e grava em PROFILING_DIR um .prof (formato pstats: snakeviz, python -m pstats) e um .json
+    com o tempo de parede, CPU e esperas por tipo (banco, API externa, bcrypt).
+
+    O cProfile observa o event loop inteiro: requisições concorrentes entram no perfil (o
+    .json registra quantas havia). Por isso só uma requisição é perfilada por vez.
+    """
+
+    def __init__(
+        self,
+        app,
+        sample_rate: Optional[float] = None,
+        debug_secret: Optional[str] = None,
+        directory: Optional[str] = None,
+        max_files: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.app = app
+        self.sample_rate = PROFILING_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.debug_secret = PROFILING_DEBUG_SECRET if debug_secret is None else debug_secret
+        self.directory = directory or PROFILING_DIR
+        self.max_files = PROFILING_MAX_FILES if max_files is None else max_files
+        self.max_bytes = PROFILING_MAX_BYTES if max_bytes is None else max_bytes
+        self.enabled = self.sample_rate > 0 or bool(self.debug_secret)
+        self.in_flight = 0
+        self._busy = False
+
+    def _trigger(self, headers: Dict[bytes, bytes]) -> Optional[str]:
+        token = headers.get(DEBUG_HEADER.encode(), b"").decode("latin-1")
+        if token and verify_debug_token(self.debug_secret, token):
+            return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            trigger = self._trigger(dict(scope["headers"]))
+            if trigger is None:
+                await self.app(scope, receive, send)
+            elif self._busy:
+                profiles_skipped_total.inc(reason="busy")
+                await self.app(scope, receive, send)
+            else:
+                await self._profile(scope, receive, send, trigger)
+        finally:
+            self.in_flight -= 1
+
+    async def _profile(self, scope, receive, send, trigger: str):
+        headers = dict(scope["headers"])
+        request_id = _SAFE_NAME.sub("", headers.get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1"))[:64]
+        request_id = request_id or uuid.uuid4().hex
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", request_id.encode())]
+            await send(message)
+
+        profile = RequestProfile(profiler=cProfile.Profile())
+        try:
+            profile.profiler.enable()
+        except ValueError:  # Outro profiler ativo no processo
+            profiles_skipped_total.inc(reason="profiler_active")
+            await self.app(scope, receive, send)
+            return
+        self._busy = True
+        concurrent = self.in_flight - 1
+        profile_token = _active.set(profile)
+        waits_token = metrics.request_waits.set(profile.waits)
+        started_at, cpu_started_at = time.perf_counter(), time.thread_time()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.profiler.disable()
+            wall, cpu = time.perf_counter() - started_at, time.thread_time() - cpu_started_at
+            metrics.request_waits.reset(waits_token)
+            _active.reset(profile_token)
+            self._busy = False
+            route = getattr(scope.get("route"), "path", "unmatched")
+            summary = {
+                "request_id": request_id,
+                "method": scope["method"],
+                "route": route,
+                "path": scope["path"],
+                "status": status_code,
+                "trigger": trigger,
+                "concurrent_requests": concurrent,
+                "wall_seconds": round(wall, 6),
+                "cpu_seconds": round(cpu, 6),
+                "thread_cpu_seconds": round(profile.thread_cpu_seconds, 6),
+                "waits_seconds": {kind: round(seconds, 6) for kind, seconds in sorted(profile.waits.items())},
+                # Tempo em await fora do que foi medido (event loop ocupado, rede do cliente, sleeps)
+                "other_wait_seconds": round(max(wall - cpu - sum(profile.waits.values()), 0.0), 6),
+            }
+            name = f"{int(time.time() * 1000)}-{scope['method']}-{_route_slug(route)}-{request_id}"
+            try:
+                await asyncio.to_thread(self._write, name, profile, summary)
+                profiles_captured_total.inc(trigger=trigger)
+            except OSError:
+                logger.warning("Falha ao gravar o perfil da requisição %s", request_id, exc_info=True)
+
+    def _write(self, name: str, profile: RequestProfile, summary: Dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        stats = pstats.Stats(profile.profiler)
+        for thread_profiler in profile.thread_profiles:
+            stats.add(thread_profiler)
+        base = os.path.join(self.directory, name)
+        stats.dump_stats(base + ".prof")
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+        prune(self.directory, self.max_files, self.max_bytes)
+
+
+if __name__ == "__main__":
+    # Gera o header de depuração: python -m aiqfome.profiling [segundos de validade]
+    import sys
+
+    if not PROFILING_DEBUG_SECRET:
+        sys.exit("PROFILING_DEBUG_SECRET não configurado")
+    ttl = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    print(f"X-Debug-Profile: {sign_debug_token(PROFILING_DEBUG_SECRET, int(time.time()) + ttl)}")
@@ -0,0 +1,88 @@
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from . import crud
+from .database import AsyncSessionLocal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Remoção de clientes: "sync" (um DELETE com ON DELETE CASCADE, na requisição) ou "async"
+# (a requisição só marca o cliente; os favoritos saem em lotes depois da resposta)
+CLIENT_PURGE_MODE = os.getenv("CLIENT_PURGE_MODE", "sync").lower()
+# Favoritos apagados por transação na remoção assíncrona
+CLIENT_PURGE_BATCH_SIZE = int(os.getenv("CLIENT_PURGE_BATCH_SIZE", 5000))
+
+# Chave do advisory lock (junto com o id do cliente) que elege um único dono para cada remoção
+_PURGE_LOCK_KEY = 730_145_002
+
+
+@asynccontextmanager
+async def _purge_lock(client_id: int) -> AsyncIterator[bool]:
+    """
+    Advisory lock do PostgreSQL por cliente, em uma conexão própria durante toda a limpeza:
+    com vários workers (todos retomam as remoções pendentes ao subir), só quem obtém o lock
+    remove o cliente; os demais pulam. No SQLite (um processo) não há disputa.
+    """
+    async with AsyncSessionLocal() as lock_db:
+        if lock_db.bind.dialect.name != "postgresql":
+            yield True
+            return
+        params = {"key": _PURGE_LOCK_KEY, "client_id": client_id}
+        acquired = (await lock_db.execute(text("SELECT pg_try_advisory_lock(:key, :client_id)"), params)).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                # Lock de sessão: sobreviveria à devolução da conexão ao pool
+                await lock_db.execute(text("SELECT pg_advisory_unlock(:key, :client_id)"), params)
+
+
+async def purge_client(client_id: int, batch_size: Optional[int] = None) -> int:
+    """
+    Apaga os favoritos de um cliente marcado em lotes (transações curtas, sem segurar locks
+    nem gerar um único pico de WAL) e por fim a linha do cliente. Retorna os favoritos apagados.
+    """
+    batch_size = batch_size or CLIENT_PURGE_BATCH_SIZE
+    purged = 0
+    async with _purge_lock(client_id) as acquired:
+        if not acquired:
+            logger.info("Cliente %d já está sendo removido por outro worker", client_id)
+            return 0
+        async with AsyncSessionLocal() as db:
+            while removed := await crud.purge_favorites_batch(db, client_id, batch_size):
+                purged += removed
+                await asyncio.sleep(0)  # Cede o event loop entre os lotes
+            await crud.delete_client(db, client_id)
+    logger.info("Cliente %d removido: %d favoritos apagados", client_id, purged)
+    return purged
+
+async def purge_pending_clients() -> int:
+    """
+    Conclui remoções interrompidas (ex.: worker reiniciado no meio da limpeza). Roda em todos os
+    workers ao subir; o lock por cliente garante que cada remoção tenha um só dono.
+    """
+    async with AsyncSessionLocal() as db:
+        pending = await crud.get_clients_pending_purge(db)
+    for client_id in pending:
+        await purge_client(client_id)
+    return len(pending)
+
+def start_pending_purge_task() -> Optional[asyncio.Task]:
+    if CLIENT_PURGE_MODE != "async":
+        return None
+
+    async def run():
+        try:
+            await purge_pending_clients()
+        except Exception:
+            logger.exception("Falha ao concluir remoções de clientes pendentes")
+
+    return asyncio.create_task(run())
@@ -0,0 +1,209 @@
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from . import metrics
+from .serialization import dumps, loads
+
+load_dotenv()
+
+# Cache da listagem de favoritos já hidratada e serializada, por cliente (0 desativa)
+FAVORITES_CACHE_TTL_SECONDS = float(os.getenv("FAVORITES_CACHE_TTL_SECONDS", 30))
+FAVORITES_CACHE_MAX_BYTES = int(os.getenv("FAVORITES_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+FAVORITES_CACHE_MAX_CLIENTS = int(os.getenv("FAVORITES_CACHE_MAX_CLIENTS", 10000))
+# Processos servindo a API (o aiqfome-server define; é a mesma convenção do uvicorn e do gunicorn).
+# Com mais de um, um backend local não serve: a invalidação de uma escrita só alcança o worker
+# que a recebeu, e os outros devolveriam a listagem antiga (quebrando o read-your-writes).
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+
+
+# --- Backends ---
+
+class ResponseCacheBackend(ABC):
+    """
+    Interface dos backends: respostas em bytes agrupadas por cliente e variante
+    (página/formato). A geração do cliente avança a cada invalidação, e `set` só
+    grava se ela não mudou desde a leitura — um Redis implementaria com um HASH
+    por cliente e um INCR da geração (WATCH/MULTI ou script Lua no set).
+    """
+
+    # Visto por todos os workers (ex.: Redis)? Backends locais só valem com um único processo
+    shared: bool = False
+
+    @abstractmethod
+    async def get(self, client_id: int, variant: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    async def generation(self, client_id: int) -> int: ...
+
+    @abstractmethod
+    async def set(self, client_id: int, variant: str, value: bytes, ttl: float, generation: int) -> bool: ...
+
+    @abstractmethod
+    async def invalidate(self, client_id: int) -> None: ...
+
+    @abstractmethod
+    async def clear(self) -> None: ...
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+@dataclass
+class _ClientEntry:
+    generation: int
+    variants: Dict[str, Tuple[float, bytes]] = field(default_factory=dict)
+    size: int = 0
+
+
+class InMemoryResponseCache(ResponseCacheBackend):
+    """Backend local do processo: LRU por cliente, limitado em bytes e em número de clientes."""
+
+    def __init__(
+        self,
+        max_bytes: int = FAVORITES_CACHE_MAX_BYTES,
+        max_clients: int = FAVORITES_CACHE_MAX_CLIENTS,
+        clock=time.monotonic,
+    ):
+        self.max_bytes = max_bytes
+        self.max_clients = max_clients
+        self._clock = clock
+        self._entries: OrderedDict[int, _ClientEntry] = OrderedDict()
+        self._bytes = 0
+        self._next_generation = 0
+        # Geração de quem não tem entrada: nunca menor que a de uma entrada já descartada
+        self._generation_floor = 0
+        self.evictions = 0
+
+    async def get(self, client_id: int, variant: str) -> Optional[bytes]:
+        entry = self._entries.get(client_id)
+        if entry is None or variant not in entry.variants:
+            return None
+        expires_at, value = entry.variants[variant]
+        if expires_at <= self._clock():
+            self._drop_variant(entry, variant)
+            return None
+        self._entries.move_to_end(client_id)
+        return value
+
+    async def generation(self, client_id: int) -> int:
+        entry = self._entries.get(client_id)
+        return entry.generation if entry is not None else self._generation_floor
+
+    async def set(self, client_id: int, variant: str, value: bytes, ttl: float, generation: int) -> bool:
+        if generation != await self.generation(client_id) or len(value) > self.max_bytes:
+            return False  # Invalidado durante a montagem da resposta (ou grande demais)
+        entry = self._entries.get(client_id)
+        if entry is None:
+            entry = self._entries[client_id] = _ClientEntry(generation)
+        self._drop_variant(entry, variant)
+        entry.variants[variant] = (self._clock() + ttl, value)
+        entry.size += len(value)
+        self._bytes += len(value)
+        self._entries.move_to_end(client_id)
+        self._evict()
+        return True
+
+    async def invalidate(self, client_id: int) -> None:
+        self._next_generation = max(self._next_generation, self._generation_floor) + 1
+        entry = self._entries.pop(client_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        # A entrada vazia guarda a nova geração (descarta respostas montadas antes da escrita)
+        self._entries[client_id] = _ClientEntry(self._next_generation)
+        self._evict()
+
+    async def clear(self) -> None:
+        self._next_generation = max(self._next_generation, self._generation_floor) + 1
+        self._generation_floor = self._next_generation
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"clients": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+    def _drop_variant(self, entry: _ClientEntry, variant: str) -> None:
+        old = entry.variants.pop(variant, None)
+        if old is not None:
+            entry.size -= len(old[1])
+            self._bytes -= len(old[1])
+
+    def _evict(self) -> None:
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_clients):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self._generation_floor = max(self._generation_floor, entry.generation)
+            self.evictions += 1
+
+
+# --- Cache da listagem de favoritos ---
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    headers: Dict[str, str]
+
+
+class FavoritesResponseCache:
+    """Fachada usada pelas rotas: empacota corpo + headers e conta acertos e falhas."""
+
+    def __init__(self, backend: ResponseCacheBackend, ttl: float = FAVORITES_CACHE_TTL_SECONDS,
+                 workers: int = WEB_CONCURRENCY):
+        self.backend = backend
+        self.ttl = ttl
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        # Backend local com vários workers fica desligado (ver WEB_CONCURRENCY)
+        return self.ttl > 0 and (self.backend.shared or self.workers <= 1)
+
+    async def get(self, client_id: int, variant: str) -> Optional[CachedResponse]:
+        value = await self.backend.get(client_id, variant)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        header_line, body = value.split(b"\n", 1)
+        return CachedResponse(body=body, headers=loads(header_line))
+
+    async def generation(self, client_id: int) -> int:
+        return await self.backend.generation(client_id)
+
+    async def set(self, client_id: int, variant: str, response: CachedResponse, generation: int) -> bool:
+        # Primeira linha: headers em JSON (sem quebras de linha); depois, o corpo já serializado
+        value = dumps(response.headers) + b"\n" + response.body
+        return await self.backend.set(client_id, variant, value, self.ttl, generation)
+
+    async def invalidate(self, client_id: int) -> None:
+        if self.enabled:
+            await self.backend.invalidate(client_id)
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+
+favorites_cache = FavoritesResponseCache(InMemoryResponseCache())
+
+
+@metrics.REGISTRY.register_collector
+def _collect_metrics():
+    yield "favorites_response_cache_hits_total", "counter", "Listagens de favoritos servidas do cache.", [
+        ({}, favorites_cache.hits)
+    ]
+    yield "favorites_response_cache_misses_total", "counter", "Listagens de favoritos fora do cache.", [
+        ({}, favorites_cache.misses)
+    ]
+    for key, value in favorites_cache.backend.stats().items():
+        kind = "counter" if key == "evictions" else "gauge"
+        suffix = "_total" if kind == "counter" else ""
+        yield f"favorites_response_cache_{key}{suffix}", kind, f"Cache de listagens de favoritos: {key}.", [
+            ({}, value)
+        ]
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from aiqfome import crud, schemas, security
+from aiqfome import admission, crud, schemas, security
 from aiqfome.database import get_db
 from fastapi.security import OAuth2PasswordRequestForm
 
@@ -8,7 +8,17 @@ from fastapi.security import OAuth2PasswordRequestForm
 router = APIRouter(tags=["Authentication"])
 
 # --- Endpoints de Autenticação ---
-@router.post("/token", response_model=schemas.Token, summary="Obter Token de Acesso")
+# bcrypt é caro: limites por IP e por conta, e concorrência limitada com descarte de carga
+@router.post("/token", response_model=schemas.Token, summary="Obter Token de Acesso",
+        dependencies=[
+            Depends(admission.limit_by_ip(admission.login_ip_limiter)),
+            Depends(admission.limit_by_login_account(admission.login_account_limiter)),
+            Depends(admission.limit_concurrency(admission.password_hash_concurrency)),
+        ],
+        responses={
+        status.HTTP_429_TOO_MANY_REQUESTS: {"description": "Muitas tentativas (ver Retry-After)"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Servidor sobrecarregado (ver Retry-After)"},
+    })
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), 
     db: AsyncSession = Depends(get_db)
@@ -18,11 +28,18 @@ async def login_for_access_token(
     """
         
     client = await crud.get_client_by_email(db, email=form_data.username)
-    if not client or not security.verify_password(form_data.password, client.hashed_password):
+    valid, new_hash = False, None
+    if client:
+        # bcrypt roda no pool dedicado, fora do event loop
+        valid, new_hash = await security.verify_and_update_password(form_data.password, client.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = security.create_access_token(data={"sub": client.email})
+    access_token = security.create_access_token(data={"sub": client.email, "client_id": client.id})
+    if new_hash:
+        # Atualiza de forma transparente hashes com custo desatualizado
+        await crud.update_client_password_hash(db, client.id, new_hash)
     return {"access_token": access_token, "token_type": "bearer"}
@@ -1,42 +1,87 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from aiqfome import crud, dependencies, models, schemas
-from aiqfome.database import get_db
+from aiqfome import admission, crud, dependencies, etags, purge, schemas
+from aiqfome.database import get_db, primary_pins
+from aiqfome.response_cache import favorites_cache
 
 
 router = APIRouter(prefix='/clients', tags=['clients'])
 
 # --- Endpoints de Clientes ---
 
-@router.post("/", response_model=schemas.Client, status_code=status.HTTP_201_CREATED, summary="Criar um novo cliente")
+@router.post("/", response_model=schemas.Client, status_code=status.HTTP_201_CREATED, summary="Criar um novo cliente",
+        dependencies=[
+            Depends(admission.limit_by_ip(admission.signup_ip_limiter)),
+            Depends(admission.limit_concurrency(admission.password_hash_concurrency)),
+        ],
+        responses={
+        status.HTTP_429_TOO_MANY_REQUESTS: {"description": "Muitas tentativas (ver Retry-After)"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Servidor sobrecarregado (ver Retry-After)"},
+    })
 async def create_client(client: schemas.ClientCreate, db: AsyncSession = Depends(get_db)):
-    db_client = await crud.get_client_by_email(db, email=client.email)
-    if db_client:
+    # A constraint UNIQUE do e-mail garante que não há duplicidade (sem consulta prévia)
+    db_client = await crud.create_client(db=db, client=client)
+    if db_client is None:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return await crud.create_client(db=db, client=client)
+    return db_client
 
-@router.get("/logged", response_model=schemas.Client, summary="Obter dados do cliente autenticado")
-async def read_client_me(current_client: models.Client = Depends(dependencies.get_current_client)):
-    return current_client
+@router.get("/logged", response_model=schemas.Client, summary="Obter dados do cliente autenticado",
+        responses={
+        status.HTTP_304_NOT_MODIFIED: {"description": "Dados inalterados (If-None-Match)"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Token de autenticação inválido ou ausente"},
+    })
+async def read_client_me(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(dependencies.get_client_read_db),
+    current_client_id: int = Depends(dependencies.get_current_client_id)
+):
+    # O ETag sai de clients.version, como o dos favoritos: a identidade em cache é por worker e
+    # pode estar atrasada em relação a uma alteração feita em outro. Uma única consulta pela chave.
+    client = await crud.get_client(db, current_client_id)
+    if client is None:
+        raise dependencies.stale_identity(current_client_id)
+    etag = etags.make_etag("client", client.id, client.version)
+    if etags.if_none_match(request, etag):
+        return etags.not_modified(etag)
+    identity = schemas.Client.model_validate(client)
+    dependencies.identity_cache.set(identity)  # Aproveita a leitura para atualizar o cache
+    response.headers.update(etags.cache_headers(etag))
+    return identity
 
-@router.put("/logged", response_model=schemas.Client, summary="Atualizar dados do cliente autenticado")
+@router.put("/logged", response_model=schemas.Client, summary="Atualizar dados do cliente autenticado",
+        responses={
+        status.HTTP_401_UNAUTHORIZED: {"description": "Token de autenticação inválido ou ausente"},
+    })
 async def update_client_me(
     client_update: schemas.ClientUpdate,
     db: AsyncSession = Depends(get_db),
-    current_client: models.Client = Depends(dependencies.get_current_client)
+    current_client_id: int = Depends(dependencies.get_current_client_id)
 ):
-    # Verifica se o novo e-mail já está em uso por outro cliente
-    if client_update.email and client_update.email != current_client.email:
-        existing_client = await crud.get_client_by_email(db, email=client_update.email)
-        if existing_client:
-            raise HTTPException(status_code=400, detail="This email is already in use.")
-
-    return await crud.update_client(db, current_client, client_update)
+    # O e-mail em uso por outro cliente é detectado pela constraint UNIQUE
+    try:
+        updated_client = await crud.update_client(db, current_client_id, client_update)
+    except crud.ClientNotFoundError:
+        raise dependencies.stale_identity(current_client_id)
+    primary_pins.pin(current_client_id)
+    if updated_client is None:
+        raise HTTPException(status_code=400, detail="This email is already in use.")
+    dependencies.identity_cache.invalidate(current_client_id)
+    return updated_client
 
 @router.delete("/logged", status_code=status.HTTP_204_NO_CONTENT, summary="deletar cliente")
 async def delete_client_me(
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
-    current_client: models.Client = Depends(dependencies.get_current_client)
+    current_client_id: int = Depends(dependencies.get_current_client_id)
 ):
-    await crud.delete_client(db, client_id=current_client.id)
+    if purge.CLIENT_PURGE_MODE == "async":
+        # Contas muito grandes: a requisição só marca o cliente; os favoritos saem em lotes depois
+        if await crud.mark_client_deleted(db, client_id=current_client_id):
+            background_tasks.add_task(purge.purge_client, current_client_id)
+    else:
+        await crud.delete_client(db, client_id=current_client_id)
+    primary_pins.pin(current_client_id)  # Até a réplica alcançar, o token não deve voltar a valer
+    await favorites_cache.invalidate(current_client_id)
+    dependencies.identity_cache.invalidate(current_client_id)
     return
\ No newline at end of file
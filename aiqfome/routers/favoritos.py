@@ -1,63 +1,283 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+import json
+import base64
+import httpx
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from aiqfome import crud, dependencies, fakestoreapi, models, schemas
-from aiqfome.database import get_db
-from typing import List
+from aiqfome import admission, catalog, crud, deadlines, dependencies, etags, fakestoreapi, schemas
+from aiqfome.database import get_db, primary_pins
+from aiqfome.response_cache import CachedResponse, favorites_cache
+from aiqfome.serialization import FastJSONResponse, dumps
+from typing import AsyncIterator, Dict, List, Optional, Union
 
 
-router = APIRouter(prefix='/clients/logged/favorites', tags=['Favorites'])
+# Limite por cliente em todas as rotas; as que chamam a API externa também têm concorrência limitada
+router = APIRouter(
+    prefix='/clients/logged/favorites', tags=['Favorites'],
+    dependencies=[Depends(admission.limit_by_client(admission.favorites_client_limiter))],
+    responses={status.HTTP_429_TOO_MANY_REQUESTS: {"description": "Muitas requisições (ver Retry-After)"}},
+)
+upstream_admission = Depends(admission.limit_concurrency(admission.favorites_concurrency))
 
 # --- Endpoints de Favoritos ---
 
-@router.post("/", status_code=status.HTTP_201_CREATED, 
+@router.post("/", status_code=status.HTTP_201_CREATED, dependencies=[upstream_admission],
         summary="Adicionar Produto aos favoritos do cliente logado",   
         responses={
         status.HTTP_404_NOT_FOUND: {"description": "Produto não encontrado na API externa"},
         status.HTTP_409_CONFLICT: {"description": "Produto já existe na lista de favoritos"},
         status.HTTP_401_UNAUTHORIZED: {"description": "Token de autenticação inválido ou ausente"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "API externa indisponível (circuito aberto)"},
     })
 async def add_product_to_favorites(
     favorite: schemas.FavoriteProductCreate,
     db: AsyncSession = Depends(get_db),
-    current_client: models.Client = Depends(dependencies.get_current_client)
+    current_client_id: int = Depends(dependencies.get_current_client_id),
+    http_client: httpx.AsyncClient = Depends(fakestoreapi.get_http_client)
 ):
-    # 1. Validar se o produto existe na API externa
-    product_data = await fakestoreapi.get_product_by_id(favorite.product_id)
+    # 1. Validar se o produto existe (espelho local; API externa só se não estiver espelhado)
+    product_data = await crud.get_product(db, favorite.product_id)
+    if product_data is None:
+        try:
+            product_data = await fakestoreapi.get_product_by_id(favorite.product_id, http_client)
+        except fakestoreapi.CircuitOpenError:
+            raise HTTPException(
+                status_code=503,
+                detail="Product catalog temporarily unavailable.",
+                headers={"Retry-After": str(int(fakestoreapi.upstream_breaker.reset_timeout))},
+            )
     if not product_data:
         raise HTTPException(status_code=404, detail=f"Product with id {favorite.product_id} not found.")
 
-    # 2. Verificar se já não está na lista de favoritos (evitar query duplicada)
-    is_favorited = await crud.is_product_in_favorites(db, client_id=current_client.id, product_id=favorite.product_id)
-    if is_favorited:
+    # 2. Adicionar aos favoritos (a constraint UNIQUE detecta duplicados, sem consulta prévia)
+    try:
+        added = await crud.add_favorite(db=db, client_id=current_client_id, product_id=favorite.product_id)
+    except crud.ClientNotFoundError:
+        raise dependencies.stale_identity(current_client_id)
+    primary_pins.pin(current_client_id)  # As próximas leituras do cliente vão ao principal
+    if added is None:
         raise HTTPException(status_code=409, detail="Product already in favorites.")
+    await favorites_cache.invalidate(current_client_id)
 
-    # 3. Adicionar aos favoritos
-    await crud.add_favorite(db=db, client_id=current_client.id, product_id=favorite.product_id)
-    
     return {"message": "Product added to favorites successfully"}
 
 
-@router.get("/", response_model=List[schemas.Product], summary="Lista dos produtos favoritos do usuário logado")
-async def list_my_favorites(
+@router.post("/batch", response_model=schemas.FavoriteBatchResult, dependencies=[upstream_admission],
+        summary="Adicionar vários produtos aos favoritos do cliente logado",
+        responses={
+        status.HTTP_401_UNAUTHORIZED: {"description": "Token de autenticação inválido ou ausente"},
+    })
+async def add_products_to_favorites(
+    batch: schemas.FavoriteProductBatch,
+    db: AsyncSession = Depends(get_db),
+    current_client_id: int = Depends(dependencies.get_current_client_id),
+    http_client: httpx.AsyncClient = Depends(fakestoreapi.get_http_client)
+):
+    product_ids = list(dict.fromkeys(batch.product_ids))  # Remove duplicados mantendo a ordem
+
+    # 1. Validar todos os produtos de uma vez (espelho local; o que faltar, numa única busca externa)
+    existing = await crud.get_existing_product_ids(db, product_ids)
+    unmirrored = [pid for pid in product_ids if pid not in existing]
+    unavailable = set()
+    if unmirrored:
+        try:
+            upstream = await fakestoreapi.get_products_by_ids(unmirrored, http_client)
+            existing.update(pid for pid, data in upstream.items() if data)
+        except (fakestoreapi.CircuitOpenError, httpx.HTTPError):
+            unavailable.update(unmirrored)
+
+    # 2. Inserir os válidos em um único comando; os já favoritados são ignorados pelo banco
+    valid_ids = [pid for pid in product_ids if pid in existing]
+    try:
+        added = await crud.add_favorites(db, client_id=current_client_id, product_ids=valid_ids)
+    except crud.ClientNotFoundError:
+        raise dependencies.stale_identity(current_client_id)
+    primary_pins.pin(current_client_id)
+    if added:
+        await favorites_cache.invalidate(current_client_id)
+
+    def item_status(pid: int) -> str:
+        if pid in added:
+            return "added"
+        if pid in existing:
+            return "already_in_favorites"
+        return "unavailable" if pid in unavailable else "not_found"
+
+    return {"results": [{"product_id": pid, "status": item_status(pid)} for pid in product_ids]}
+
+
+@router.post("/batch/remove", response_model=schemas.FavoriteBatchResult,
+        summary="Remover vários produtos dos favoritos do cliente logado",
+        responses={
+        status.HTTP_401_UNAUTHORIZED: {"description": "Token de autenticação inválido ou ausente"},
+    })
+async def remove_products_from_favorites(
+    batch: schemas.FavoriteProductBatch,
     db: AsyncSession = Depends(get_db),
-    current_client: models.Client = Depends(dependencies.get_current_client)
+    current_client_id: int = Depends(dependencies.get_current_client_id)
 ):
-    favorite_ids = await crud.get_favorite_product_ids_by_client(db, client_id=current_client.id)
-    if not favorite_ids:
-        return []
-    
-    # Busca os detalhes completos dos produtos na API externa de forma concorrente
-    products_details = await fakestoreapi.get_products_details(favorite_ids)
-    return products_details
+    product_ids = list(dict.fromkeys(batch.product_ids))
+    removed = await crud.remove_favorites(db, client_id=current_client_id, product_ids=product_ids)
+    primary_pins.pin(current_client_id)
+    if removed:
+        await favorites_cache.invalidate(current_client_id)
+    return {"results": [
+        {"product_id": pid, "status": "removed" if pid in removed else "not_found"} for pid in product_ids
+    ]}
+
+
+# Limite máximo de itens por página na listagem de favoritos
+FAVORITES_MAX_PAGE_SIZE = 100
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def _encode_cursor(product_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": product_id}).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["after"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def _product_payload(product: Union[schemas.Product, Dict]) -> Dict:
+    """Produto da API externa no formato JSON da resposta (valida apenas o que ainda não é um Product)."""
+    if not isinstance(product, schemas.Product):
+        product = schemas.Product.model_validate(product)
+    return product.model_dump(mode="json", by_alias=True)
+
+async def _stream_products(
+    mirrored: List[Dict], missing_ids: List[int], http_client: httpx.AsyncClient
+) -> AsyncIterator[bytes]:
+    """
+    NDJSON: produtos do espelho primeiro, depois os da API externa conforme ficam prontos.
+    Se o prazo da requisição acabar antes, a última linha é {"omitted_ids": [...]}.
+    """
+    for payload in mirrored:
+        yield dumps(payload) + b"\n"
+    if missing_ids:
+        omitted_ids = set()
+        async for product in fakestoreapi.iter_products_details(
+            missing_ids, http_client, timeout=deadlines.work_budget(), omitted_ids=omitted_ids
+        ):
+            yield dumps(_product_payload(product)) + b"\n"
+        if omitted_ids:
+            yield dumps({"omitted_ids": sorted(omitted_ids)}) + b"\n"
+
+
+@router.get("/", response_model=List[schemas.Product], summary="Lista dos produtos favoritos do usuário logado",
+        responses={
+        status.HTTP_200_OK: {
+            "description": "Lista de produtos. Com `Accept: application/x-ndjson`, um produto por linha "
+                           "(enviado assim que fica pronto). O cursor da próxima página vem no header X-Next-Cursor. "
+                           "Se o prazo da requisição esgotar, a lista é parcial e os IDs que ficaram de fora vêm "
+                           "no header X-Omitted-Ids (no NDJSON, em uma última linha {\"omitted_ids\": [...]}).",
+            "content": {NDJSON_MEDIA_TYPE: {}},
+        },
+        status.HTTP_304_NOT_MODIFIED: {"description": "Favoritos inalterados (If-None-Match)"},
+        status.HTTP_400_BAD_REQUEST: {"description": "Cursor inválido"},
+        status.HTTP_504_GATEWAY_TIMEOUT: {"description": "Prazo da requisição esgotado antes dos favoritos"},
+    })
+async def list_my_favorites(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=FAVORITES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(dependencies.get_client_read_db),
+    current_client_id: int = Depends(dependencies.get_current_client_id),
+    http_client: httpx.AsyncClient = Depends(fakestoreapi.get_http_client),
+    admission_slot: admission.ConcurrencySlot = upstream_admission,
+):
+    after_id = _decode_cursor(cursor) if cursor else None
+    ndjson = NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+    # Resposta completa já montada para esta página: uma única consulta ao cache, sem banco
+    cache_variant = f"{limit}:{after_id}"
+    use_cache = favorites_cache.enabled and not ndjson
+    if use_cache:
+        cached = await favorites_cache.get(current_client_id, cache_variant)
+        if cached is not None:
+            if etags.if_none_match(request, cached.headers["ETag"]):
+                return etags.not_modified(cached.headers["ETag"])
+            return Response(content=cached.body, media_type="application/json", headers=cached.headers)
+        # Lida antes do banco: uma escrita durante a montagem impede gravar a resposta antiga
+        generation = await favorites_cache.generation(current_client_id)
+
+    # Versão do cliente + sincronização do espelho identificam o conteúdo das páginas servidas só
+    # pelo espelho: se o cliente já tem esta versão, responde 304 sem carregar os favoritos.
+    # Páginas com produtos da API externa recebem um ETag do próprio corpo (ver abaixo), que nunca
+    # casa com este
+    version = await crud.get_favorites_version(db, current_client_id)
+    etag = etags.make_etag("favorites", current_client_id, version, limit, after_id, ndjson)
+    if etags.if_none_match(request, etag):
+        return etags.not_modified(etag)
+
+    # Um único JOIN com o espelho local do catálogo (busca um item a mais para saber se há próxima página)
+    favorites = await crud.get_favorite_products_by_client(
+        db, client_id=current_client_id, limit=limit + 1 if limit else None, after_id=after_id
+    )
+    headers = {}
+    if limit and len(favorites) > limit:
+        favorites = favorites[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(favorites[-1][0])
+
+    # Linhas do espelho já estão validadas: vão direto para o formato JSON, sem pydantic
+    products = {pid: catalog.row_to_payload(row) for pid, row in favorites if row is not None}
+    missing_ids = [pid for pid, row in favorites if row is None]
+
+    if ndjson:
+        # A hidratação acontece durante o envio: a vaga de concorrência vai junto com a resposta
+        return admission.AdmittedStreamingResponse(
+            _stream_products(list(products.values()), missing_ids, http_client),
+            slot=admission_slot,
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=headers,
+        )
+
+    if missing_ids:
+        # Busca na API externa, de forma concorrente, apenas o que não está espelhado,
+        # dentro do prazo da requisição (o que não ficar pronto a tempo é omitido)
+        stale_ids, omitted_ids = set(), set()
+        for product in await fakestoreapi.get_products_details(
+            missing_ids, http_client, stale_ids, timeout=deadlines.work_budget(), omitted_ids=omitted_ids
+        ):
+            payload = _product_payload(product)
+            products[payload["id"]] = payload
+        if stale_ids:
+            # API externa indisponível: parte dos dados veio do último valor conhecido
+            headers["X-Data-Stale"] = "true"
+        if omitted_ids:
+            # Prazo esgotado: resposta parcial, com os IDs que ficaram de fora
+            headers["X-Omitted-Ids"] = ",".join(str(pid) for pid in sorted(omitted_ids))
+
+    content = [products[pid] for pid, _ in favorites if pid in products]
+    complete = "X-Data-Stale" not in headers and "X-Omitted-Ids" not in headers and len(content) == len(favorites)
+
+    # Resposta já serializada: o response_model fica só para a documentação (sem validar tudo de novo)
+    response = FastJSONResponse(content, headers=headers)
+    if complete:
+        # Só lista completa e atual recebe ETag (um 304 não pode confirmar dados antigos nem uma
+        # lista parcial). Produtos da API externa não entram na versão: o ETag vem do corpo
+        if missing_ids:
+            etag = etags.make_etag("favorites", current_client_id, limit, after_id, etags.body_digest(response.body))
+            if etags.if_none_match(request, etag):
+                return etags.not_modified(etag)
+        headers.update(etags.cache_headers(etag))
+        response.headers.update(etags.cache_headers(etag))
+    if complete and use_cache:
+        await favorites_cache.set(
+            current_client_id, cache_variant, CachedResponse(body=response.body, headers=headers), generation
+        )
+    return response
 
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Remover Produto dos favoritos do cliente logado",  )
 async def remove_product_from_favorites(
     product_id: int,
     db: AsyncSession = Depends(get_db),
-    current_client: models.Client = Depends(dependencies.get_current_client)
+    current_client_id: int = Depends(dependencies.get_current_client_id)
 ):
-    favorite_removed = await crud.remove_favorite(db, client_id=current_client.id, product_id=product_id)
+    favorite_removed = await crud.remove_favorite(db, client_id=current_client_id, product_id=product_id)
+    primary_pins.pin(current_client_id)
     if not favorite_removed:
         raise HTTPException(status_code=404, detail="Favorite product not found.")
+    await favorites_cache.invalidate(current_client_id)
     return
\ No newline at end of file
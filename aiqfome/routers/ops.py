@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Request, Response, status
+from aiqfome import database, metrics
+
+
+router = APIRouter(tags=['Operations'])
+
+# --- Endpoints operacionais ---
+
+@router.get("/ops/db-pool", summary="Estado do pool de conexões com o banco de dados")
+async def read_db_pool_status():
+    """
+    Conexões em uso, overflow e tempo de espera para obter uma conexão do pool.
+    """
+    pool = database.pool_status()
+    if database.read_engine is not database.engine:
+        pool["replica"] = database.pool_status(database.read_engine)
+    return pool
+
+@router.get("/metrics", summary="Métricas no formato do Prometheus", response_class=Response)
+async def read_metrics():
+    """
+    Latência e status por rota, tempo por comando SQL e por chamada à API externa,
+    além do estado dos caches e pools.
+    """
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@router.get("/health/live", summary="Liveness: o processo está respondendo")
+async def read_liveness():
+    return {"status": "alive"}
+
+@router.get("/health/ready", summary="Readiness: o worker terminou o aquecimento e alcança o banco",
+        responses={status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Worker iniciando, encerrando ou sem banco"}})
+async def read_readiness(request: Request, response: Response):
+    """
+    Só responde 200 depois do aquecimento da inicialização (pool do banco, cliente HTTP
+    e cache do catálogo) e enquanto o banco responder; o balanceador usa esta rota.
+    """
+    if not getattr(request.app.state, "ready", False):
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "starting"}
+    if not await database.ping():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "database_unavailable"}
+    return {"status": "ready"}
@@ -1,5 +1,5 @@
 from pydantic import AnyUrl, BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 
 # --- Schemas para Produtos (dados da API externa) ---
 class ProductReview(BaseModel):
@@ -22,6 +22,16 @@ class Product(BaseModel):
 class FavoriteProductCreate(BaseModel):
     product_id: int
 
+class FavoriteProductBatch(BaseModel):
+    product_ids: List[int] = Field(min_length=1, max_length=100)
+
+class FavoriteBatchItemResult(BaseModel):
+    product_id: int
+    status: Literal["added", "removed", "already_in_favorites", "not_found", "unavailable"]
+
+class FavoriteBatchResult(BaseModel):
+    results: List[FavoriteBatchItemResult]
+
 # --- Schemas para Clientes ---
 class ClientBase(BaseModel):
     name: str
@@ -47,6 +57,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    client_id: Optional[int] = None
 
 
 # --- Schemas para Hello ---
@@ -1,23 +1,101 @@
 import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Optional, TypeVar
 from passlib.context import CryptContext
 from jose import jwt
 from dotenv import load_dotenv
 
+from . import metrics, profiling
+
 load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Custo do bcrypt; hashes com custo menor são atualizados no próximo login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Threads dedicadas ao bcrypt (ele libera o GIL, então threads bastam)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+T = TypeVar("T")
+
+
+class HashPoolStats:
+    """Tempo que as operações de hash passam na fila esperando uma thread livre."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tasks = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+
+    def observe(self, waited: float) -> None:
+        with self._lock:
+            self.tasks += 1
+            self.queue_seconds_total += waited
+            self.queue_seconds_max = max(self.queue_seconds_max, waited)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.tasks = 0
+            self.queue_seconds_total = 0.0
+            self.queue_seconds_max = 0.0
+
+
+hash_pool_stats = HashPoolStats()
+
+@metrics.REGISTRY.register_collector
+def _collect_metrics():
+    yield "password_hash_tasks_total", "counter", "Operações de hash/verificação de senha.", [
+        ({}, hash_pool_stats.tasks)
+    ]
+    yield "password_hash_queue_seconds_total", "counter", "Tempo total na fila do pool de bcrypt.", [
+        ({}, hash_pool_stats.queue_seconds_total)
+    ]
+    yield "password_hash_queue_seconds_max", "gauge", "Maior espera na fila do pool de bcrypt.", [
+        ({}, hash_pool_stats.queue_seconds_max)
+    ]
+
+async def _run_in_hash_pool(func: Callable[..., T], *args) -> T:
+    """Executa o bcrypt fora do event loop, no pool dedicado."""
+    submitted_at = time.perf_counter()
+
+    def task() -> T:
+        hash_pool_stats.observe(time.perf_counter() - submitted_at)
+        return func(*args)
+
+    try:
+        # Com a requisição sob profiling, o bcrypt também é perfilado (na thread do pool)
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, profiling.wrap_thread_task(task))
+    finally:
+        metrics.record_wait("password_hash", time.perf_counter() - submitted_at)
+
+def shutdown_hash_pool() -> None:
+    _hash_executor.shutdown(wait=False, cancel_futures=True)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hash_pool(pwd_context.verify, plain_password, hashed_password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Verifica a senha e, se o hash estiver desatualizado (ex: custo menor), retorna um novo hash."""
+    return await _run_in_hash_pool(pwd_context.verify_and_update, plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    return await _run_in_hash_pool(pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
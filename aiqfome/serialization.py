@@ -0,0 +1,33 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+# orjson é opcional (pip install orjson); sem ele, usa o json da stdlib no formato compacto
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Serializa conteúdo já pronto para JSON (dicts, listas, str, números)."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Resposta JSON para conteúdo já validado: retornar esta resposta de uma rota
+    evita a segunda validação/serialização do `response_model` pelo FastAPI.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
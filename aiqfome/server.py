@@ -0,0 +1,282 @@
+import os
+import gc
+import sys
+import asyncio
+import math
+import time
+import random
+import signal
+import logging
+import argparse
+import importlib.util
+from typing import Dict, List, Optional, Tuple
+
+import uvicorn
+from dotenv import load_dotenv
+from uvicorn.importer import import_from_string
+
+load_dotenv()
+
+logger = logging.getLogger("aiqfome.server")
+
+# Servidor de produção (console script aiqfome-server): um processo supervisor abre o socket,
+# carrega a aplicação e cria os workers com fork; cada worker roda o uvicorn com uvloop e httptools.
+SERVER_APP = os.getenv("SERVER_APP", "aiqfome.main:app")
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8000))
+# Número de workers; 0 = um por CPU disponível para o processo (afinidade e cota do cgroup)
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 0))
+# Fila de conexões pendentes do socket (listen backlog)
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", 2048))
+# Tempo que uma conexão keep-alive ociosa fica aberta
+SERVER_KEEPALIVE_SECONDS = int(os.getenv("SERVER_KEEPALIVE_SECONDS", 5))
+# Conexões + tarefas simultâneas por worker acima das quais o uvicorn responde 503 (0 = sem limite)
+SERVER_LIMIT_CONCURRENCY = int(os.getenv("SERVER_LIMIT_CONCURRENCY", 0))
+# Reciclagem: o worker sai graciosamente após N requisições (mais um sorteio de até JITTER, para
+# os workers não reiniciarem juntos) e o supervisor cria outro no lugar. 0 desativa
+SERVER_MAX_REQUESTS = int(os.getenv("SERVER_MAX_REQUESTS", 0))
+SERVER_MAX_REQUESTS_JITTER = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", 0))
+# Tempo para as requisições em andamento terminarem no desligamento (depois disso, SIGKILL)
+SERVER_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("SERVER_GRACEFUL_TIMEOUT_SECONDS", 30))
+# Carrega a aplicação no supervisor antes do fork: workers sobem mais rápido e compartilham memória
+SERVER_PRELOAD = os.getenv("SERVER_PRELOAD", "true").lower() in ("1", "true", "yes")
+SERVER_ACCESS_LOG = os.getenv("SERVER_ACCESS_LOG", "false").lower() in ("1", "true", "yes")
+# Proxies (IPs/redes separados por vírgula, ou *) dos quais X-Forwarded-For/-Proto são aceitos: atrás
+# de um balanceador, o IP real do cliente (usado nos limites de taxa por IP) vem desse header
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Código de saída do uvicorn quando a aplicação não sobe (ex.: falha no lifespan)
+STARTUP_FAILURE = 3
+# Configuração inválida: o supervisor não chega a criar workers
+CONFIG_ERROR = 2
+# Worker que morre com erro antes disso espera um pouco para ser recriado (evita fork em laço)
+_MIN_WORKER_LIFETIME_SECONDS = 1.0
+_STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def available_cpus(cgroup_cpu_max: str = "/sys/fs/cgroup/cpu.max") -> int:
+    """CPUs que o processo pode usar: afinidade, limitada pela cota do cgroup v2 (limite do container)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Plataformas sem sched_getaffinity
+        cpus = os.cpu_count() or 1
+    try:
+        with open(cgroup_cpu_max) as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def event_loop_and_parser() -> Tuple[str, str]:
+    """uvloop e httptools (uvicorn[standard]); sem eles, o loop do asyncio e o h11."""
+    return ("uvloop" if _installed("uvloop") else "asyncio"), ("httptools" if _installed("httptools") else "h11")
+
+
+class WorkerServer(uvicorn.Server):
+    """
+    uvicorn.Server com desligamento que não derruba conexões recém-aceitas. O uvicorn fecha na hora
+    toda conexão sem requisição em andamento, inclusive as aceitas cuja requisição ainda não foi
+    lida, e o cliente recebe "Server disconnected". Aqui o worker primeiro para de aceitar (o socket
+    continua aberto no supervisor e nos outros workers, que atendem a fila) e espera essas conexões
+    receberem a primeira requisição, até o tempo de keep-alive; só então segue o desligamento normal.
+    """
+
+    async def shutdown(self, sockets=None) -> None:
+        for server in self.servers:
+            server.close()
+        deadline = time.monotonic() + self.config.timeout_keep_alive
+        await asyncio.sleep(0)  # connection_made das conexões já aceitas pelo loop
+        while time.monotonic() < deadline and any(
+            getattr(connection, "cycle", None) is None for connection in self.server_state.connections
+        ):
+            await asyncio.sleep(0.05)
+        await super().shutdown(sockets)
+
+
+class Supervisor:
+    """
+    Supervisor dos workers, no estilo do gunicorn. O socket é aberto uma vez e herdado pelos
+    workers (o kernel distribui as conexões); com preload a aplicação é importada antes do fork
+    e os objetos congelados com gc.freeze, para as páginas ficarem compartilhadas (copy-on-write).
+    Nada do que a aplicação cria na importação abre conexões ou threads: pool do banco, cliente
+    HTTP e aquecimento acontecem no lifespan de cada worker.
+
+    Worker que sai (reciclagem por SERVER_MAX_REQUESTS ou falha) é recriado; falha na subida
+    (lifespan) derruba o servidor, para o orquestrador perceber. SIGTERM/SIGINT desligam os
+    workers graciosamente, com SIGKILL após o tempo de tolerância.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.loop, self.http = event_loop_and_parser()
+        self.app = args.app
+        self.workers: Dict[int, Tuple[int, float]] = {}  # pid -> (índice, início)
+        self.stopping = False
+        self.stop_deadline = 0.0
+        self.exit_code = 0
+
+    def config(self, limit_max_requests: Optional[int] = None) -> uvicorn.Config:
+        args = self.args
+        return uvicorn.Config(
+            self.app,
+            host=args.host,
+            port=args.port,
+            loop=self.loop,
+            http=self.http,
+            lifespan="on",
+            backlog=args.backlog,
+            timeout_keep_alive=args.keepalive,
+            limit_concurrency=args.limit_concurrency or None,
+            limit_max_requests=limit_max_requests,
+            timeout_graceful_shutdown=args.graceful_timeout,
+            access_log=args.access_log,
+            proxy_headers=True,
+            forwarded_allow_ips=args.forwarded_allow_ips,
+            server_header=False,
+        )
+
+    def run(self) -> int:
+        # create_all em cada worker (lifespan) faz os workers disputarem a criação das tabelas
+        schema_management = os.getenv("SCHEMA_MANAGEMENT", "create_all").lower()
+        if self.args.workers > 1 and schema_management == "create_all":
+            logger.error(
+                "SCHEMA_MANAGEMENT=create_all com %d workers: use SCHEMA_MANAGEMENT=none e rode "
+                "python -m aiqfome.migrations antes, ou suba um só worker", self.args.workers,
+            )
+            return CONFIG_ERROR
+        # Lido pela aplicação (ex.: caches locais que só valem com um worker); herdado no fork
+        os.environ["WEB_CONCURRENCY"] = str(self.args.workers)
+        sock = self.config().bind_socket()
+        if self.args.preload:
+            self.app = import_from_string(self.args.app)
+            gc.collect()
+            gc.freeze()  # Objetos da importação saem do GC: a coleta nos workers não toca nessas páginas
+        logger.info(
+            "Iniciando %d workers (loop=%s, http=%s, preload=%s)",
+            self.args.workers, self.loop, self.http, self.args.preload,
+        )
+        for sig in _STOP_SIGNALS:
+            signal.signal(sig, self._handle_stop)
+        for index in range(self.args.workers):
+            self._spawn(index, sock)
+        self._supervise(sock)
+        sock.close()
+        return self.exit_code
+
+    def _handle_stop(self, signum, frame) -> None:
+        self.stop()
+
+    def stop(self) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        self.stop_deadline = time.monotonic() + self.args.graceful_timeout + 5
+        for pid in self.workers:
+            self._signal(pid, signal.SIGTERM)
+
+    @staticmethod
+    def _signal(pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _supervise(self, sock) -> None:
+        while self.workers:
+            if self.stopping and time.monotonic() > self.stop_deadline:
+                for pid in self.workers:
+                    logger.warning("Worker %d não terminou a tempo; enviando SIGKILL", pid)
+                    self._signal(pid, signal.SIGKILL)
+                self.stop_deadline = float("inf")
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.1)
+                continue
+            if pid not in self.workers:
+                continue
+            index, started_at = self.workers.pop(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                continue
+            if code == STARTUP_FAILURE:
+                logger.error("Worker %d não conseguiu subir a aplicação; desligando o servidor", pid)
+                self.exit_code = STARTUP_FAILURE
+                self.stop()
+                continue
+            if code == 0:
+                logger.info("Worker %d reciclado", pid)
+            else:
+                logger.warning("Worker %d saiu com código %d; recriando", pid, code)
+                if time.monotonic() - started_at < _MIN_WORKER_LIFETIME_SECONDS:
+                    time.sleep(_MIN_WORKER_LIFETIME_SECONDS)
+            self._spawn(index, sock)
+
+    def _spawn(self, index: int, sock) -> None:
+        # Sinais bloqueados durante o fork: o filho não pode rodar o handler do supervisor
+        signal.pthread_sigmask(signal.SIG_BLOCK, _STOP_SIGNALS)
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (index, time.monotonic())
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, _STOP_SIGNALS)
+            return
+        for sig in _STOP_SIGNALS:
+            signal.signal(sig, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, _STOP_SIGNALS)
+        os._exit(self._run_worker(sock))
+
+    def _run_worker(self, sock) -> int:
+        code = 1
+        try:
+            max_requests = None
+            if self.args.max_requests > 0:
+                # O módulo random é ressemeado no fork: cada worker sorteia o próprio limite
+                max_requests = self.args.max_requests + random.randint(0, self.args.max_requests_jitter)
+            server = WorkerServer(self.config(max_requests))
+            server.run(sockets=[sock])
+            code = 0 if server.started else STARTUP_FAILURE
+        except BaseException:
+            logger.exception("Falha no worker %d", os.getpid())
+        finally:
+            logging.shutdown()
+            sys.stdout.flush()
+            sys.stderr.flush()
+        return code
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Servidor de produção da API de favoritos.")
+    parser.add_argument("app", nargs="?", default=SERVER_APP, help="Aplicação ASGI (módulo:atributo)")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="0 = um por CPU disponível")
+    parser.add_argument("--backlog", type=int, default=SERVER_BACKLOG)
+    parser.add_argument("--keepalive", type=int, default=SERVER_KEEPALIVE_SECONDS, help="Segundos")
+    parser.add_argument("--limit-concurrency", type=int, default=SERVER_LIMIT_CONCURRENCY, help="Por worker; 0 = sem limite")
+    parser.add_argument("--max-requests", type=int, default=SERVER_MAX_REQUESTS, help="Recicla o worker; 0 desativa")
+    parser.add_argument("--max-requests-jitter", type=int, default=SERVER_MAX_REQUESTS_JITTER)
+    parser.add_argument("--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT_SECONDS, help="Segundos")
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=SERVER_PRELOAD)
+    parser.add_argument("--access-log", action=argparse.BooleanOptionalAction, default=SERVER_ACCESS_LOG)
+    parser.add_argument("--forwarded-allow-ips", default=FORWARDED_ALLOW_IPS, help="Proxies confiáveis (vírgula ou *)")
+    args = parser.parse_args(argv)
+    if args.workers <= 0:
+        args.workers = available_cpus()
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    sys.exit(Supervisor(args).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import sqlite3
+import logging
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from .serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Arquivo SQLite compartilhado pelos workers do host. Em /dev/shm fica em memória (tmpfs);
+# com mmap_size as leituras vão direto às páginas mapeadas, sem cópia por chamada.
+SHARED_CACHE_MMAP_BYTES = 64 * 1024 * 1024
+# Espera máxima por um lock do arquivo (outro worker gravando). As operações rodam direto no
+# event loop: com o banco ocupado além disso, a leitura vira miss e a gravação é descartada.
+SHARED_CACHE_BUSY_TIMEOUT_SECONDS = 0.005
+# A cada quantas gravações o limite de tamanho é verificado
+_PRUNE_EVERY = 64
+
+
+class SharedProductStore:
+    """
+    Segundo nível do cache de produtos, compartilhado entre processos via SQLite (WAL).
+
+    Cada processo abre a própria conexão (também depois de um fork); o SQLite cuida do
+    acesso concorrente. Guarda produtos e resultados negativos (404) com expiração em
+    tempo de parede; entradas vencidas ficam até a poda, para servir como dado antigo.
+    Operações locais levam microssegundos, por isso rodam direto no event loop; a espera por
+    um lock de outro worker é limitada a SHARED_CACHE_BUSY_TIMEOUT_SECONDS, e qualquer falha
+    do arquivo (inclusive banco ocupado) vira um miss: o cache nunca trava o loop nem derruba
+    uma requisição.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self._clock = clock
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._writes = 0
+        self.hits = 0
+        self.errors = 0
+        self.busy = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=SHARED_CACHE_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # É um cache: durabilidade total não importa
+            conn.execute(f"PRAGMA mmap_size={SHARED_CACHE_MMAP_BYTES}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS product_cache ("
+                " product_id INTEGER PRIMARY KEY, data BLOB, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_product_cache_expires_at ON product_cache (expires_at)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, product_id: int) -> Tuple[bool, Optional[Dict], float]:
+        """Retorna (encontrado, produto, segundos até expirar — negativo se já expirou)."""
+        try:
+            row = self._connection().execute(
+                "SELECT data, expires_at FROM product_cache WHERE product_id = ?", (product_id,)
+            ).fetchone()
+        except sqlite3.Error:
+            self._failed("leitura")
+            return False, None, 0.0
+        if row is None:
+            return False, None, 0.0
+        data, expires_at = row
+        return True, loads(data) if data is not None else None, expires_at - self._clock()
+
+    def set_many(self, items: Iterable[Tuple[int, Optional[Dict], float]]) -> None:
+        """Grava (id, produto, ttl) em uma única transação."""
+        now = self._clock()
+        rows = [
+            (pid, dumps(product) if product is not None else None, now + ttl) for pid, product, ttl in items
+        ]
+        if not rows:
+            return
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO product_cache (product_id, data, expires_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(product_id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                    rows,
+                )
+                self._writes += len(rows)
+                if self._writes >= _PRUNE_EVERY:
+                    self._writes = 0
+                    self._prune(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            self._failed("gravação")
+
+    def set(self, product_id: int, product: Optional[Dict], ttl: float) -> None:
+        self.set_many([(product_id, product, ttl)])
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        # Mantém as max_entries com expiração mais distante (as vencidas saem primeiro)
+        conn.execute(
+            "DELETE FROM product_cache WHERE product_id NOT IN"
+            " (SELECT product_id FROM product_cache ORDER BY expires_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def size(self) -> int:
+        try:
+            return self._connection().execute("SELECT COUNT(*) FROM product_cache").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def close(self) -> None:
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    def _failed(self, operation: str) -> None:
+        error = sys.exc_info()[1]
+        if isinstance(error, sqlite3.OperationalError) and _is_busy(error):
+            self.busy += 1  # Concorrência normal entre workers: não é falha
+            return
+        self.errors += 1
+        logger.warning("Falha na %s do cache compartilhado de produtos (%s)", operation, self.path, exc_info=True)
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    code = getattr(error, "sqlite_errorcode", None)  # Python 3.11+
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(error)
@@ -0,0 +1,54 @@
+"""
+Substituto local (ASGI) da fakestoreapi.com/products para os benchmarks.
+
+Latência e taxa de erro são configuráveis para simular a API externa lenta ou instável.
+"""
+import random
+import asyncio
+
+from fastapi import FastAPI, HTTPException
+
+
+def make_product(product_id: int) -> dict:
+    return {
+        "id": product_id,
+        "title": f"Produto {product_id}",
+        "price": round(10 + product_id * 0.37, 2),
+        "description": "Produto gerado para benchmark. " * 4,
+        "category": ("electronics", "jewelery", "men's clothing", "women's clothing")[product_id % 4],
+        "image": f"https://fakestoreapi.com/img/{product_id}.jpg",
+        "rating": {"rate": round(1 + (product_id % 40) / 10, 1), "count": product_id * 3},
+    }
+
+
+def create_stub_app(
+    catalog_size: int = 200,
+    latency_ms: float = 50.0,
+    jitter_ms: float = 10.0,
+    error_rate: float = 0.0,
+    seed: int = 42,
+) -> FastAPI:
+    rng = random.Random(seed)
+    app = FastAPI(title="fakestore stub")
+    app.state.requests = 0
+
+    async def simulate_upstream():
+        app.state.requests += 1
+        delay = max(latency_ms + rng.uniform(-jitter_ms, jitter_ms), 0) / 1000
+        await asyncio.sleep(delay)
+        if rng.random() < error_rate:
+            raise HTTPException(status_code=503, detail="Simulated upstream failure")
+
+    @app.get("/products")
+    async def list_products():
+        await simulate_upstream()
+        return [make_product(pid) for pid in range(1, catalog_size + 1)]
+
+    @app.get("/products/{product_id}")
+    async def get_product(product_id: int):
+        await simulate_upstream()
+        if not 1 <= product_id <= catalog_size:
+            raise HTTPException(status_code=404, detail="Not found")
+        return make_product(product_id)
+
+    return app
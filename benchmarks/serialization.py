@@ -0,0 +1,96 @@
+"""
+Micro-benchmark da serialização da listagem de favoritos.
+
+Compara o caminho antigo (validar cada dict da API externa, revalidar a lista
+inteira pelo `response_model` e serializar com o json da stdlib) com o atual
+(Product validado uma vez e reaproveitado pelo cache, dump direto para dicts
+e serialização pelo `aiqfome.serialization.dumps`). Resultado em JSON, com o
+tempo médio por resposta de cada tamanho de lista.
+
+Exemplo:
+    python -m benchmarks.serialization --sizes 10 100 1000 --repeat 200
+"""
+import json
+import time
+import argparse
+import platform
+from typing import Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from aiqfome import fakestoreapi, schemas, serialization
+
+
+def make_products(size: int) -> List[Dict]:
+    return [
+        {"id": pid, "title": f"Product {pid}", "price": 10.5 + pid, "description": "Descrição " * 20,
+         "category": "electronics", "image": f"https://fakestoreapi.com/img/{pid}.jpg",
+         "rating": {"rate": 4.1, "count": pid * 3}}
+        for pid in range(1, size + 1)
+    ]
+
+
+_response_adapter = TypeAdapter(List[schemas.Product])
+
+def legacy_render(raw: List[Dict]) -> bytes:
+    """Caminho antigo: validação por item, revalidação pelo response_model e json da stdlib."""
+    products = [schemas.Product.model_validate(item) for item in raw]
+    validated = _response_adapter.validate_python(products, from_attributes=True)
+    content = jsonable_encoder(_response_adapter.dump_python(validated, mode="json", by_alias=True))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+def fast_render(raw: List[Dict], cache: fakestoreapi.ProductCache) -> bytes:
+    """Caminho atual: Product reaproveitado do cache e serialização direta."""
+    payload = [
+        cache.as_product(item["id"], item).model_dump(mode="json", by_alias=True) for item in raw
+    ]
+    return serialization.dumps(payload)
+
+
+def measure(render: Callable[[], bytes], repeat: int) -> float:
+    render()  # aquecimento
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    return (time.perf_counter() - started_at) / repeat
+
+
+def run(sizes: List[int], repeat: int) -> Dict:
+    results = {}
+    for size in sizes:
+        raw = make_products(size)
+        cache = fakestoreapi.ProductCache(ttl=3600, max_entries=max(size, 1))
+        for item in raw:
+            cache.set(item["id"], item)
+        assert json.loads(legacy_render(raw)) == json.loads(fast_render(raw, cache))
+
+        legacy = measure(lambda: legacy_render(raw), repeat)
+        fast = measure(lambda: fast_render(raw, cache), repeat)
+        results[str(size)] = {
+            "legacy_ms": round(legacy * 1000, 4),
+            "fast_ms": round(fast * 1000, 4),
+            "speedup": round(legacy / fast, 2) if fast else None,
+        }
+    return {
+        "python": platform.python_version(),
+        "orjson": serialization.orjson is not None,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Tamanhos da lista")
+    parser.add_argument("--repeat", type=int, default=100, help="Repetições por tamanho")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    print(json.dumps(run(args.sizes, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,15 @@ from typing import AsyncGenerator, Generator
 from contextlib import asynccontextmanager
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from httpx import ASGITransport, AsyncClient
 
 
-from aiqfome.database import Base, get_db
+from aiqfome import admission, dependencies, fakestoreapi, response_cache
+from aiqfome.database import Base, get_db, get_read_db, primary_pins
 from aiqfome.main import create_app 
 
 
@@ -30,7 +32,7 @@ engine = create_async_engine(
 
 # A sessionmaker agora se vincula ao novo engine SQLite
 TestAsyncSessionLocal = async_sessionmaker(
-    autocommit=False, autoflush=False, bind=engine, class_=AsyncSession
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine, class_=AsyncSession
 )
 
 # Fixture para criar e limpar as tabelas do banco de dados para cada teste
@@ -44,19 +46,54 @@ async def db_setup_and_teardown():
         await conn.run_sync(Base.metadata.drop_all) # Clean up after tests
 
 
-# Fixture do TestClient
-@pytest.fixture(scope="function", name="test_client")
-async def test_client(db_setup_and_teardown) -> Generator[TestClient, None, None]:
-    
+# Limpa os caches em memória e o circuit breaker entre os testes
+def reset_in_memory_state():
+    fakestoreapi.product_cache.clear()
+    fakestoreapi.upstream_breaker.reset()
+    fakestoreapi.hydration_planner.reset()
+    dependencies.identity_cache.clear()
+    primary_pins.clear()
+    admission.reset()
+    response_cache.favorites_cache.backend = response_cache.InMemoryResponseCache()
+
+@pytest.fixture(scope="function", autouse=True)
+def clear_caches():
+    reset_in_memory_state()
+    yield
+    reset_in_memory_state()
+
+
+# Fixture da aplicação
+@pytest.fixture(scope="function", name="app")
+def app_fixture(db_setup_and_teardown):
     # Cria a aplicação de teste sem o lifespan de produção
     app = create_app(lifespan=None)
 
     # Define a função de override.
     app.dependency_overrides[get_db] = lambda: db_setup_and_teardown # Override the database session dependency
+    app.dependency_overrides[get_read_db] = lambda: db_setup_and_teardown  # Sem réplica nos testes
+    yield app
+    app.dependency_overrides = {} # Clear overrides after tests
 
+
+# Fixture do TestClient
+@pytest.fixture(scope="function", name="test_client")
+async def test_client(app) -> Generator[TestClient, None, None]:
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://localhost") as client:
         yield client
-    app.dependency_overrides = {} # Clear overrides after tests
+
+
+# Fixture que registra os comandos SQL executados durante o teste
+@pytest.fixture(scope="function")
+def sql_statements(db_setup_and_teardown) -> Generator[list[str], None, None]:
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
 
 
 # Fixture de autenticação
@@ -0,0 +1,124 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from aiqfome import admission, fakestoreapi
+from aiqfome.admission import ConcurrencyLimiter, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_parse_rate():
+    assert admission.parse_rate("0.5:10") == (0.5, 10.0)
+    assert admission.parse_rate("5") == (5.0, 5.0)
+    assert admission.parse_rate("0") is None
+    assert admission.parse_rate("") is None
+
+
+# --- Token bucket ---
+
+def test_rate_limiter_allows_burst_then_refills():
+    clock = FakeClock()
+    limiter = RateLimiter("test", rate=1, burst=3, clock=clock)
+    assert [limiter.acquire("ip") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("ip") == pytest.approx(1.0)
+    assert limiter.acquire("other-ip") == 0  # buckets independentes por chave
+
+    clock.now = 1.5
+    assert limiter.acquire("ip") == 0
+
+def test_rate_limiter_bounds_tracked_keys():
+    limiter = RateLimiter("test", rate=1, burst=1, max_keys=2)
+    for key in ("a", "b", "c"):
+        limiter.acquire(key)
+    assert list(limiter._buckets) == ["b", "c"]
+
+
+# --- Concorrência com descarte ---
+
+async def test_concurrency_limiter_sheds_when_queue_is_full():
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, queue_timeout=5)
+    shed_before = admission.admission_rejected_total.value(limiter="test", reason="queue_full")
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queued == 1
+
+    with pytest.raises(HTTPException) as exc:
+        await limiter.acquire()
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "5"
+    assert admission.admission_rejected_total.value(limiter="test", reason="queue_full") == shed_before + 1
+
+    limiter.release()
+    await waiter
+    assert limiter.in_flight == 1
+    limiter.release()
+
+async def test_concurrency_limiter_sheds_after_queue_timeout():
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=10, queue_timeout=0.01)
+    await limiter.acquire()
+    with pytest.raises(HTTPException) as exc:
+        await limiter.acquire()
+    assert exc.value.status_code == 503
+    assert limiter.queued == 0
+    limiter.release()
+
+
+# --- Rotas ---
+
+async def test_login_is_rate_limited_per_account(test_client, auth_headers, mocker):
+    mocker.patch.object(admission.login_account_limiter, "burst", 2)
+    admission.login_account_limiter.clear()
+    credentials = {"username": "test@example.com", "password": "wrong"}
+    for _ in range(2):
+        assert (await test_client.post("/token", data=credentials)).status_code == 401
+
+    response = await test_client.post("/token", data=credentials)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+async def test_ndjson_listing_holds_its_slot_while_streaming(app, test_client, auth_headers):
+    in_flight = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        pid = int(request.url.path.rsplit("/", 1)[-1])
+        in_flight.append(admission.favorites_concurrency.in_flight)
+        return httpx.Response(200, json={"id": pid, "title": "P", "price": 1.0, "description": "d", "category": "c",
+                                         "image": "https://x/1.jpg", "rating": {"rate": 4.0, "count": 1}})
+
+    http_client = fakestoreapi.create_http_client(transport=httpx.MockTransport(handler))
+    app.dependency_overrides[fakestoreapi.get_http_client] = lambda: http_client
+    response = await test_client.post("/clients/logged/favorites/", json={"product_id": 1}, headers=auth_headers)
+    assert response.status_code == 201
+    fakestoreapi.product_cache.clear()
+    in_flight.clear()
+
+    response = await test_client.get(
+        "/clients/logged/favorites/", headers={**auth_headers, "Accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    # A hidratação roda durante o envio do corpo, ainda com a vaga ocupada; depois ela é devolvida
+    assert in_flight == [1]
+    assert admission.favorites_concurrency.in_flight == 0
+    await http_client.aclose()
+
+async def test_favorites_listing_sheds_load_when_saturated(test_client, auth_headers, mocker):
+    mocker.patch.object(admission.favorites_concurrency, "_semaphore", asyncio.Semaphore(0))
+    mocker.patch.object(admission.favorites_concurrency, "max_queue", 0)
+
+    response = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+    # Rotas sem chamadas à API externa não passam pelo limitador de concorrência
+    response = await test_client.delete("/clients/logged/favorites/1", headers=auth_headers)
+    assert response.status_code == 404
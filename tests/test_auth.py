@@ -0,0 +1,194 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import pytest
+from jose import jwt
+from passlib.hash import bcrypt
+
+from sqlalchemy import func, insert, select
+
+from aiqfome import crud, dependencies, models, purge, schemas, security
+from tests.conftest import TestAsyncSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_token_carries_client_id(test_client, auth_headers):
+    token = auth_headers["Authorization"].split()[1]
+    payload = jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+    me = (await test_client.get("/clients/logged", headers=auth_headers)).json()
+    assert payload["client_id"] == me["id"]
+    assert payload["sub"] == "test@example.com"
+
+async def test_authenticated_identity_is_cached(test_client, auth_headers, sql_statements):
+    await test_client.get("/clients/logged", headers=auth_headers)
+    sql_statements.clear()
+
+    response = await test_client.post("/clients/logged/favorites/batch/remove", json={"product_ids": [1]},
+                                      headers=auth_headers)
+    assert response.status_code == 200
+    assert len(sql_statements) == 1  # Só o DELETE: o token não levou a uma consulta do cliente
+
+async def test_client_etag_follows_version_changed_elsewhere(test_client, auth_headers, db_setup_and_teardown):
+    response = await test_client.get("/clients/logged", headers=auth_headers)
+    etag = response.headers["ETag"]
+    not_modified = await test_client.get("/clients/logged", headers={**auth_headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+
+    # Alteração feita por outro worker: a identidade em cache aqui não foi invalidada
+    db = db_setup_and_teardown
+    await crud.update_client(db, response.json()["id"], schemas.ClientUpdate(name="Renamed"))
+    response = await test_client.get("/clients/logged", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["name"] == "Renamed"
+
+async def test_update_invalidates_cached_identity(test_client, auth_headers):
+    await test_client.get("/clients/logged", headers=auth_headers)
+    response = await test_client.put("/clients/logged", json={"email": "new@example.com"}, headers=auth_headers)
+    assert response.status_code == 200
+
+    # O token emitido para o e-mail antigo deixa de valer, mesmo com a identidade em cache
+    assert (await test_client.get("/clients/logged", headers=auth_headers)).status_code == 401
+    dependencies.identity_cache.clear()
+    assert (await test_client.get("/clients/logged", headers=auth_headers)).status_code == 401
+
+    response = await test_client.post("/token", data={"username": "new@example.com", "password": "password123"})
+    me = await test_client.get("/clients/logged", headers={"Authorization": f"Bearer {response.json()['access_token']}"})
+    assert me.json()["email"] == "new@example.com"
+
+async def test_token_does_not_authenticate_a_reused_client_id(test_client, auth_headers, db_setup_and_teardown):
+    client_id = (await test_client.get("/clients/logged", headers=auth_headers)).json()["id"]
+    db = db_setup_and_teardown
+    assert await crud.delete_client(db, client_id)
+    dependencies.identity_cache.clear()
+    other = await crud.create_client(db, schemas.ClientCreate(name="Other", email="other@example.com", password="secret123"))
+    assert other.id == client_id  # O SQLite reaproveita o maior ID
+
+    assert (await test_client.get("/clients/logged", headers=auth_headers)).status_code == 401
+
+async def test_deleted_client_token_is_rejected(test_client, auth_headers):
+    await test_client.get("/clients/logged", headers=auth_headers)
+    response = await test_client.delete("/clients/logged", headers=auth_headers)
+    assert response.status_code == 204
+
+    response = await test_client.get("/clients/logged", headers=auth_headers)
+    assert response.status_code == 401
+
+async def test_stale_cached_identity_cannot_add_favorites(test_client, auth_headers, db_setup_and_teardown):
+    # Outro worker removeu o cliente; aqui a identidade ainda está em cache
+    identity = (await test_client.get("/clients/logged", headers=auth_headers)).json()
+    db = db_setup_and_teardown
+    await db.execute(insert(models.Product), [{"id": 1, "title": "P", "price": 1.0, "description": "d",
+                                               "category": "c", "image": "https://x/1.jpg",
+                                               "synced_at": datetime.now(timezone.utc)}])
+    await db.commit()
+    assert await crud.delete_client(db, identity["id"])
+    assert dependencies.identity_cache.get(identity["id"]) is not None
+
+    response = await test_client.post("/clients/logged/favorites/", json={"product_id": 1}, headers=auth_headers)
+    assert response.status_code == 401
+    assert dependencies.identity_cache.get(identity["id"]) is None
+
+    dependencies.identity_cache.set(schemas.Client(**identity))
+    response = await test_client.post(
+        "/clients/logged/favorites/batch", json={"product_ids": [1]}, headers=auth_headers
+    )
+    assert response.status_code == 401
+
+async def test_client_marked_for_purge_cannot_add_favorites(test_client, auth_headers, db_setup_and_teardown):
+    db = db_setup_and_teardown
+    client_id = (await test_client.get("/clients/logged", headers=auth_headers)).json()["id"]
+    assert await crud.mark_client_deleted(db, client_id)
+
+    with pytest.raises(crud.ClientNotFoundError):
+        await crud.add_favorites(db, client_id, [1, 2])
+    assert (await db.execute(select(func.count()).select_from(models.FavoriteProduct))).scalar() == 0
+
+async def test_async_purge_hides_client_and_removes_favorites_in_batches(
+    test_client, auth_headers, db_setup_and_teardown, mocker,
+):
+    mocker.patch.object(purge, "CLIENT_PURGE_MODE", "async")
+    mocker.patch.object(purge, "CLIENT_PURGE_BATCH_SIZE", 7)
+    mocker.patch.object(purge, "AsyncSessionLocal", TestAsyncSessionLocal)
+    batches = mocker.spy(crud, "purge_favorites_batch")
+    db = db_setup_and_teardown
+    client_id = (await test_client.get("/clients/logged", headers=auth_headers)).json()["id"]
+    await db.execute(insert(models.FavoriteProduct), [{"client_id": client_id, "product_id": pid} for pid in range(20)])
+    await db.commit()
+
+    response = await test_client.delete("/clients/logged", headers=auth_headers)
+    assert response.status_code == 204
+
+    # A limpeza roda depois da resposta, em lotes: 7 + 7 + 6 e um lote vazio
+    assert batches.call_count == 4
+    assert await purge.purge_pending_clients() == 0
+    assert (await db.execute(select(func.count()).select_from(models.Client))).scalar() == 0
+    assert (await db.execute(select(func.count()).select_from(models.FavoriteProduct))).scalar() == 0
+    response = await test_client.post("/token", data={"username": "test@example.com", "password": "password123"})
+    assert response.status_code == 401
+
+async def test_purge_skips_client_locked_by_another_worker(test_client, auth_headers, db_setup_and_teardown, mocker):
+    mocker.patch.object(purge, "AsyncSessionLocal", TestAsyncSessionLocal)
+    db = db_setup_and_teardown
+    client_id = (await test_client.get("/clients/logged", headers=auth_headers)).json()["id"]
+    await db.execute(insert(models.FavoriteProduct), [{"client_id": client_id, "product_id": pid} for pid in range(3)])
+    await db.commit()
+    assert await crud.mark_client_deleted(db, client_id)
+
+    @asynccontextmanager
+    async def held_elsewhere(_client_id):
+        yield False
+
+    mocker.patch.object(purge, "_purge_lock", held_elsewhere)
+    assert await purge.purge_client(client_id) == 0
+    assert await crud.get_clients_pending_purge(db) == [client_id]
+    assert (await db.execute(select(func.count()).select_from(models.FavoriteProduct))).scalar() == 3
+
+async def test_client_marked_for_purge_cannot_be_updated(test_client, auth_headers, db_setup_and_teardown):
+    client_id = (await test_client.get("/clients/logged", headers=auth_headers)).json()["id"]
+    db = db_setup_and_teardown
+    assert await crud.mark_client_deleted(db, client_id)
+    version = (await db.execute(select(models.Client.version).where(models.Client.id == client_id))).scalar()
+
+    # Identidade ainda em cache (como em outro worker): a escrita é recusada com 401, não 400
+    response = await test_client.put("/clients/logged", json={"name": "Renamed"}, headers=auth_headers)
+    assert response.status_code == 401
+    with pytest.raises(crud.ClientNotFoundError):
+        await crud.update_client(db, client_id, schemas.ClientUpdate())
+    db.expire_all()
+    assert (await db.execute(select(models.Client.version).where(models.Client.id == client_id))).scalar() == version
+
+async def test_client_marked_for_purge_is_rejected(test_client, auth_headers, db_setup_and_teardown):
+    client_id = (await test_client.get("/clients/logged", headers=auth_headers)).json()["id"]
+    assert await crud.mark_client_deleted(db_setup_and_teardown, client_id)
+    dependencies.identity_cache.clear()
+
+    assert (await test_client.get("/clients/logged", headers=auth_headers)).status_code == 401
+    response = await test_client.post("/token", data={"username": "test@example.com", "password": "password123"})
+    assert response.status_code == 401
+    assert await crud.get_clients_pending_purge(db_setup_and_teardown) == [client_id]
+
+async def test_login_upgrades_outdated_password_hash(test_client, db_setup_and_teardown):
+    db = db_setup_and_teardown
+    weak_hash = bcrypt.using(rounds=4).hash("password123")
+    db.add(models.Client(name="Old", email="old@example.com", hashed_password=weak_hash))
+    await db.commit()
+
+    response = await test_client.post("/token", data={"username": "old@example.com", "password": "password123"})
+    assert response.status_code == 200
+
+    client = await crud.get_client_by_email(db, "old@example.com")
+    await db.refresh(client)
+    assert client.hashed_password != weak_hash
+    assert client.hashed_password.startswith(f"$2b${security.BCRYPT_ROUNDS:02d}$")
+    assert security.pwd_context.verify("password123", client.hashed_password)
+
+async def test_password_hashing_runs_in_pool(test_client):
+    security.hash_pool_stats.reset()
+    response = await test_client.post("/token", data={"username": "nobody@example.com", "password": "x"})
+    assert response.status_code == 401
+
+    hashed = await security.get_password_hash("password123")
+    assert await security.verify_password("password123", hashed)
+    assert security.hash_pool_stats.tasks == 2
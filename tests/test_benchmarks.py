@@ -0,0 +1,53 @@
+import httpx
+
+from benchmarks import favorites_schema, load, serialization
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert load.percentile(values, 50) == 50.0
+    assert load.percentile(values, 99) == 99.0
+    assert load.percentile([], 95) == 0.0
+
+async def test_rate_limited_requests_are_not_counted_as_served():
+    calls = []
+
+    async def request(api, rng):
+        calls.append(1)
+        return httpx.Response(429 if len(calls) % 2 else 200)
+
+    result = await load.run_scenario(request, api=None, concurrency=1, duration=0.05)
+    assert result["rate_limited"] > 0
+    assert result["requests"] + result["rate_limited"] == len(calls)
+    assert result["errors"] == 0
+
+async def test_benchmark_smoke(tmp_path):
+    args = load.parse_args([
+        "--database-url", f"sqlite+aiosqlite:///{tmp_path / 'bench.db'}",
+        "--clients", "3", "--favorites", "5", "--catalog-size", "20",
+        "--concurrency", "2", "--duration", "0.2", "--upstream-latency-ms", "1",
+        "--scenarios", "clients_logged", "favorites_list",
+    ])
+    report = await load.run_benchmark(args)
+
+    assert set(report["results"]) == {"clients_logged", "favorites_list"}
+    listing = report["results"]["favorites_list"]
+    assert listing["requests"] > 0
+    assert listing["errors"] == 0
+    assert listing["p50_ms"] <= listing["p95_ms"] <= listing["p99_ms"]
+
+def test_serialization_benchmark_paths_agree():
+    report = serialization.run([10], repeat=1)
+    assert report["results"]["10"]["fast_ms"] > 0
+
+async def test_favorites_schema_benchmark_smoke(tmp_path):
+    args = favorites_schema.parse_args([
+        "--database-url", f"sqlite+aiosqlite:///{tmp_path / 'schema.db'}",
+        "--rows", "200", "--clients", "20", "--catalog-size", "50", "--batch-size", "64", "--queries", "10",
+    ])
+    report = await favorites_schema.run_benchmark(args)
+
+    assert set(report["results"]) == {"legacy", "composite_pk"}
+    for result in report["results"].values():
+        assert result["insert"]["rows"] == 200
+        assert result["list_query"]["requests"] == 10
@@ -0,0 +1,57 @@
+import httpx
+import pytest
+
+from aiqfome import catalog, crud, fakestoreapi
+
+pytestmark = pytest.mark.asyncio
+
+CATALOG = [
+    {"id": pid, "title": f"Product {pid}", "price": 10.0 * pid, "description": "desc",
+     "category": "cat", "image": f"https://fakestoreapi.com/img/{pid}.jpg",
+     "rating": {"rate": 4.0, "count": pid}}
+    for pid in (1, 2, 3)
+]
+
+
+def catalog_transport(calls: list, catalog_data: list = CATALOG) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path == "/products":
+            return httpx.Response(200, json=catalog_data)
+        return httpx.Response(404)
+    return httpx.MockTransport(handler)
+
+
+async def test_sync_catalog_only_rewrites_changed_rows(db_setup_and_teardown):
+    db = db_setup_and_teardown
+    calls = []
+    async with fakestoreapi.create_http_client(transport=catalog_transport(calls)) as client:
+        assert await catalog.sync_catalog(db, client) == 3
+        assert await catalog.sync_catalog(db, client) == 0
+
+    changed_catalog = [dict(CATALOG[0], price=99.9), *CATALOG[1:]]
+    async with fakestoreapi.create_http_client(transport=catalog_transport(calls, changed_catalog)) as client:
+        assert await catalog.sync_catalog(db, client) == 1
+
+    product = await crud.get_product(db, 1)
+    assert product.price == 99.9
+    assert product.synced_at is not None
+
+async def test_favorites_are_served_from_mirror(app, test_client, auth_headers, db_setup_and_teardown):
+    calls = []
+    http_client = fakestoreapi.create_http_client(transport=catalog_transport(calls))
+    app.dependency_overrides[fakestoreapi.get_http_client] = lambda: http_client
+    await catalog.sync_catalog(db_setup_and_teardown, http_client)
+    fakestoreapi.product_cache.clear()
+    calls.clear()
+
+    for pid in (3, 1):
+        response = await test_client.post("/clients/logged/favorites/", json={"product_id": pid}, headers=auth_headers)
+        assert response.status_code == 201
+    response = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    await http_client.aclose()
+
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [1, 3]
+    assert response.json()[1]["rating"] == {"rate": 4.0, "count": 3}
+    assert calls == []  # nenhuma chamada à API externa
@@ -0,0 +1,115 @@
+import time
+import asyncio
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from aiqfome import database, dependencies, response_cache
+from aiqfome.database import Base, get_read_db
+
+
+def test_engine_options_for_postgres(mocker):
+    mocker.patch.object(database, "DB_STATEMENT_CACHE_SIZE", 0)
+    options = database.engine_options("postgresql+asyncpg://user:pass@db:5432/aiqfome_db")
+    assert options["echo"] is False
+    assert options["poolclass"] is database.InstrumentedQueuePool
+    assert options["pool_size"] == database.DB_POOL_SIZE
+    assert options["connect_args"] == {"statement_cache_size": 0}
+
+def test_engine_options_for_sqlite():
+    options = database.engine_options("sqlite+aiosqlite:///:memory:")
+    assert "poolclass" not in options
+    assert "connect_args" not in options
+
+async def test_pool_status_tracks_checkouts_and_waits(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=database.InstrumentedQueuePool, pool_size=1, max_overflow=0,
+    )
+    other = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'other.db'}",
+        poolclass=database.InstrumentedQueuePool, pool_size=1, max_overflow=0,
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def slow_connect(dbapi_connection, connection_record):
+        time.sleep(0.2)
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        status = database.pool_status(engine)
+        assert status["checked_out"] == 1
+        assert status["size"] == 1
+    # Abrir a conexão (lento) não é espera na fila
+    assert database.pool_status(engine)["wait_seconds_max"] < 0.1
+
+    async def hold():
+        async with engine.connect():
+            await asyncio.sleep(0.2)
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0.05)
+    async with engine.connect() as conn:  # Espera o holder devolver a única conexão
+        await conn.execute(text("SELECT 1"))
+    await holder
+
+    status = database.pool_status(engine)
+    assert status["acquisitions"] == 3
+    assert status["wait_seconds_max"] >= 0.1
+    await engine.dispose()
+    assert database.pool_status(engine)["acquisitions"] == 3  # O pool recriado mantém as estatísticas
+    assert database.pool_status(other)["acquisitions"] == 0  # Cada engine tem as suas
+    await other.dispose()
+
+async def test_db_pool_endpoint(test_client):
+    response = await test_client.get("/ops/db-pool")
+    assert response.status_code == 200
+    keys = response.json().keys()
+    # Espera e ocupação só existem com o pool instrumentado (SQLite em memória usa StaticPool)
+    if isinstance(database.engine.pool, database.InstrumentedQueuePool):
+        assert {"acquisitions", "timeouts", "wait_seconds_total", "wait_seconds_max"} <= keys
+    if isinstance(database.engine.pool, AsyncAdaptedQueuePool):
+        assert {"size", "checked_out", "checked_in", "overflow"} <= keys
+
+
+# --- Réplica de leitura e read-your-writes ---
+
+async def test_reads_go_to_replica_unless_client_just_wrote(app, test_client, auth_headers, tmp_path, mocker):
+    mocker.patch("aiqfome.fakestoreapi.get_product_by_id", return_value={"id": 1, "title": "Test Product"})
+    mocker.patch("aiqfome.fakestoreapi.get_products_details", return_value=[{
+        "id": 1, "title": "Test Product", "price": 10.0, "description": "desc", "category": "cat",
+        "image": "https://fakestoreapi.com/img/1.jpg", "rating": {"rate": 4.5, "count": 120},
+    }])
+    # Réplica que ainda não recebeu nenhuma escrita
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with replica.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def get_replica_db():
+        async with database.AsyncSessionLocal(bind=replica) as session:
+            yield session
+
+    app.dependency_overrides[get_read_db] = get_replica_db
+    await test_client.post("/clients/logged/favorites/", json={"product_id": 1}, headers=auth_headers)
+
+    # Logo após a escrita, o cliente lê do principal
+    response = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    assert [p["id"] for p in response.json()] == [1]
+
+    # Fora da janela, lê da réplica (atrasada); a identidade ausente nela é confirmada no principal
+    database.primary_pins.clear()
+    dependencies.identity_cache.clear()
+    await response_cache.favorites_cache.clear()
+    response = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == []
+    await replica.dispose()
+
+def test_primary_pins_expire():
+    now = [0.0]
+    pins = database.PrimaryPins(window=5, clock=lambda: now[0])
+    pins.pin(1)
+    assert pins.is_pinned(1)
+    now[0] = 6
+    assert not pins.is_pinned(1)
@@ -0,0 +1,126 @@
+import json
+import asyncio
+
+import httpx
+import pytest
+from fastapi import BackgroundTasks, FastAPI
+
+from aiqfome import deadlines, fakestoreapi
+from aiqfome.deadlines import DeadlineMiddleware
+
+
+def product(pid: int) -> dict:
+    return {"id": pid, "title": f"Product {pid}", "price": 1.0, "description": "desc", "category": "cat",
+            "image": f"https://fakestoreapi.com/img/{pid}.jpg", "rating": {"rate": 4.0, "count": 1}}
+
+
+def slow_app(budget: float, events: list) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware, budget=budget)
+
+    @app.get("/slow")
+    async def slow():
+        events.append(deadlines.remaining())
+        await asyncio.sleep(1)
+        return {"done": True}
+
+    @app.get("/inner-timeout")
+    async def inner_timeout():
+        async with asyncio.timeout(0.01):
+            await asyncio.sleep(1)
+
+    @app.get("/background")
+    async def background(background_tasks: BackgroundTasks):
+        async def after_response():
+            await asyncio.sleep(0.2)
+            events.append("background_done")
+        background_tasks.add_task(after_response)
+        return {"done": True}
+
+    return app
+
+async def request(app: FastAPI, path: str, headers: dict = None) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+def test_timeout_header_parsing():
+    assert deadlines.parse_timeout_header(b"0.5") == 0.5
+    assert deadlines.parse_timeout_header(b"abc") is None
+    assert deadlines.parse_timeout_header(b"-1") is None
+    assert deadlines.parse_timeout_header(b"inf") is None
+    assert deadlines.parse_timeout_header(None) is None
+
+async def test_expired_deadline_cancels_handler_with_504():
+    events = []
+    response = await request(slow_app(0.05, events), "/slow")
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Request deadline exceeded."}
+    assert 0 < events[0] <= 0.05
+
+async def test_handler_timeout_is_not_reported_as_deadline():
+    # A exceção chega ao servidor (que responde 500) em vez de virar 504
+    with pytest.raises(TimeoutError):
+        await request(slow_app(5, []), "/inner-timeout")
+
+async def test_client_header_only_tightens_the_deadline():
+    events = []
+    response = await request(slow_app(5, events), "/slow", headers={"X-Request-Timeout": "0.05"})
+    assert response.status_code == 504
+    assert events[0] <= 0.05
+
+    events.clear()
+    app = slow_app(0.05, events)
+    response = await request(app, "/slow", headers={"X-Request-Timeout": "30"})
+    assert response.status_code == 504
+
+async def test_background_tasks_outlive_the_deadline():
+    events = []
+    response = await request(slow_app(0.05, events), "/background")
+    assert response.status_code == 200
+    assert events == ["background_done"]
+
+
+# --- Resposta parcial dos favoritos ---
+
+async def setup_favorites(app, test_client, auth_headers, slow_ids: set):
+    slow = {"enabled": False}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        pid = int(request.url.path.rsplit("/", 1)[-1])
+        if slow["enabled"] and pid in slow_ids:
+            await asyncio.sleep(2)
+        return httpx.Response(200, json=product(pid))
+
+    http_client = fakestoreapi.create_http_client(transport=httpx.MockTransport(handler))
+    app.dependency_overrides[fakestoreapi.get_http_client] = lambda: http_client
+    for pid in (1, 2, 3):
+        response = await test_client.post("/clients/logged/favorites/", json={"product_id": pid}, headers=auth_headers)
+        assert response.status_code == 201
+    fakestoreapi.product_cache.clear()
+    slow["enabled"] = True
+    return http_client
+
+async def test_list_favorites_returns_partial_results_when_budget_expires(app, test_client, auth_headers):
+    http_client = await setup_favorites(app, test_client, auth_headers, slow_ids={2})
+    response = await test_client.get(
+        "/clients/logged/favorites/", headers={**auth_headers, "X-Request-Timeout": "0.3"}
+    )
+    await http_client.aclose()
+
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [1, 3]
+    assert response.headers["X-Omitted-Ids"] == "2"
+    assert "ETag" not in response.headers  # Resposta parcial não é cacheável
+
+async def test_list_favorites_ndjson_marks_omitted_ids(app, test_client, auth_headers):
+    http_client = await setup_favorites(app, test_client, auth_headers, slow_ids={1, 3})
+    response = await test_client.get(
+        "/clients/logged/favorites/",
+        headers={**auth_headers, "X-Request-Timeout": "0.3", "Accept": "application/x-ndjson"},
+    )
+    await http_client.aclose()
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines[:-1]] == [2]
+    assert lines[-1] == {"omitted_ids": [1, 3]}
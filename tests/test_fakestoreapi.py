@@ -0,0 +1,391 @@
+import asyncio
+import multiprocessing
+import sqlite3
+import time
+import httpx
+import pytest
+
+from aiqfome import fakestoreapi
+from aiqfome.fakestoreapi import CircuitBreaker, CircuitOpenError, ProductCache
+from aiqfome.shared_cache import SharedProductStore
+
+PRODUCT = {"id": 1, "title": "Test Product", "price": 10.0, "description": "desc",
+           "category": "cat", "image": "https://fakestoreapi.com/img/1.jpg",
+           "rating": {"rate": 4.5, "count": 120}}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# --- Testes do cache de produtos ---
+
+async def test_cache_hit_after_miss():
+    calls = []
+
+    async def fetch(pid):
+        calls.append(pid)
+        return {**PRODUCT, "id": pid}
+
+    cache = ProductCache(ttl=60, max_entries=10)
+    assert (await cache.get_or_fetch(1, fetch))["id"] == 1
+    assert (await cache.get_or_fetch(1, fetch))["id"] == 1
+    assert calls == [1]
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "size": 1}
+
+async def test_cache_remembers_not_found():
+    calls = []
+
+    async def fetch(pid):
+        calls.append(pid)
+        return None
+
+    cache = ProductCache(ttl=60, max_entries=10, negative_ttl=30)
+    assert await cache.get_or_fetch(999, fetch) is None
+    assert await cache.get_or_fetch(999, fetch) is None
+    assert calls == [999]
+
+async def test_cache_entries_expire():
+    clock = FakeClock()
+    calls = []
+
+    async def fetch(pid):
+        calls.append(pid)
+        return PRODUCT
+
+    cache = ProductCache(ttl=10, max_entries=10, clock=clock)
+    await cache.get_or_fetch(1, fetch)
+    clock.now = 11
+    await cache.get_or_fetch(1, fetch)
+    assert calls == [1, 1]
+
+async def test_cache_evicts_least_recently_used():
+    async def fetch(pid):
+        return {**PRODUCT, "id": pid}
+
+    cache = ProductCache(ttl=60, max_entries=2)
+    await cache.get_or_fetch(1, fetch)
+    await cache.get_or_fetch(2, fetch)
+    await cache.get_or_fetch(1, fetch)  # 1 passa a ser o mais recente
+    await cache.get_or_fetch(3, fetch)
+
+    assert cache.get(1)[0] is True
+    assert cache.get(2)[0] is False
+    assert cache.evictions == 1
+
+async def test_cache_coalesces_concurrent_misses():
+    calls = []
+    release = asyncio.Event()
+
+    async def fetch(pid):
+        calls.append(pid)
+        await release.wait()
+        return PRODUCT
+
+    cache = ProductCache(ttl=60, max_entries=10)
+    waiters = [asyncio.create_task(cache.get_or_fetch(1, fetch)) for _ in range(20)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == [1]
+    assert all(r == PRODUCT for r in results)
+
+async def test_cache_does_not_store_upstream_errors():
+    calls = []
+
+    async def fetch(pid):
+        calls.append(pid)
+        raise RuntimeError("upstream down")
+
+    cache = ProductCache(ttl=60, max_entries=10)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await cache.get_or_fetch(1, fetch)
+    assert calls == [1, 1]
+
+async def test_cache_validates_each_product_once():
+    cache = ProductCache(ttl=60, max_entries=10)
+    cache.set(1, PRODUCT)
+    product = cache.as_product(1, PRODUCT)
+    assert cache.as_product(1, PRODUCT) is product
+    assert product.review.count == 120
+
+    # Um novo valor no cache descarta o Product validado do anterior
+    cache.set(1, {**PRODUCT, "price": 20.0})
+    assert cache.as_product(1, cache.get(1)[1]).price == 20.0
+
+
+# --- Testes do cache compartilhado entre workers ---
+
+async def test_shared_store_serves_products_fetched_by_another_worker(tmp_path):
+    path = str(tmp_path / "products.db")
+    calls = []
+
+    async def fetch(pid):
+        calls.append(pid)
+        return {**PRODUCT, "id": pid} if pid != 2 else None
+
+    worker_a = ProductCache(ttl=60, max_entries=10, shared=SharedProductStore(path))
+    worker_b = ProductCache(ttl=60, max_entries=10, shared=SharedProductStore(path))
+    assert (await worker_a.get_or_fetch(1, fetch))["id"] == 1
+    assert await worker_a.get_or_fetch(2, fetch) is None
+
+    assert (await worker_b.get_or_fetch(1, fetch))["id"] == 1
+    assert await worker_b.get_or_fetch(2, fetch) is None  # o 404 também é compartilhado
+    assert calls == [1, 2]
+    assert worker_b.shared.hits == 2
+
+async def test_clearing_one_worker_keeps_the_shared_store(tmp_path):
+    path = str(tmp_path / "products.db")
+    calls = []
+
+    async def fetch(pid):
+        calls.append(pid)
+        return {**PRODUCT, "id": pid}
+
+    worker_a = ProductCache(ttl=60, max_entries=10, shared=SharedProductStore(path))
+    worker_b = ProductCache(ttl=60, max_entries=10, shared=SharedProductStore(path))
+    await worker_a.get_or_fetch(1, fetch)
+    worker_a.clear()
+
+    assert len(worker_a) == 0
+    assert (await worker_b.get_or_fetch(1, fetch))["id"] == 1
+    assert calls == [1]
+
+def _write_from_child_process(path: str) -> None:
+    SharedProductStore(path).set(5, {**PRODUCT, "id": 5}, ttl=60)
+
+def test_shared_store_is_visible_across_processes(tmp_path):
+    path = str(tmp_path / "products.db")
+    store = SharedProductStore(path)
+    assert store.get(5)[0] is False  # conexão aberta antes do fork
+
+    child = multiprocessing.get_context("fork").Process(target=_write_from_child_process, args=(path,))
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+
+    found, product, ttl_left = store.get(5)
+    assert found and product["id"] == 5 and 0 < ttl_left <= 60
+
+def test_shared_store_gives_up_quickly_when_another_worker_holds_the_lock(tmp_path):
+    path = str(tmp_path / "products.db")
+    store = SharedProductStore(path)
+    store.set(1, PRODUCT, ttl=60)
+    other_worker = sqlite3.connect(path, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")  # Gravação longa em outro processo
+    try:
+        started_at = time.perf_counter()
+        store.set(2, {**PRODUCT, "id": 2}, ttl=60)
+        assert time.perf_counter() - started_at < 0.1  # Não segura o event loop
+        assert store.busy == 1 and store.errors == 0
+        assert store.get(1)[0] is True  # Leituras (WAL) seguem sem esperar
+    finally:
+        other_worker.execute("ROLLBACK")
+        other_worker.close()
+    assert store.get(2)[0] is False  # A gravação foi descartada: só um miss a mais
+
+def test_shared_store_expires_and_prunes_entries(tmp_path):
+    clock = FakeClock()
+    store = SharedProductStore(str(tmp_path / "products.db"), max_entries=10, clock=clock)
+    store.set(1, PRODUCT, ttl=10)
+    clock.now = 11
+    found, product, ttl_left = store.get(1)
+    assert found and product == PRODUCT and ttl_left < 0  # vencido, mas disponível como dado antigo
+
+    store.set_many([(pid, {**PRODUCT, "id": pid}, 60) for pid in range(2, 80)])
+    assert store.size() <= 10
+    assert store.get(1)[0] is False  # os vencidos saem primeiro
+
+
+# --- Testes das funções de busca ---
+
+def stub_transport(handler_calls: list) -> httpx.MockTransport:
+    """Transporte local que simula a fakestoreapi (o produto 2 não existe)."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        handler_calls.append(request.url.path)
+        pid = int(request.url.path.rsplit("/", 1)[-1])
+        if pid == 2:
+            return httpx.Response(404)
+        return httpx.Response(200, json={**PRODUCT, "id": pid})
+    return httpx.MockTransport(handler)
+
+async def test_get_products_details_skips_missing_products():
+    calls = []
+    async with fakestoreapi.create_http_client(transport=stub_transport(calls)) as client:
+        products = await fakestoreapi.get_products_details([1, 2, 3], client)
+    assert [p.id for p in products] == [1, 3]
+    assert len(calls) == 3
+
+async def test_list_favorites_uses_injected_http_client(app, test_client, auth_headers):
+    calls = []
+    http_client = fakestoreapi.create_http_client(transport=stub_transport(calls))
+    app.dependency_overrides[fakestoreapi.get_http_client] = lambda: http_client
+
+    await test_client.post("/clients/logged/favorites/", json={"product_id": 5}, headers=auth_headers)
+    response = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    await http_client.aclose()
+
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [5]
+    assert calls == ["/products/5"]  # a listagem foi servida pelo cache
+
+
+# --- Testes do circuit breaker e do fallback com dados antigos ---
+
+async def failing_call():
+    raise httpx.ConnectError("upstream down")
+
+async def ok_call():
+    return "ok"
+
+async def test_breaker_opens_and_fails_fast():
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=4, min_calls=4, failure_ratio=0.5, reset_timeout=30, clock=clock)
+    for call in (ok_call, failing_call, ok_call, failing_call):
+        try:
+            await breaker.call(call)
+        except httpx.HTTPError:
+            pass
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(ok_call)
+    assert breaker.rejected == 1
+
+async def test_breaker_half_open_trial_closes_circuit():
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=2, min_calls=2, failure_ratio=0.5, reset_timeout=30, clock=clock)
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPError):
+            await breaker.call(failing_call)
+    assert breaker.state == "open"
+
+    clock.now = 31
+    assert breaker.state == "half_open"
+    assert await breaker.call(ok_call) == "ok"
+    assert breaker.state == "closed"
+
+async def test_get_products_details_limits_concurrency(mocker):
+    mocker.patch("aiqfome.fakestoreapi.HYDRATION_MAX_CONCURRENCY", 3)
+    mocker.patch.object(fakestoreapi.hydration_planner, "bulk_threshold", 0)  # Força a busca por ID
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        pid = int(request.url.path.rsplit("/", 1)[-1])
+        return httpx.Response(200, json={**PRODUCT, "id": pid})
+
+    async with fakestoreapi.create_http_client(transport=httpx.MockTransport(handler)) as client:
+        products = await fakestoreapi.get_products_details(list(range(1, 21)), client)
+
+    assert len(products) == 20
+    assert max_in_flight == 3
+
+# --- Testes do planejamento da hidratação ---
+
+def test_planner_prefers_bulk_above_threshold():
+    planner = fakestoreapi.HydrationPlanner(bulk_threshold=8, small_catalog_size=0)
+    assert planner.plan(1) == ("per_id", "single")
+    assert planner.plan(3) == ("per_id", "default")
+    assert planner.plan(8) == ("bulk", "threshold")
+
+def test_planner_prefers_bulk_for_small_catalogs():
+    planner = fakestoreapi.HydrationPlanner(bulk_threshold=0, small_catalog_size=50)
+    assert planner.plan(2) == ("per_id", "default")
+    planner.catalog_size = 20
+    assert planner.plan(2) == ("bulk", "small_catalog")
+
+def test_planner_compares_observed_latencies():
+    planner = fakestoreapi.HydrationPlanner(bulk_threshold=0, small_catalog_size=0)
+    planner.observe("product", 0.1)
+    planner.observe("catalog", 0.25)
+    # 4 IDs com concorrência 2: duas rodadas (0.2s) contra uma listagem (0.25s)
+    assert planner.plan(4, concurrency=2) == ("per_id", "default")
+    # 6 IDs: três rodadas (0.3s)
+    assert planner.plan(6, concurrency=2) == ("bulk", "latency")
+
+async def test_get_products_details_uses_single_listing_for_many_ids():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(200, json=[{**PRODUCT, "id": pid} for pid in range(1, 21)])
+
+    async with fakestoreapi.create_http_client(transport=httpx.MockTransport(handler)) as client:
+        products = await fakestoreapi.get_products_details(list(range(1, 13)) + [99], client)
+
+    assert calls == ["/products"]
+    assert [product.id for product in products] == list(range(1, 13))
+    assert fakestoreapi.hydration_planner.catalog_size == 20
+
+async def test_concurrent_cold_hydrations_share_one_listing():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json=[{**PRODUCT, "id": pid} for pid in range(1, 21)])
+
+    async with fakestoreapi.create_http_client(transport=httpx.MockTransport(handler)) as client:
+        results = await asyncio.gather(
+            *(fakestoreapi.get_products_details(list(range(1, 11)), client) for _ in range(50))
+        )
+
+    assert calls == ["/products"]
+    assert all([product.id for product in products] == list(range(1, 11)) for products in results)
+
+def test_bulk_writes_get_spread_expirations():
+    clock = FakeClock()
+    cache = ProductCache(ttl=100, max_entries=100, clock=clock, ttl_jitter=0.2)
+    cache.set_many([(pid, {**PRODUCT, "id": pid}) for pid in range(1, 51)])
+    expirations = [expires_at for expires_at, _ in cache._entries.values()]
+    assert all(80 <= expires_at <= 100 for expires_at in expirations)
+    assert len(set(expirations)) > 1
+
+async def test_get_products_details_falls_back_to_per_id_when_listing_fails():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path == "/products":
+            return httpx.Response(500)
+        pid = int(request.url.path.rsplit("/", 1)[-1])
+        return httpx.Response(200, json={**PRODUCT, "id": pid})
+
+    async with fakestoreapi.create_http_client(transport=httpx.MockTransport(handler)) as client:
+        products = await fakestoreapi.get_products_details(list(range(1, 9)), client)
+
+    assert len(products) == 8
+    assert calls.count("/products") == 1
+    assert len(calls) == 9
+
+async def test_list_favorites_serves_stale_data_when_circuit_is_open(app, test_client, auth_headers, mocker):
+    clock = FakeClock()
+    mocker.patch.object(fakestoreapi.product_cache, "_clock", clock)
+    calls = []
+    http_client = fakestoreapi.create_http_client(transport=stub_transport(calls))
+    app.dependency_overrides[fakestoreapi.get_http_client] = lambda: http_client
+    await test_client.post("/clients/logged/favorites/", json={"product_id": 7}, headers=auth_headers)
+
+    # O cache expira e o circuito abre
+    clock.now = fakestoreapi.product_cache.ttl + 1
+    fakestoreapi.upstream_breaker._opened_at = fakestoreapi.upstream_breaker._clock()
+
+    response = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    await http_client.aclose()
+
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [7]
+    assert response.headers["X-Data-Stale"] == "true"
+    assert calls == ["/products/7"]
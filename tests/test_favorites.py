@@ -0,0 +1,196 @@
+import json
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from sqlalchemy import insert
+
+from aiqfome import fakestoreapi, models, response_cache
+
+pytestmark = pytest.mark.asyncio
+
+
+def product(pid: int) -> dict:
+    return {"id": pid, "title": f"Product {pid}", "price": 1.0, "description": "desc", "category": "cat",
+            "image": f"https://fakestoreapi.com/img/{pid}.jpg", "rating": {"rate": 4.0, "count": 1}}
+
+
+@pytest.fixture
+async def upstream(app):
+    """Substitui a API externa por um transporte local que conhece qualquer produto."""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(200, json=product(int(request.url.path.rsplit("/", 1)[-1])))
+
+    http_client = fakestoreapi.create_http_client(transport=httpx.MockTransport(handler))
+    app.dependency_overrides[fakestoreapi.get_http_client] = lambda: http_client
+    yield calls
+    await http_client.aclose()
+
+
+async def add_favorites(test_client, auth_headers, product_ids):
+    for pid in product_ids:
+        response = await test_client.post("/clients/logged/favorites/", json={"product_id": pid}, headers=auth_headers)
+        assert response.status_code == 201
+
+
+async def test_list_favorites_keyset_pagination(test_client, auth_headers, upstream):
+    await add_favorites(test_client, auth_headers, [5, 3, 9, 1, 7])
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = await test_client.get("/clients/logged/favorites/", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        pages.append([p["id"] for p in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert pages == [[1, 3], [5, 7], [9]]  # Ordem da chave primária (product_id)
+
+async def test_list_favorites_rejects_invalid_cursor(test_client, auth_headers):
+    response = await test_client.get("/clients/logged/favorites/", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor."
+
+async def test_list_favorites_ndjson_stream(test_client, auth_headers, upstream):
+    await add_favorites(test_client, auth_headers, [2, 4, 6])
+    fakestoreapi.product_cache.clear()
+
+    response = await test_client.get(
+        "/clients/logged/favorites/",
+        params={"limit": 2},
+        headers={**auth_headers, "Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert "X-Next-Cursor" in response.headers
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(p["id"] for p in lines) == [2, 4]
+    assert lines[0]["rating"] == {"rate": 4.0, "count": 1}
+
+async def test_batch_add_reports_status_per_item(app, test_client, auth_headers, sql_statements):
+    listing_calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        listing_calls.append(request.url.path)
+        return httpx.Response(200, json=[product(1), product(2), product(3)])
+
+    http_client = fakestoreapi.create_http_client(transport=httpx.MockTransport(handler))
+    app.dependency_overrides[fakestoreapi.get_http_client] = lambda: http_client
+    await test_client.post("/clients/logged/favorites/batch", json={"product_ids": [1]}, headers=auth_headers)
+    listing_calls.clear()
+    sql_statements.clear()
+
+    response = await test_client.post(
+        "/clients/logged/favorites/batch", json={"product_ids": [1, 2, 3, 99, 2]}, headers=auth_headers
+    )
+    await http_client.aclose()
+
+    assert response.status_code == 200
+    assert response.json()["results"] == [
+        {"product_id": 1, "status": "already_in_favorites"},
+        {"product_id": 2, "status": "added"},
+        {"product_id": 3, "status": "added"},
+        {"product_id": 99, "status": "not_found"},
+    ]
+    assert listing_calls == ["/products"]  # uma única busca externa para o lote inteiro
+    assert sum(s.lstrip().upper().startswith("INSERT") for s in sql_statements) == 1
+
+async def test_batch_remove_reports_status_per_item(test_client, auth_headers, upstream):
+    await add_favorites(test_client, auth_headers, [1, 2])
+
+    response = await test_client.post(
+        "/clients/logged/favorites/batch/remove", json={"product_ids": [2, 5]}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["results"] == [
+        {"product_id": 2, "status": "removed"},
+        {"product_id": 5, "status": "not_found"},
+    ]
+    listing = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    assert [p["id"] for p in listing.json()] == [1]
+
+async def mirror_products(db, product_ids):
+    """Grava os produtos no espelho local do catálogo."""
+    await db.execute(insert(models.Product), [
+        {"id": pid, "title": f"Product {pid}", "price": 1.0, "description": "desc", "category": "cat",
+         "image": f"https://fakestoreapi.com/img/{pid}.jpg", "synced_at": datetime.now(timezone.utc)}
+        for pid in product_ids
+    ])
+    await db.commit()
+
+async def test_list_favorites_conditional_get(test_client, auth_headers, upstream, sql_statements, db_setup_and_teardown):
+    await mirror_products(db_setup_and_teardown, [1, 2])
+    await add_favorites(test_client, auth_headers, [1, 2])
+    response = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    etag = response.headers["ETag"]
+
+    await response_cache.favorites_cache.clear()  # Sem o cache de respostas, decide pela versão
+    upstream.clear()
+    sql_statements.clear()
+    response = await test_client.get("/clients/logged/favorites/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert len(sql_statements) == 1  # apenas a versão do cliente
+    assert upstream == []
+
+    # Qualquer alteração nos favoritos muda o ETag
+    await test_client.delete("/clients/logged/favorites/2", headers=auth_headers)
+    response = await test_client.get("/clients/logged/favorites/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [1]
+    assert response.headers["ETag"] != etag
+
+async def test_upstream_products_are_validated_by_content(app, test_client, auth_headers):
+    prices, failing = {1: 1.0}, []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if failing:
+            return httpx.Response(500)
+        return httpx.Response(200, json={**product(1), "price": prices[1]})
+
+    http_client = fakestoreapi.create_http_client(transport=httpx.MockTransport(handler))
+    app.dependency_overrides[fakestoreapi.get_http_client] = lambda: http_client
+
+    async def get_favorites(etag):
+        await response_cache.favorites_cache.clear()
+        return await test_client.get("/clients/logged/favorites/", headers={**auth_headers, "If-None-Match": etag})
+
+    await add_favorites(test_client, auth_headers, [1])
+    etag = (await get_favorites("")).headers["ETag"]
+    assert (await get_favorites(etag)).status_code == 304
+
+    # O produto mudou na API externa, sem mudar a versão do cliente: o ETag antigo não vale mais
+    prices[1] = 2.0
+    fakestoreapi.product_cache.clear()
+    response = await get_favorites(etag)
+    assert response.status_code == 200
+    assert response.json()[0]["price"] == 2.0
+    assert response.headers["ETag"] != etag
+    etag = response.headers["ETag"]
+
+    # API externa fora do ar: dados antigos do cache, sem ETag e sem 304
+    failing.append(True)
+    for product_id, (_, data) in list(fakestoreapi.product_cache._entries.items()):
+        fakestoreapi.product_cache._entries[product_id] = (0.0, data)
+    response = await get_favorites(etag)
+    assert response.status_code == 200
+    assert response.headers["X-Data-Stale"] == "true"
+    assert "ETag" not in response.headers
+    await http_client.aclose()
+
+async def test_client_profile_conditional_get(test_client, auth_headers):
+    response = await test_client.get("/clients/logged", headers=auth_headers)
+    etag = response.headers["ETag"]
+
+    response = await test_client.get("/clients/logged", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    await test_client.put("/clients/logged", json={"name": "Renamed"}, headers=auth_headers)
+    response = await test_client.get("/clients/logged", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["name"] == "Renamed"
@@ -0,0 +1,73 @@
+import httpx
+
+from aiqfome import fakestoreapi, metrics
+from tests.conftest import engine
+
+
+def test_statement_shape_groups_equivalent_statements():
+    a = metrics.statement_shape("SELECT x FROM t WHERE id IN ($1, $2, $3)")
+    b = metrics.statement_shape("SELECT x\n  FROM t WHERE id IN ($1, $2)")
+    assert a == b == "SELECT x FROM t WHERE id IN (?)"
+    assert metrics.statement_shape("INSERT INTO t (a) VALUES (?), (?), (?)") == "INSERT INTO t (a) VALUES (?)"
+
+def test_statement_shape_strips_asyncpg_parameter_casts():
+    a = metrics.statement_shape("SELECT x FROM t WHERE id IN ($1::INTEGER, $2::INTEGER)")
+    b = metrics.statement_shape("SELECT x FROM t WHERE id IN ($1::INTEGER, $2::INTEGER, $3::INTEGER)")
+    assert a == b == "SELECT x FROM t WHERE id IN (?)"
+    insert = metrics.statement_shape(
+        "INSERT INTO t (a, b, c) VALUES ($1::INTEGER, $2::VARCHAR(255), $3::TIMESTAMP WITH TIME ZONE), "
+        "($4::INTEGER, $5::VARCHAR(255), $6::TIMESTAMP WITH TIME ZONE)"
+    )
+    assert insert == "INSERT INTO t (a, b, c) VALUES (?)"
+
+def test_statement_shape_cap_counts_distinct_shapes(mocker):
+    mocker.patch.object(metrics, "MAX_STATEMENT_SHAPES", 2)
+    mocker.patch.object(metrics, "MAX_CACHED_STATEMENTS", 10)
+    mocker.patch.object(metrics, "_known_shapes", set())
+    cache = mocker.patch.object(metrics, "_statement_shapes", {})
+
+    # Muitas variações do mesmo formato ocupam um único lugar
+    for size in range(1, 50):
+        params = ", ".join(f"${i}::INTEGER" for i in range(1, size + 1))
+        assert metrics.statement_shape(f"SELECT x FROM t WHERE id IN ({params})") == "SELECT x FROM t WHERE id IN (?)"
+    assert len(cache) == 10  # O cache de SQL bruto para de crescer no limite
+
+    assert metrics.statement_shape("SELECT y FROM u WHERE id = $1") == "SELECT y FROM u WHERE id = ?"
+    assert metrics.statement_shape("DELETE FROM v WHERE id = $1") == "other"
+    assert metrics.statement_shape("SELECT y FROM u WHERE id = $2") == "SELECT y FROM u WHERE id = ?"
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1))
+    histogram.observe(0.05, route="/a")
+    histogram.observe(0.5, route="/a")
+    text = "\n".join(histogram.render())
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{route="/a"} 2' in text
+
+async def test_metrics_endpoint_reports_routes_statements_and_upstream(app, test_client, auth_headers):
+    metrics.instrument_engine(engine)
+    route_labels = {"method": "GET", "route": "/clients/logged/favorites/"}
+    before = metrics.http_request_duration_seconds.count(**route_labels)
+    upstream_before = metrics.upstream_request_duration_seconds.count(operation="product", outcome="not_found")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(404)
+
+    http_client = fakestoreapi.create_http_client(transport=httpx.MockTransport(handler))
+    app.dependency_overrides[fakestoreapi.get_http_client] = lambda: http_client
+    await test_client.post("/clients/logged/favorites/", json={"product_id": 42}, headers=auth_headers)
+    await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    await http_client.aclose()
+
+    response = await test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert metrics.http_request_duration_seconds.count(**route_labels) == before + 1
+    assert metrics.upstream_request_duration_seconds.count(operation="product", outcome="not_found") == upstream_before + 1
+    assert 'http_requests_total{method="POST",route="/clients/logged/favorites/",status="404"}' in response.text
+    assert "db_statement_duration_seconds_bucket" in response.text
+    assert 'http_request_db_statements_count{method="GET",route="/clients/logged/favorites/"}' in response.text
+    assert "product_cache_misses_total" in response.text
+    assert "password_hash_queue_seconds_total" in response.text
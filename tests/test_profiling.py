@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import pstats
+
+import pytest
+
+from aiqfome import metrics, profiling
+from tests.conftest import engine
+
+
+def signed_header(secret: str, ttl: int = 60) -> dict:
+    return {"X-Debug-Profile": profiling.sign_debug_token(secret, int(time.time()) + ttl)}
+
+def enable(mocker, tmp_path, sample_rate: float = 0, secret: str = "debug-secret"):
+    # A configuração vale a partir da primeira requisição (quando o middleware é montado)
+    mocker.patch.object(profiling, "PROFILING_SAMPLE_RATE", sample_rate)
+    mocker.patch.object(profiling, "PROFILING_DEBUG_SECRET", secret)
+    mocker.patch.object(profiling, "PROFILING_DIR", str(tmp_path))
+
+@pytest.fixture
+def debug_profiling(mocker, tmp_path):
+    enable(mocker, tmp_path)
+    return tmp_path
+
+
+def test_debug_token_signature_and_expiry():
+    token = profiling.sign_debug_token("s3cret", 2000)
+    assert profiling.verify_debug_token("s3cret", token, now=1000)
+    assert not profiling.verify_debug_token("s3cret", token, now=2001)
+    assert not profiling.verify_debug_token("other", token, now=1000)
+    assert not profiling.verify_debug_token("s3cret", "2000.deadbeef", now=1000)
+    assert not profiling.verify_debug_token("", token, now=1000)
+
+def test_prune_keeps_newest_profiles_within_limits(tmp_path):
+    for i in range(5):
+        base = tmp_path / f"profile-{i}"
+        (base.with_suffix(".prof")).write_bytes(b"x" * 100)
+        (base.with_suffix(".json")).write_text("{}")
+        os.utime(base.with_suffix(".prof"), (i, i))
+
+    assert profiling.prune(str(tmp_path), max_files=3, max_bytes=10_000) == 2
+    assert sorted(p.name for p in tmp_path.glob("*.prof")) == ["profile-2.prof", "profile-3.prof", "profile-4.prof"]
+    assert len(list(tmp_path.glob("*.json"))) == 3
+
+    assert profiling.prune(str(tmp_path), max_files=10, max_bytes=250) == 1
+    assert len(list(tmp_path.glob("*.prof"))) == 2
+
+async def test_profiling_is_off_by_default(test_client, tmp_path, mocker):
+    mocker.patch.object(profiling, "PROFILING_DIR", str(tmp_path))
+    response = await test_client.get("/health/live", headers=signed_header("anything"))
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+async def test_signed_header_profiles_login_with_wait_breakdown(debug_profiling, test_client, auth_headers):
+    metrics.instrument_engine(engine)
+    response = await test_client.post(
+        "/token", data={"username": "test@example.com", "password": "password123"},
+        headers={**signed_header("debug-secret"), "X-Request-ID": "req-42"},
+    )
+    assert response.status_code == 200
+    assert response.headers["x-profile-id"] == "req-42"
+
+    [profile_path] = debug_profiling.glob("*-POST-token-req-42.prof")
+    summary = json.loads(profile_path.with_suffix(".json").read_text())
+    assert summary["route"] == "/token"
+    assert summary["trigger"] == "header"
+    assert summary["waits_seconds"]["password_hash"] > 0
+    assert summary["waits_seconds"]["db"] > 0
+    # O bcrypt roda no pool de threads e também entra no perfil
+    stats = pstats.Stats(str(profile_path))
+    assert any("bcrypt" in filename for filename, _, _ in stats.stats)
+
+async def test_invalid_header_is_not_profiled(debug_profiling, test_client):
+    response = await test_client.get("/health/live", headers=signed_header("wrong-secret"))
+    assert "x-profile-id" not in response.headers
+    assert list(debug_profiling.iterdir()) == []
+
+async def test_sampling_profiles_requests_and_applies_retention(test_client, tmp_path, mocker):
+    enable(mocker, tmp_path, sample_rate=1.0, secret="")
+    mocker.patch.object(profiling, "PROFILING_MAX_FILES", 2)
+    for _ in range(4):
+        assert (await test_client.get("/health/live")).status_code == 200
+
+    assert len(list(tmp_path.glob("*-GET-health_live-*.prof"))) == 2
+    assert len(list(tmp_path.glob("*.json"))) == 2
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import func, insert, select
+
+from aiqfome import fakestoreapi, models
+
+pytestmark = pytest.mark.asyncio
+
+PRODUCT = {"id": 1, "title": "Test Product", "price": 10.0, "description": "desc", "category": "cat",
+           "image": "https://fakestoreapi.com/img/1.jpg", "rating": {"rate": 4.5, "count": 120}}
+
+
+@pytest.fixture
+def cached_products():
+    """Produtos já no cache, para que só os acessos ao banco sejam contados."""
+    for pid in (1, 2):
+        fakestoreapi.product_cache.set(pid, {**PRODUCT, "id": pid})
+
+
+async def test_create_client_statement_count(test_client, sql_statements):
+    response = await test_client.post(
+        "/clients/", json={"name": "John", "email": "john@example.com", "password": "password123"}
+    )
+    assert response.status_code == 201
+    assert len(sql_statements) == 1
+
+async def test_create_duplicate_client_statement_count(test_client, auth_headers, sql_statements):
+    sql_statements.clear()
+    response = await test_client.post(
+        "/clients/", json={"name": "Dup", "email": "test@example.com", "password": "password123"}
+    )
+    assert response.status_code == 400
+    assert len(sql_statements) == 1
+
+@pytest.mark.parametrize("method, url, body, expected_status, expected_statements", [
+    ("GET", "/clients/logged", None, 200, 1),  # cliente + versão (ETag); a autenticação vem do cache
+    ("PUT", "/clients/logged", {"name": "New Name"}, 200, 1),
+    ("POST", "/clients/logged/favorites/", {"product_id": 2}, 201, 3),  # espelho + INSERT + versão
+    ("POST", "/clients/logged/favorites/", {"product_id": 1}, 409, 2),  # espelho + INSERT ignorado
+    ("DELETE", "/clients/logged/favorites/1", None, 204, 2),  # DELETE + versão
+    ("DELETE", "/clients/logged/favorites/2", None, 404, 1),
+    ("GET", "/clients/logged/favorites/", None, 200, 2),  # versão (ETag) + JOIN
+])
+async def test_endpoint_statement_count(
+    test_client, auth_headers, cached_products, sql_statements,
+    method, url, body, expected_status, expected_statements,
+):
+    # Aquece o cache de identidade e cria um favorito
+    await test_client.post("/clients/logged/favorites/", json={"product_id": 1}, headers=auth_headers)
+    sql_statements.clear()
+
+    response = await test_client.request(method, url, json=body, headers=auth_headers)
+    assert response.status_code == expected_status
+    assert len(sql_statements) == expected_statements, sql_statements
+
+@pytest.mark.parametrize("favorites", [1, 500])
+async def test_delete_client_statement_count_is_constant(
+    test_client, auth_headers, db_setup_and_teardown, sql_statements, favorites,
+):
+    db = db_setup_and_teardown
+    client_id = (await test_client.get("/clients/logged", headers=auth_headers)).json()["id"]
+    await db.execute(insert(models.FavoriteProduct), [
+        {"client_id": client_id, "product_id": pid} for pid in range(1, favorites + 1)
+    ])
+    await db.commit()
+    sql_statements.clear()
+
+    response = await test_client.delete("/clients/logged", headers=auth_headers)
+    assert response.status_code == 204
+    assert len(sql_statements) == 1, sql_statements  # DELETE do cliente; o banco apaga os favoritos
+
+    remaining = await db.execute(select(func.count()).select_from(models.FavoriteProduct))
+    assert remaining.scalar() == 0
@@ -0,0 +1,93 @@
+from typing import Dict, Optional
+
+import pytest
+
+from aiqfome import fakestoreapi, response_cache
+from aiqfome.response_cache import InMemoryResponseCache, ResponseCacheBackend
+
+pytestmark = pytest.mark.asyncio
+
+PRODUCT = {"id": 1, "title": "Test Product", "price": 10.0, "description": "desc", "category": "cat",
+           "image": "https://fakestoreapi.com/img/1.jpg", "rating": {"rate": 4.5, "count": 120}}
+
+
+class FakeSharedStore(ResponseCacheBackend):
+    """Imita um store compartilhado (ex.: Redis): um hash por cliente e um contador de geração."""
+
+    shared = True
+
+    def __init__(self):
+        self.hashes: Dict[int, Dict[str, bytes]] = {}
+        self.generations: Dict[int, int] = {}
+
+    async def get(self, client_id: int, variant: str) -> Optional[bytes]:
+        return self.hashes.get(client_id, {}).get(variant)
+
+    async def generation(self, client_id: int) -> int:
+        return self.generations.get(client_id, 0)
+
+    async def set(self, client_id, variant, value, ttl, generation) -> bool:
+        if generation != self.generations.get(client_id, 0):
+            return False
+        self.hashes.setdefault(client_id, {})[variant] = value
+        return True
+
+    async def invalidate(self, client_id: int) -> None:
+        self.hashes.pop(client_id, None)
+        self.generations[client_id] = self.generations.get(client_id, 0) + 1
+
+    async def clear(self) -> None:
+        for client_id in list(self.hashes):
+            await self.invalidate(client_id)
+
+
+# --- Backend em memória ---
+
+async def test_in_memory_cache_rejects_responses_built_before_invalidation():
+    cache = InMemoryResponseCache(max_bytes=1024)
+    generation = await cache.generation(1)
+    await cache.invalidate(1)  # escrita concorrente
+    assert await cache.set(1, "page", b"old", ttl=60, generation=generation) is False
+    assert await cache.get(1, "page") is None
+
+    assert await cache.set(1, "page", b"new", ttl=60, generation=await cache.generation(1))
+    assert await cache.get(1, "page") == b"new"
+
+async def test_in_memory_cache_is_bounded_in_bytes():
+    cache = InMemoryResponseCache(max_bytes=10)
+    for client_id in (1, 2, 3):
+        await cache.set(client_id, "page", b"12345", ttl=60, generation=await cache.generation(client_id))
+    assert await cache.get(1, "page") is None  # o menos recente saiu
+    assert await cache.get(3, "page") == b"12345"
+    assert cache.stats()["bytes"] <= 10
+    assert cache.evictions == 1
+
+
+# --- Rotas com um backend plugável ---
+
+async def test_favorites_listing_served_from_pluggable_backend(test_client, auth_headers, sql_statements):
+    response_cache.favorites_cache.backend = FakeSharedStore()
+    for pid in (1, 2):
+        fakestoreapi.product_cache.set(pid, {**PRODUCT, "id": pid})
+    await test_client.post("/clients/logged/favorites/", json={"product_id": 1}, headers=auth_headers)
+
+    first = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    sql_statements.clear()
+    second = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert sql_statements == []
+
+    # Escrever nos favoritos invalida a listagem
+    await test_client.post("/clients/logged/favorites/", json={"product_id": 2}, headers=auth_headers)
+    response = await test_client.get("/clients/logged/favorites/", headers=auth_headers)
+    assert [p["id"] for p in response.json()] == [1, 2]
+
+async def test_local_backend_is_disabled_with_several_workers():
+    assert response_cache.FavoritesResponseCache(InMemoryResponseCache(), ttl=30, workers=1).enabled
+    assert not response_cache.FavoritesResponseCache(InMemoryResponseCache(), ttl=30, workers=4).enabled
+    assert response_cache.FavoritesResponseCache(FakeSharedStore(), ttl=30, workers=4).enabled
+
+    with pytest.raises(TypeError):
+        type("Incomplete", (ResponseCacheBackend,), {})()
@@ -0,0 +1,113 @@
+import os
+import re
+import sys
+import time
+import signal
+import socket
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+import uvicorn
+
+from aiqfome import server
+
+PID_APP = '''
+import os
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while (message := await receive())["type"] != "lifespan.shutdown":
+            await send({"type": "lifespan.startup.complete"})
+        await send({"type": "lifespan.shutdown.complete"})
+        return
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": str(os.getpid()).encode()})
+'''
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_available_cpus_respects_cgroup_quota(tmp_path):
+    cpu_max = tmp_path / "cpu.max"
+    cpus = len(os.sched_getaffinity(0))
+
+    cpu_max.write_text("max 100000\n")
+    assert server.available_cpus(str(cpu_max)) == cpus
+    cpu_max.write_text("50000 100000\n")
+    assert server.available_cpus(str(cpu_max)) == 1  # Meio core ainda vale um worker
+    cpu_max.write_text(f"{(cpus + 4) * 100000} 100000\n")
+    assert server.available_cpus(str(cpu_max)) == cpus
+    assert server.available_cpus(str(tmp_path / "missing")) == cpus
+
+def test_parse_args_resolves_workers_and_defaults(mocker):
+    mocker.patch.object(server, "available_cpus", return_value=6)
+    args = server.parse_args([])
+    assert args.app == "aiqfome.main:app"
+    assert args.workers == 6
+    assert args.preload is True
+
+    args = server.parse_args(["other:app", "--workers", "2", "--no-preload", "--max-requests", "100"])
+    assert (args.app, args.workers, args.preload, args.max_requests) == ("other:app", 2, False, 100)
+
+def test_config_trusts_forwarded_headers_only_from_configured_proxies():
+    args = server.parse_args(["--workers", "1", "--forwarded-allow-ips", "10.0.0.0/8"])
+    config = server.Supervisor(args).config()
+    assert config.proxy_headers is True
+    assert config.forwarded_allow_ips == "10.0.0.0/8"
+    assert server.parse_args(["--workers", "1"]).forwarded_allow_ips == server.FORWARDED_ALLOW_IPS
+
+def test_create_all_is_refused_with_several_workers(monkeypatch, mocker):
+    bind = mocker.patch.object(uvicorn.Config, "bind_socket")
+    monkeypatch.setenv("SCHEMA_MANAGEMENT", "create_all")
+    assert server.Supervisor(server.parse_args(["--workers", "2"])).run() == server.CONFIG_ERROR
+    bind.assert_not_called()
+
+def test_workers_are_recycled_and_stop_gracefully(tmp_path):
+    (tmp_path / "pid_app.py").write_text(PID_APP)
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "aiqfome.server", "pid_app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "2", "--max-requests", "3", "--graceful-timeout", "5"],
+        env={**os.environ, "SCHEMA_MANAGEMENT": "none", "PYTHONPATH": os.pathsep.join([str(tmp_path), os.getcwd()])},
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}/"
+    try:
+        started_at = time.monotonic()
+        while True:
+            try:
+                first_pid = int(httpx.get(url, timeout=5).text)
+                break
+            except httpx.ConnectError:
+                assert time.monotonic() - started_at < 20, "Servidor não subiu"
+                time.sleep(0.05)
+
+        def get_pid(_) -> int:
+            # Conexão nova a cada requisição: o kernel distribui entre os workers. Sem nova tentativa:
+            # a reciclagem não pode derrubar conexão nenhuma
+            response = httpx.get(url, headers={"Connection": "close"}, timeout=5)
+            assert response.status_code == 200
+            return int(response.text)
+
+        with ThreadPoolExecutor(8) as executor:
+            pids = [first_pid, *executor.map(get_pid, range(59))]
+        assert process.pid not in pids
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            output = process.communicate(timeout=15)[0].decode()
+        except subprocess.TimeoutExpired:
+            process.kill()
+            pytest.fail("Servidor não desligou após SIGTERM")
+    assert process.returncode == 0, output
+    assert "saiu com código" not in output
+    # 2 workers x 3 requisições cada: 60 requisições exigem reciclagem, e cada worker reciclado
+    # atendeu ao menos o limite (o uvicorn confere a cada 0,1s, então pode atender algumas a mais)
+    recycled = [int(pid) for pid in re.findall(r"Worker (\d+) reciclado", output)]
+    assert recycled
+    assert all(pids.count(pid) >= 3 for pid in recycled)
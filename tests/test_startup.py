@@ -0,0 +1,162 @@
+from dataclasses import replace
+
+import httpx
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from aiqfome import catalog, database, fakestoreapi, main, migrations, models
+
+
+async def table_names(engine) -> set:
+    async with engine.connect() as conn:
+        return set(await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names()))
+
+
+# --- Migrações versionadas ---
+
+async def test_migrations_apply_once(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'schema.db'}")
+    assert await migrations.upgrade(engine) == [m.version for m in migrations.MIGRATIONS]
+    assert await migrations.upgrade(engine) == []
+    assert await migrations.check_schema(engine) == migrations.MIGRATIONS[-1].version
+    assert {"clients", "favorite_products", "products", "schema_migrations"} <= await table_names(engine)
+    await engine.dispose()
+
+async def test_interrupted_finalize_is_retried_on_next_upgrade(tmp_path, mocker):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'finalize.db'}")
+    migration = migrations.MIGRATIONS[-1]
+    failing = mocker.AsyncMock(side_effect=RuntimeError("interrompido"))
+    mocker.patch.object(migrations, "MIGRATIONS", [*migrations.MIGRATIONS[:-1], replace(migration, finalize=failing)])
+    with pytest.raises(RuntimeError):
+        await migrations.upgrade(engine)
+    async with engine.connect() as conn:
+        assert await migrations.current_version(conn) == migration.version  # Versão já registrada
+
+    mocker.patch.object(migrations, "MIGRATIONS", [*migrations.MIGRATIONS[:-1], migration])
+    assert await migrations.upgrade(engine) == []
+    async with engine.connect() as conn:
+        indexes = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_indexes("clients"))
+    assert "ix_clients_pending_purge" in [index["name"] for index in indexes]
+    await engine.dispose()
+
+async def describe_schema(engine) -> dict:
+    def describe(sync_conn):
+        inspector = inspect(sync_conn)
+        return {
+            table: (
+                sorted(c["name"] for c in inspector.get_columns(table)),
+                inspector.get_pk_constraint(table)["constrained_columns"],
+                sorted((fk["referred_table"], fk["options"].get("ondelete")) for fk in inspector.get_foreign_keys(table)),
+                sorted((i["name"], tuple(i["column_names"]), bool(i["unique"])) for i in inspector.get_indexes(table)),
+            )
+            for table in inspector.get_table_names() if table != migrations.schema_migrations.name
+        }
+    async with engine.connect() as conn:
+        return await conn.run_sync(describe)
+
+async def test_migrated_schema_matches_models(tmp_path):
+    # A versão 1 é congelada; as seguintes levam o banco até o esquema atual dos modelos
+    migrated = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}")
+    await migrations.upgrade(migrated)
+    created = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'created.db'}")
+    async with created.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+
+    assert await describe_schema(migrated) == await describe_schema(created)
+    await migrated.dispose()
+    await created.dispose()
+
+async def test_migrations_adopt_schema_created_by_create_all(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    async with engine.connect() as conn:
+        assert await migrations.current_version(conn) == 0
+
+    assert await migrations.upgrade(engine)
+    async with engine.connect() as conn:
+        assert await migrations.pending_migrations(conn) == []
+    await engine.dispose()
+
+async def test_favorites_migrations_keep_rows(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'favorites.db'}")
+    async with engine.begin() as conn:
+        # Esquema anterior: id substituto, índice em id e unicidade (client_id, product_id)
+        for statement in (
+            "CREATE TABLE clients (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL,"
+            " email VARCHAR NOT NULL, hashed_password VARCHAR NOT NULL)",
+            "CREATE INDEX ix_clients_id ON clients (id)",
+            "CREATE TABLE favorite_products (id INTEGER PRIMARY KEY, product_id INTEGER NOT NULL,"
+            " client_id INTEGER NOT NULL REFERENCES clients (id),"
+            " CONSTRAINT unic_client_product UNIQUE (client_id, product_id))",
+            "CREATE INDEX ix_favorite_products_id ON favorite_products (id)",
+            "INSERT INTO clients VALUES (1, 'A', 'a@example.com', 'x')",
+            "INSERT INTO favorite_products (product_id, client_id) VALUES (5, 1), (2, 1)",
+        ):
+            await conn.execute(text(statement))
+
+    await migrations.upgrade(engine)
+
+    async with engine.connect() as conn:
+        def describe(sync_conn):
+            inspector = inspect(sync_conn)
+            return (
+                inspector.get_pk_constraint("favorite_products")["constrained_columns"],
+                [c["name"] for c in inspector.get_columns("favorite_products")],
+                [i["name"] for i in inspector.get_indexes("clients")],
+            )
+        pk, columns, client_indexes = await conn.run_sync(describe)
+        foreign_keys = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_foreign_keys("favorite_products"))
+        rows = (await conn.execute(text("SELECT client_id, product_id FROM favorite_products"))).all()
+    assert pk == ["client_id", "product_id"]
+    assert [fk["options"].get("ondelete") for fk in foreign_keys] == ["CASCADE"]
+    assert "ix_clients_pending_purge" in client_indexes
+    assert "id" not in columns
+    assert "ix_clients_id" not in client_indexes
+    assert rows == [(1, 2), (1, 5)]
+    await engine.dispose()
+
+
+# --- Aquecimento ---
+
+async def test_warm_pool_opens_connections_ahead_of_traffic(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=database.InstrumentedQueuePool, pool_size=3, max_overflow=0,
+    )
+    assert await database.warm_pool(engine, connections=5) == 3
+    assert engine.pool.checkedin() == 3
+    assert engine.pool.checkedout() == 0
+    await engine.dispose()
+
+async def test_warm_up_survives_upstream_failure(mocker):
+    mocker.patch.object(database, "warm_pool", mocker.AsyncMock(return_value=1))
+    mocker.patch.object(fakestoreapi, "open_http_client", mocker.AsyncMock())
+    mocker.patch.object(catalog, "resync_catalog", mocker.AsyncMock(side_effect=httpx.ConnectError("down")))
+    mocker.patch.object(main, "SCHEMA_MANAGEMENT", "create_all")
+
+    assert await main.warm_up() is False
+    fakestoreapi.open_http_client.assert_awaited_once()
+
+
+# --- Liveness e readiness ---
+
+async def test_liveness(test_client):
+    response = await test_client.get("/health/live")
+    assert response.status_code == 200
+
+async def test_readiness_waits_for_warm_up_and_database(app, test_client, mocker):
+    ping = mocker.patch.object(database, "ping", mocker.AsyncMock(return_value=True))
+    response = await test_client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "starting"}
+
+    app.state.ready = True
+    response = await test_client.get("/health/ready")
+    assert response.status_code == 200
+
+    ping.return_value = False
+    response = await test_client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "database_unavailable"}